@@ -7,8 +7,11 @@ import MetaTrader5 as mt5
 from ai_brain.education import Education
 from ai_brain.adaptation import Adaptation
 from ai_brain.testing import ModelTester
+from ai_brain.hot_swap import ShadowTrainer
 from agents.riskmanager import RiskManager
+from data_sys.provider_gateway import ProviderGateway
 from system_base.control import ErrorController
+from system_base.job_scheduler import JobScheduler, TrainingJob
 from system_base.logger import get_logger
 
 log = get_logger("Orchestrator")
@@ -21,38 +24,68 @@ class Orchestrator:
         self.symbol_tf = symbol_tf
         
         # Модули
-        self.ctrl = ErrorController()
+        self.ctrl = ErrorController(agent_id=self.symbol_tf)
         self.risk = RiskManager(self.symbol_tf, self.trader)
+        self.portfolio = None # PortfolioRiskManager (main): входы оцениваются пакетом по всем агентам
         self.educator = Education(self.brain, self.db)
         self.adapter = Adaptation(self.brain)
         self.tester = ModelTester()
         
-        # Состояния
+        # Состояния (лимиты попыток EDUCATION / FIT — в TrainingJob)
         self.needs_testing = True 
-        self.fit_attempts = 0
-        self.auto_cycle_counter = 0 # Защита от бесконечного зацикливания
         self.last_p_close = None 
         self.confidence_score = 0.0
+        self.bar_mse = None # Ошибка прошлого прогноза на новом баре (observe_bar)
+
+    def run_auto_cycle(self, is_sim_mode=False, on_done=None):
+        """
+        Сквозной процесс АВТОМАТИКА (ТЗ п.4 + Self-Preservation) как задание JobScheduler:
+        EDUCATION -> TEST -> до 3 FIT -> снова EDUCATION (не более JOB_MAX_EDUCATIONS).
+        Этапы выполняются по одному из main loop в пределах CPU-бюджетов. Возвращает TrainingJob.
+        """
+        self.needs_testing = True # До вердикта теста агент не торгует
+        return JobScheduler.instance().submit(TrainingJob(self, is_sim_mode=is_sim_mode, on_done=on_done))
+
+    def request_rebuild(self, is_sim_mode=False):
+        """
+        ERROR контроля точности: переобучение заданием. Есть рабочая модель — она продолжает
+        прогнозы (входы закрыты карантином ErrorController) до горячей замены; иначе ожидание TEST.
+        """
+        if self.brain.scaler is None:
+            self.needs_testing = True
+        return JobScheduler.instance().submit(TrainingJob(self, is_sim_mode=is_sim_mode, full_cycle=False))
+
+    # --- ЭТАПЫ ЗАДАНИЯ (вызываются TrainingJob.step) ---
+    def run_education_step(self, is_sim_mode=False, dataset=None):
+        self.trader.close_all_for_symbol(self.symbol_tf)
+        return self.educator.run_full_cycle(self.symbol_tf, is_sim_mode=is_sim_mode, dataset=dataset)
 
-    def run_auto_cycle(self, is_sim_mode=False):
-        """Сквозной процесс АВТОМАТИКА (ТЗ п.4 + Self-Preservation)."""
-        self.auto_cycle_counter += 1
-        if self.auto_cycle_counter > 3:
-            log.critical(f"[{self.symbol_tf}] СТОП: Рынок непредсказуем. Модель не проходит тесты.")
-            return False
+    def start_shadow_training(self, is_sim_mode=False, dataset=None):
+        return ShadowTrainer(self.educator, self.symbol_tf, is_sim_mode, dataset).start()
 
-        log.info(f"[{self.symbol_tf}] Авто-цикл (Попытка {self.auto_cycle_counter})...")
-        self.trader.close_all_for_symbol(self.symbol_tf) 
-        
-        if not self.educator.run_full_cycle(self.symbol_tf, is_sim_mode=is_sim_mode):
-            return self.run_auto_cycle(is_sim_mode=is_sim_mode)
+    def live_test_mse(self, result):
+        """MSE живой модели на тестовой части теневого обучения (None — сравнить нельзя)."""
+        X_test, y_test = result["test"]
+        return self.brain.test_mse(X_test, y_test, result["scaler"])
 
-        return self._run_test_fit_loop(is_sim_mode)
+    def install_shadow(self, result):
+        """Теневая модель не хуже живой на том же тесте: атомарная замена (вызов из main loop, между барами)."""
+        self.brain.swap_model(result["model"], result["scaler"], result.get("fingerprint"), result.get("distilled"))
+        self.ctrl.reset()
+        self.needs_testing = False
+
+    def run_fit_step(self, is_sim_mode=False):
+        recent_data = self.db.get_history(self.symbol_tf, limit=100)
+        self.adapter.apply(recent_data, epochs=1 if is_sim_mode else 5)
 
-    def _run_test_fit_loop(self, is_sim_mode):
+    def evaluate_test(self, is_sim_mode=False):
+        """
+        Тест производительности -> ('PASS' | 'FIT' | 'EDUCATION', mse).
+        PASS переводит агента в режим ТОРГОВЛЯ.
+        """
         # 1. Запуск теста производительности
         test_passed, mse = self.tester.run_performance_test(
-            self.symbol_tf, self.brain.model, None, None, self.brain.scaler
+            self.symbol_tf, self.brain.serving_model, None, None, self.brain.scaler
         )
 
         # 2. Расчет динамического порога на основе ATR
@@ -81,36 +114,37 @@ class Orchestrator:
             # Сброс всех системных состояний (КРИТИЧЕСКИ ВАЖНО)
             self.ctrl.reset()
             self.needs_testing = False
-            self.fit_attempts = 0
-            self.auto_cycle_counter = 0
-            return True
+            return "PASS", mse
         
         # 4. АВАРИЯ: Если ошибка в 2 раза выше порога — полный цикл EDUCATION
         if mse > (validation_gate * 2): 
             log.warning(f"[{self.symbol_tf}] АВАРИЯ: Огромная ошибка ({mse:.6f}). Полный цикл обучения.")
-            return self.run_auto_cycle(is_sim_mode)
+            return "EDUCATION", mse
 
         # 5. ПРЕДУПРЕЖДЕНИЕ -> Попытка адаптации (FIT)
-        if self.fit_attempts < 3:
-            self.fit_attempts += 1
-            log.info(f"[{self.symbol_tf}] FIT: Попытка адаптации {self.fit_attempts}/3 (MSE: {mse:.6f})")
-            recent_data = self.db.get_history(self.symbol_tf, limit=100)
-            self.adapter.apply(recent_data, epochs=1 if is_sim_mode else 5)
-            return self._run_test_fit_loop(is_sim_mode)
-        
-        # Если адаптации не помогли — на полную переподготовку
-        log.error(f"[{self.symbol_tf}] Адаптации исчерпаны. Перезапуск EDUCATION.")
-        return self.run_auto_cycle(is_sim_mode)
+        return "FIT", mse
+
 
+    def observe_bar(self, data):
+        """
+        Ошибка прошлого прогноза на новом закрытом баре -> (ErrorController, mse) для общего шага
+        ErrorController.update_batch (main loop, до tick агентов). None — агент на тестировании.
+        """
+        if self.needs_testing:
+            return None
+        # Сравниваем прогноз прошлого шага с фактом текущего закрытого бара
+        fact_ohl = np.array([data[-1, 3], data[-1, 1], data[-1, 2]])
+        self.bar_mse = self.brain.calculate_mse(fact_ohl)
+        return self.ctrl, self.bar_mse
 
-    def process_new_bar(self, data, mode, global_trading_allowed, raw_atr):
+    def process_new_bar(self, data, mode, global_trading_allowed, raw_atr, hierarchical_signal=None):
         # 0. Защита: если модель на тестировании, выходим
         if self.needs_testing: return
 
         # 1. Контроль точности (MSE) и расчет индекса доверия для HMI
-        # Сравниваем прогноз прошлого шага с фактом текущего закрытого бара
-        fact_ohl = np.array([data[-1, 3], data[-1, 1], data[-1, 2]]) 
-        mse = self.brain.calculate_mse(fact_ohl)
+        if self.bar_mse is None:
+            self.observe_bar(data)
+        mse, self.bar_mse = self.bar_mse, None
         self.confidence_score = self._calculate_confidence(mse)
         
         # Получаем индивидуальный множитель из настроек Brain (из БД)
@@ -126,15 +160,15 @@ class Orchestrator:
         status = self.ctrl.check(mse, dynamic_threshold)
 
         if status == "ERROR":
-            # Точность упала ниже критического порога — переобучаем
-            self._handle_rebuild(is_sim_mode=(mode == 'simulation'))
+            # Точность упала ниже критического порога — переобучаем (заданием JobScheduler)
+            self.request_rebuild(is_sim_mode=(mode == 'simulation'))
             return 
 
         # 2. Генерация НОВОГО прогноза
         p_close, p_high, p_low = self.brain.predict(data)
         
         # Получаем текущие котировки (Ask/Bid) из терминала
-        tick = mt5.symbol_info_tick(self.symbol_tf)
+        tick = ProviderGateway.symbol_info_tick(self.symbol_tf)
         if not tick: return
         
         # 3. Риск-менеджмент: Сопровождение (Trailing Forecast)
@@ -143,13 +177,17 @@ class Orchestrator:
 
         # 4. Риск-менеджмент: Вход (Evaluation)
         if (mode == 'trade') and global_trading_allowed and self.ctrl.is_model_valid:
-            # ТЕПЕРЬ ПЕРЕДАЕМ raw_atr для динамического фильтра волатильности
-            signal = self.risk.evaluate_entry(tick, p_close, p_high, p_low, raw_atr)
-            
-            if signal == 'BUY':
-                self.trader.execute_buy(self.symbol_tf, target=p_close, stop=p_low)
-            elif signal == 'SELL':
-                self.trader.execute_sell(self.symbol_tf, target=p_close, stop=p_high)
+            if self.portfolio is not None:
+                # Решение примет PortfolioRiskManager.flush() вместе с остальными агентами цикла
+                self.portfolio.submit(self.symbol_tf, self.trader, tick, p_close, p_high, p_low, raw_atr)
+            else:
+                # ТЕПЕРЬ ПЕРЕДАЕМ raw_atr для динамического фильтра волатильности
+                signal = self.risk.evaluate_entry(tick, p_close, p_high, p_low, raw_atr)
+
+                if signal == 'BUY':
+                    self.trader.execute_buy(self.symbol_tf, target=p_close, stop=p_low)
+                elif signal == 'SELL':
+                    self.trader.execute_sell(self.symbol_tf, target=p_close, stop=p_high)
 
         # Сохраняем прогноз для сравнения на следующем баре
         self.last_p_close = p_close
@@ -157,17 +195,16 @@ class Orchestrator:
 
     def _calculate_confidence(self, mse):
         """Расчет индекса доверия (0-100%)."""
-        if mse == 0 or not self.ctrl.history_mse or self.ctrl.last_threshold == 0:
+        avg_mse = self.ctrl.avg_mse
+        if mse == 0 or avg_mse == 0 or self.ctrl.last_threshold == 0:
             return 100.0
         
-        avg_mse = sum(self.ctrl.history_mse) / len(self.ctrl.history_mse)
-        
         ratio = mse / (avg_mse * self.brain.settings.get('error_multiplier', 1.5))
         return round(max(0, min(100, (1 - ratio) * 100)), 2)
 
-    def _handle_rebuild(self, is_sim_mode=False):
+    def _handle_rebuild(self, is_sim_mode=False, dataset=None):
         self.trader.close_all_for_symbol(self.symbol_tf)
-        if self.educator.run_full_cycle(self.symbol_tf, is_sim_mode=is_sim_mode):
+        if self.educator.run_full_cycle(self.symbol_tf, is_sim_mode=is_sim_mode, dataset=dataset):
             self.needs_testing = True
 
     def manual_fit_trigger(self, is_sim_mode=False):
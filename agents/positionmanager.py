@@ -1,82 +1,118 @@
 # agents/positionmanager.py
 import MetaTrader5 as mt5
+import numpy as np
 from system_base.logger import get_logger
-from config import MAGIC_NUMBER # Предположим, вынесли в конфиг
+from system_base.broker_gateway import BrokerGateway
+from config import MAGIC_NUMBER, BE_THRESHOLD, TRAIL_ATR_MULT, SL_MIN_STEP_PTS
 
 log = get_logger("PositionManager")
 
 class PositionManager:
     def __init__(self, magic=MAGIC_NUMBER):
         self.magic = magic
+        self.broker = BrokerGateway.instance()
 
-    def manage_all_positions(self, symbols_list):
+    def manage_all_positions(self, symbols_list, atr_map=None):
         """
         Основная функция сопровождения, вызываемая из главного цикла (main.py).
+        Один positions_get() на цикл, правила безубытка и ATR-трейлинга — векторно по всем позициям.
+        atr_map: { символ: raw ATR } от агентов (TradingBot.last_atr; при нескольких ТФ — младший).
         """
-        if not mt5.initialize():
-            log.error("MT5 не инициализирован в PositionManager")
+        # Сессией MT5 владеет BrokerGateway (initialize — один раз в main.py)
+        positions = self.broker.positions_get()
+        if not positions:
             return
 
-        for symbol in symbols_list:
-            self._manage_symbol_positions(symbol)
-
-    def _manage_symbol_positions(self, symbol):
-        """Управление позициями по конкретному символу"""
-        positions = mt5.positions_get(symbol=symbol)
-        
-        if positions is None or len(positions) == 0:
+        pos = self._to_arrays(positions, symbols_list)
+        if pos is None:
             return
 
-        for pos in positions:
-            # Проверяем magic-номер бота
-            if pos.magic != self.magic:
-                continue
-
-            # Получаем актуальные параметры символа (кол-во знаков после запятой)
-            symbol_info = mt5.symbol_info(symbol)
-            if symbol_info is None:
-                continue
-
-            # ЛОГИКА БЕЗУБЫТКА (Breakeven)
-            # Если цена прошла 50% пути до TP, переносим SL в точку открытия + минимальный спред
-            
-            # Для покупок (BUY)
-            if pos.type == mt5.POSITION_TYPE_BUY:
-                tp_dist = pos.tp - pos.price_open
-                current_profit_dist = pos.price_current - pos.price_open
-                
-                if tp_dist > 0 and current_profit_dist >= (tp_dist * 0.5):
-                    if pos.sl < pos.price_open: 
-                        self._modify_sl(pos, pos.price_open, symbol, symbol_info.digits)
-
-            # Для продаж (SELL)
-            elif pos.type == mt5.POSITION_TYPE_SELL:
-                tp_dist = pos.price_open - pos.tp
-                current_profit_dist = pos.price_open - pos.price_current
-                
-                if tp_dist > 0 and current_profit_dist >= (tp_dist * 0.5):
-                    if pos.sl > pos.price_open or pos.sl == 0:
-                        self._modify_sl(pos, pos.price_open, symbol, symbol_info.digits)
-
-    def _modify_sl(self, position, new_sl, symbol, digits):
+        new_sl, reason = self._evaluate_stops(pos, atr_map or {})
+        for i in np.flatnonzero(~np.isnan(new_sl)):
+            self._modify_sl(positions[pos['index'][i]], new_sl[i], pos['symbol'][i], int(pos['digits'][i]), reason[i])
+
+    def _to_arrays(self, positions, symbols_list):
+        """Позиции бота (magic + список символов) -> словарь NumPy-массивов."""
+        magic = np.fromiter((p.magic for p in positions), dtype=np.int64, count=len(positions))
+        symbol = np.array([p.symbol for p in positions])
+        keep = np.flatnonzero((magic == self.magic) & np.isin(symbol, symbols_list))
+        if keep.size == 0:
+            return None
+
+        sel = [positions[i] for i in keep]
+        pos = {
+            'index': keep,
+            'symbol': symbol[keep],
+            'type': np.array([p.type for p in sel]),
+            'price_open': np.array([p.price_open for p in sel], dtype=np.float64),
+            'price_current': np.array([p.price_current for p in sel], dtype=np.float64),
+            'sl': np.array([p.sl for p in sel], dtype=np.float64),
+            'tp': np.array([p.tp for p in sel], dtype=np.float64),
+        }
+
+        # Спецификации символов (кэш сессии BrokerGateway): по одному разу на символ
+        point, digits = np.full(len(sel), np.nan), np.zeros(len(sel))
+        for sym in np.unique(pos['symbol']):
+            info = self.broker.symbol_info(sym)
+            if info is not None:
+                mask = pos['symbol'] == sym
+                point[mask], digits[mask] = info.point, info.digits
+        pos['point'], pos['digits'] = point, digits
+        return pos
+
+    def _evaluate_stops(self, pos, atr_map):
+        """
+        Векторная оценка новых SL. Все расстояния приводятся к направлению позиции (dir = +1 BUY / -1 SELL).
+        Безубыток: цена прошла BE_THRESHOLD пути до TP -> SL в точку открытия.
+        Трейлинг: прибыль >= TRAIL_ATR_MULT * ATR -> SL на TRAIL_ATR_MULT * ATR от текущей цены.
+        Возвращает (new_sl с NaN там, где менять не нужно, причина).
+        """
+        direction = np.where(pos['type'] == mt5.POSITION_TYPE_BUY, 1.0, -1.0)
+        open_, cur, sl, tp = pos['price_open'], pos['price_current'], pos['sl'], pos['tp']
+
+        tp_dist = direction * (tp - open_)
+        profit_dist = direction * (cur - open_)
+
+        be_hit = (tp > 0) & (tp_dist > 0) & (profit_dist >= tp_dist * BE_THRESHOLD)
+        be_sl = np.where(be_hit, open_, np.nan)
+
+        atr = np.array([atr_map.get(s, np.nan) for s in pos['symbol']], dtype=np.float64)
+        trail_dist = atr * TRAIL_ATR_MULT
+        trail_hit = profit_dist >= trail_dist  # NaN ATR -> False
+        trail_sl = np.where(trail_hit, cur - direction * trail_dist, np.nan)
+
+        # Лучший из кандидатов в направлении позиции (fmax игнорирует NaN)
+        best = np.fmax(direction * be_sl, direction * trail_sl)
+        # Текущий SL: 0 = не выставлен
+        current = np.where(sl > 0, direction * sl, -np.inf)
+        min_step = SL_MIN_STEP_PTS * pos['point']
+
+        move = ~np.isnan(best) & ~np.isnan(min_step) & (best - current >= min_step)
+        new_sl = np.where(move, direction * best, np.nan)
+        reason = np.where(direction * trail_sl == best, "ТРЕЙЛИНГ", "БЕЗУБЫТОК")
+        return new_sl, reason
+
+    def _modify_sl(self, position, new_sl, symbol, digits, reason="БЕЗУБЫТОК"):
         """Отправка запроса на изменение Stop Loss"""
         request = {
             "action": mt5.TRADE_ACTION_SLTP,
             "position": position.ticket,
             "symbol": symbol,
-            "sl": round(new_sl, digits),
+            "sl": round(float(new_sl), digits),
             "tp": position.tp,
         }
         
-        result = mt5.order_send(request)
-        if result.retcode == mt5.TRADE_RETCODE_DONE:
-            log.info(f"[{symbol}] Позиция {position.ticket} переведена в БЕЗУБЫТОК.")
+        result = self.broker.order_send(request)
+        if result is None:
+            log.error(f"[{symbol}] Нет ответа брокера на модификацию SL #{position.ticket}")
+        elif result.retcode == mt5.TRADE_RETCODE_DONE:
+            log.info(f"[{symbol}] Позиция {position.ticket}: SL -> {round(new_sl, digits)} ({reason}).")
         else:
             log.error(f"[{symbol}] Ошибка модификации SL #{position.ticket}: {result.comment}")
 
     def close_all_for_symbol(self, symbol):
         """Метод для shutdown_manager.py — экстренное закрытие всех позиций по ID"""
-        positions = mt5.positions_get(symbol=symbol)
+        positions = self.broker.positions_get(symbol=symbol)
         if positions:
             for pos in positions:
                 if pos.magic == self.magic:
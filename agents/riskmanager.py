@@ -1,9 +1,15 @@
 # agents/RiskManager.py
 # LOCATION: PROJ_AI_FOREX_2026/agents/
 # DESCRIPTION: Модуль управления рисками. Расчет условий 1:3 и сопровождение позиций.
+# PortfolioRiskManager — та же оценка входов векторно по всем агентам цикла.
 
+import time
+import numpy as np
 import MetaTrader5 as mt5
+from data_sys.provider_gateway import ProviderGateway
+from system_base.broker_gateway import BrokerGateway
 from system_base.logger import get_logger
+from config import MAGIC_NUMBER, RR_MIN, VOLATILITY_ATR_RATIO, MAX_CURRENCY_EXPOSURE
 
 log = get_logger("RiskManager")
 
@@ -17,7 +23,7 @@ class RiskManager:
         Проверка условия: Прибыль >= 3 * (Убыток + Спред + Комиссия).
         Возвращает: 'BUY', 'SELL' или None.
         """
-        s_info = mt5.symbol_info(self.symbol_tf)
+        s_info = ProviderGateway.symbol_info(self.symbol_tf)
         if not s_info: return None
         
         spread = (tick.ask - tick.bid)
@@ -52,7 +58,8 @@ class RiskManager:
             
         if last_p_close is None: return
 
-        pos = mt5.positions_get(symbol=self.symbol_tf, magic=self.trader.magic)
+        pos = BrokerGateway.instance().positions_get(symbol=self.symbol_tf)
+        pos = [p for p in pos or [] if p.magic == self.trader.magic]
         if not pos: return
         
         for p in pos:
@@ -62,3 +69,144 @@ class RiskManager:
             # SELL: Если новый прогноз выше предыдущего — фиксируем
             elif p.type == mt5.ORDER_TYPE_SELL and current_p_close > last_p_close:
                 self.trader.close_position(p.ticket, "Forecast Rise")
+
+class PortfolioRiskManager:
+    """
+    Портфельная оценка входов: агенты, закрывшие бар, сдают прогнозы через submit(),
+    main вызывает flush() один раз за цикл. Условие 1:3, издержки, фильтр волатильности
+    и чистая валютная экспозиция считаются одним проходом NumPy по всем символам.
+    Экспозиция — в сделках (объем Trader фиксирован): BUY EURUSD = +1 EUR, -1 USD.
+    """
+
+    def __init__(self, max_exposure=MAX_CURRENCY_EXPOSURE, magic=MAGIC_NUMBER):
+        self.max_exposure = max_exposure
+        self.magic = magic
+        self._pending = {} # { symbol_tf: (trader, p_close, p_high, p_low, bid, ask, point, atr) }
+        self.stats = {"evaluated": 0, "accepted": 0, "last_eval_us": 0.0}
+
+    def submit(self, symbol_tf, trader, tick, p_close, p_high, p_low, raw_atr):
+        """Прогноз агента в очередь текущего цикла (повторная сдача того же агента заменяет прежнюю)."""
+        s_info = ProviderGateway.symbol_info(symbol_tf)
+        if not s_info: return
+        self._pending[symbol_tf] = (trader, p_close, p_high, p_low, tick.bid, tick.ask, s_info.point, raw_atr)
+
+    @staticmethod
+    def evaluate(p_close, p_high, p_low, bid, ask, point, atr, commission_pts,
+                 base_idx, quote_idx, open_exposure, max_exposure=MAX_CURRENCY_EXPOSURE):
+        """
+        Все аргументы — массивы по кандидатам; base_idx / quote_idx — индексы валют пары,
+        open_exposure — текущая чистая позиция по валютам.
+        Возвращает (direction: +1 BUY / -1 SELL / 0, score: прибыль / риск).
+        """
+        cost = (ask - bid) + commission_pts * point
+        vol_ok = (p_high - p_low) >= atr * VOLATILITY_ATR_RATIO
+
+        buy_profit, buy_risk = p_close - ask, (ask - p_low) + cost
+        sell_profit, sell_risk = bid - p_close, (p_high - bid) + cost
+        buy = vol_ok & (p_close > ask) & (buy_risk > 0) & (buy_profit >= RR_MIN * buy_risk)
+        sell = vol_ok & (p_close < bid) & (sell_risk > 0) & (sell_profit >= RR_MIN * sell_risk)
+
+        direction = np.where(buy, 1, np.where(sell, -1, 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(buy, buy_profit / buy_risk, np.where(sell, sell_profit / sell_risk, 0.0))
+
+        # Экспозиция: кандидаты по убыванию score, накопленная сумма поверх открытых позиций.
+        # Обычный случай (лимит не задет) — один cumsum. Иначе с первого нарушения — жадный
+        # проход: кандидат, увеличивающий |позицию| по своей валюте сверх лимита, снимается.
+        cand = np.flatnonzero(direction)
+        if len(cand) == 0:
+            return direction, score
+        cand = cand[np.argsort(-score[cand], kind='stable')]
+        rows = np.arange(len(cand))
+        delta = np.zeros((len(cand), len(open_exposure)))
+        delta[rows, base_idx[cand]] += direction[cand]
+        delta[rows, quote_idx[cand]] -= direction[cand]
+
+        after = open_exposure + np.cumsum(delta, axis=0)
+        before = after - delta
+        breach = ((np.abs(after) > max_exposure) & (np.abs(after) > np.abs(before))).any(axis=1)
+        if not breach.any():
+            return direction, score
+
+        first = int(np.argmax(breach))
+        exposure = before[first].tolist()
+        for i in cand[first:]:
+            d, b, q = int(direction[i]), base_idx[i], quote_idx[i]
+            nb, nq = exposure[b] + d, exposure[q] - d
+            if (abs(nb) > max_exposure and abs(nb) > abs(exposure[b])) or \
+               (abs(nq) > max_exposure and abs(nq) > abs(exposure[q])):
+                direction[i] = 0
+                continue
+            exposure[b], exposure[q] = nb, nq
+        return direction, score
+
+    def _open_exposure(self, ccy_index):
+        exposure = np.zeros(len(ccy_index))
+        for p in BrokerGateway.instance().positions_get() or []:
+            if p.magic != self.magic: continue
+            base, quote = p.symbol[:3], p.symbol[3:6]
+            if base not in ccy_index or quote not in ccy_index: continue
+            sign = 1 if p.type == mt5.POSITION_TYPE_BUY else -1
+            exposure[ccy_index[base]] += sign
+            exposure[ccy_index[quote]] -= sign
+        return exposure
+
+    def flush(self):
+        """Оценка всех сданных прогнозов и исполнение принятых. Возвращает [(symbol_tf, 'BUY'|'SELL')]."""
+        if not self._pending:
+            return []
+        pending, self._pending = self._pending, {}
+        try:
+            ids = list(pending)
+            traders = [v[0] for v in pending.values()]
+            p_close, p_high, p_low, bid, ask, point, atr = (np.array(c, dtype=np.float64)
+                                                            for c in zip(*[v[1:] for v in pending.values()]))
+            commission = np.array([t.commission_pts for t in traders], dtype=np.float64)
+
+            ccy = sorted({sid[:3] for sid in ids} | {sid[3:6] for sid in ids})
+            ccy_index = {c: i for i, c in enumerate(ccy)}
+            base_idx = np.array([ccy_index[sid[:3]] for sid in ids])
+            quote_idx = np.array([ccy_index[sid[3:6]] for sid in ids])
+            open_exposure = self._open_exposure(ccy_index)
+
+            t0 = time.perf_counter()
+            direction = self.evaluate(p_close, p_high, p_low, bid, ask, point, atr, commission,
+                                          base_idx, quote_idx, open_exposure, self.max_exposure)[0]
+            self.stats["last_eval_us"] = round((time.perf_counter() - t0) * 1e6, 1)
+        except Exception as e:
+            log.error(f"Ошибка портфельной оценки входов: {e}")
+            return []
+
+        accepted = []
+        for i in np.flatnonzero(direction):
+            sid = ids[i]
+            if direction[i] > 0:
+                traders[i].execute_buy(sid, target=p_close[i], stop=p_low[i])
+                accepted.append((sid, 'BUY'))
+            else:
+                traders[i].execute_sell(sid, target=p_close[i], stop=p_high[i])
+                accepted.append((sid, 'SELL'))
+
+        self.stats["evaluated"] += len(ids)
+        self.stats["accepted"] += len(accepted)
+        return accepted
+
+if __name__ == "__main__":
+    # Задержка портфельной оценки на синтетической вселенной: python -m agents.riskmanager
+    rng = np.random.default_rng(0)
+    currencies = [f"C{i:02d}" for i in range(40)]
+    for n in (10, 100, 500):
+        base_idx = rng.integers(0, 20, n)
+        quote_idx = rng.integers(20, 40, n)
+        bid = rng.uniform(1.0, 1.5, n)
+        ask = bid + 1e-4
+        atr = np.full(n, 5e-3)
+        p_close = bid + rng.normal(0, 1e-2, n)
+        p_high = np.maximum(p_close, ask) + rng.uniform(0, 2e-3, n)
+        p_low = np.minimum(p_close, bid) - rng.uniform(0, 2e-3, n)
+        args = (p_close, p_high, p_low, bid, ask, np.full(n, 1e-5), atr, np.full(n, 50.0),
+                base_idx, quote_idx, np.zeros(len(currencies)))
+        t0 = time.perf_counter()
+        for _ in range(100):
+            direction, _ = PortfolioRiskManager.evaluate(*args)
+        print(f"{n:4d} символов: {(time.perf_counter() - t0) / 100 * 1e6:8.1f} мкс, входов {np.count_nonzero(direction)}")
@@ -2,6 +2,8 @@
 import MetaTrader5 as mt5
 import json
 import os
+from data_sys.provider_gateway import ProviderGateway
+from system_base.broker_gateway import BrokerGateway
 from system_base.logger import get_logger
 from config import MAGIC_NUMBER, APP_CONFIG_PATH, MIN_PROFIT_PTS
 
@@ -37,7 +39,7 @@ class Trader:
             log.warning(f"[{symbol}] Ордер отклонен: Торговля запрещена в настройках HMI.", extra={'symbol': symbol})
             return None
 
-        symbol_info = mt5.symbol_info(symbol)
+        symbol_info = ProviderGateway.symbol_info(symbol)
         if symbol_info is None:
             log.error(f"[{symbol}] Символ не найден в терминале MT5.", extra={'symbol': symbol})
             return None
@@ -61,7 +63,7 @@ class Trader:
             "type_filling": mt5.ORDER_FILLING_IOC,
         }
         
-        result = mt5.order_send(request)
+        result = BrokerGateway.instance().order_send(request)
         
         if result is None:
             log.error(f"[{symbol}] Критический сбой: order_send вернул None", extra={'symbol': symbol})
@@ -76,8 +78,8 @@ class Trader:
 
     def execute_buy(self, symbol, target=None, stop=None):
         """Публичный метод для Orchestrator (symbol здесь - полный ID: EURUSD_H1)"""
-        tick = mt5.symbol_info_tick(symbol)
-        s_info = mt5.symbol_info(symbol)
+        tick = ProviderGateway.symbol_info_tick(symbol)
+        s_info = ProviderGateway.symbol_info(symbol)
         if tick is None or s_info is None: return
         
         curr_price = tick.ask
@@ -100,8 +102,8 @@ class Trader:
 
     def execute_sell(self, symbol, target=None, stop=None):
         """Публичный метод для Orchestrator (symbol здесь - полный ID: EURUSD_H1)"""
-        tick = mt5.symbol_info_tick(symbol)
-        s_info = mt5.symbol_info(symbol)
+        tick = ProviderGateway.symbol_info_tick(symbol)
+        s_info = ProviderGateway.symbol_info(symbol)
         if tick is None or s_info is None: return
         
         curr_price = tick.bid
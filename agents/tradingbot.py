@@ -3,12 +3,13 @@
 # DESCRIPTION: Контейнер агента. Управляет статусами, транслирует команды 
 # из main.py в оркестратор и предоставляет данные для HMI (п.4 ТЗ).
 
-from config import APP_CONFIG_PATH
+from config import APP_CONFIG_PATH, JR_NEUTRAL_ATR_RATIO
 from ai_brain.brain import Brain
 from agents.orchestrator import Orchestrator
 from data_sys.databasemanager import DatabaseManager
 from data_sys.datafactory import DataFactory
 from agents.trader import Trader
+from system_base.job_scheduler import JobScheduler
 import json
 import os
 
@@ -36,6 +37,10 @@ class TradingBot:
         self.current_mse = 0.0
         self.warnings = 0
         self.manual_stop = True    # По умолчанию стоим (ТЗ п.4: ждем кнопку START)
+        self.last_atr = None       # Сырой ATR младшего ТФ (трейлинг PositionManager)
+        self.sr_evals = 0          # Прогнозов старшего ТФ выполнено
+        self.sr_skipped = 0        # Прогнозов старшего ТФ пропущено (ленивая иерархия)
+        self._bar = None           # Данные младшего ТФ, полученные в observe_bar (для tick)
 
     def _get_global_allow_flag(self):
         """Проверка разрешения на торговлю из app_config.json (ТЗ)"""
@@ -47,16 +52,18 @@ class TradingBot:
         except: pass
         return False
 
-    def initialize_bot(self, force_train=False, is_sim_mode=False):
+    def initialize_bot(self, force_train=False, is_sim_mode=False, dataset=None):
         """
         Подготовка: загрузка весов или запуск EDUCATION.
         ТЗ п.4: Принудительный статус WAIT_TEST после обучения.
+        dataset: выборка из параллельного препроцессинга (БД уже актуализирована в main.py).
         """
         if not self.brain.load_weights() or force_train:
             self.status = "TRAINING"
-            self.db.update_database(self.symbol, self.tf)
+            if dataset is None:
+                self.db.update_database(self.symbol, self.tf)
             # ТЗ п.4: Передаем флаг симуляции для загрубления
-            self.orch._handle_rebuild(is_sim_mode=is_sim_mode) 
+            self.orch._handle_rebuild(is_sim_mode=is_sim_mode, dataset=dataset) 
             self.status = "WAIT_TEST" 
         else:
             self.status = "OK"
@@ -64,17 +71,17 @@ class TradingBot:
     def run_auto_cycle_start(self, is_sim_mode=False):
         """
         Сценарий АВТОМАТИКА: Education -> Test -> Trade.
-        Оптимизация: защита от бесконечного цикла (Self-Preservation).
+        Выполняется заданием JobScheduler (этапами из main loop), итог — в _on_auto_cycle_done.
         """
         self.status = "TRAINING"
-        # Запуск итерационного процесса в Orchestrator (реализуем на след. шаге)
-        success = self.orch.run_auto_cycle(is_sim_mode=is_sim_mode)
-        
-        if success:
+        return self.orch.run_auto_cycle(is_sim_mode=is_sim_mode, on_done=self._on_auto_cycle_done)
+
+    def _on_auto_cycle_done(self, job):
+        if job.succeeded:
             self.manual_stop = False
             self.status = "OK"
         else:
-            self.status = "FATAL_ERROR" # Рынок непредсказуем
+            self.status = "FATAL_ERROR" # Рынок непредсказуем (или задание отменено / вне бюджета)
             self.manual_stop = True
 
     def run_diagnostic_test(self):
@@ -91,8 +98,26 @@ class TradingBot:
             self.status = "WAIT_TEST" # Тест провален, торговля запрещена
         return result
 
+    def observe_bar(self):
+        """
+        Этап перед tick() (main loop): данные младшего ТФ и ошибка прошлого прогноза на новом баре.
+        -> (ErrorController, mse) для ErrorController.update_batch или None (пауза, нет нового бара).
+        """
+        self._bar = None
+        if self.manual_stop:
+            return None
+        bar = DataFactory.get_data(self.symbol, self.tf_jr, self.brain_jr.window_size)
+        data_jr, time_jr, _ = bar
+        if data_jr is None:
+            return None
+        self._bar = bar
+        if time_jr == self.last_time or len(data_jr) != self.brain_jr.window_size:
+            return None
+        return self.orch.observe_bar(data_jr)
+
     def tick(self):
         """Обновленный цикл 2026: Иерархия JR + SR таймфреймов."""
+        bar, self._bar = self._bar, None
         
         # 1. Проверка ручной остановки
         if self.manual_stop:
@@ -100,45 +125,41 @@ class TradingBot:
                 self.status = "PAUSED"
             return
 
-        # 2. ПОЛУЧЕНИЕ ДАННЫХ ДЛЯ ОБОИХ ТАЙМФРЕЙМОВ
-        # Получаем данные Младшего ТФ (например, M15)
-        data_jr, time_jr, atr_jr = DataFactory.get_data(
+        # 2. ДАННЫЕ МЛАДШЕГО ТФ (например, M15). Старший ТФ запрашивается лениво (этап Б)
+        # Уже получены в observe_bar, если main собирал ошибки бара
+        data_jr, time_jr, atr_jr = bar or DataFactory.get_data(
             self.symbol, self.tf_jr, self.brain_jr.window_size
         )
-        
-        # Получаем данные Старшего ТФ (например, H1)
-        data_sr, time_sr, atr_sr = DataFactory.get_data(
-            self.symbol, self.tf_sr, self.brain_sr.window_size
-        )
-
-        # Валидация наличия данных для обеих моделей
-        if data_jr is None or data_sr is None:
+        if data_jr is None:
             return
+        self.last_atr = atr_jr
 
         # 3. ПРОВЕРКА НОВОГО БАРА (по младшему ТФ)
         if time_jr != self.last_time:
-            # Проверяем заполненность окон
-            if len(data_jr) == self.brain_jr.window_size and len(data_sr) == self.brain_sr.window_size:
+            if len(data_jr) == self.brain_jr.window_size:
                 
-                # А) Генерация прогнозов
-                # Младшая модель дает точку входа
-                p_close_jr, p_high_jr, p_low_jr = self.brain_jr.predict(data_jr)
-                # Старшая модель дает глобальный вектор
-                p_close_sr, _, _ = self.brain_sr.predict(data_sr)
+                # А) Прогноз младшей модели (точка входа)
+                p_close_jr, p_high_jr, p_low_jr = self.brain_jr.predict(data_jr, bar_time=time_jr)
 
-                # Б) ПРИМЕНЕНИЕ ИЕРАРХИЧЕСКОГО ФИЛЬТРА (Ваша новая логика)
+                # Б) ИЕРАРХИЧЕСКИЙ ФИЛЬТР — только если JR действительно может открыть сделку
                 # BUY: Прогноз JR выше текущей цены И прогноз SR еще выше (тренд подтвержден)
                 # SELL: Прогноз JR ниже текущей цены И прогноз SR еще ниже
-                current_price = data_jr[-1, 3] # Close последнего бара
-                
+                p_close_sr = None
                 allow_by_hierarchy = False
-                if p_close_jr > current_price and p_close_sr > p_close_jr:
-                    allow_by_hierarchy = True # Глобальный аптренд подтвержден
-                elif p_close_jr < current_price and p_close_sr < p_close_jr:
-                    allow_by_hierarchy = True # Глобальный даунтренд подтвержден
+                if self._needs_senior(p_close_jr, data_jr, atr_jr):
+                    p_close_sr = self._predict_senior()
+                    if p_close_sr is not None:
+                        current_price = self._last_close(data_jr)
+                        if p_close_jr > current_price and p_close_sr > p_close_jr:
+                            allow_by_hierarchy = True # Глобальный аптренд подтвержден
+                        elif p_close_jr < current_price and p_close_sr < p_close_jr:
+                            allow_by_hierarchy = True # Глобальный даунтренд подтвержден
+                else:
+                    self.sr_skipped += 1
 
                 # В) ПЕРЕДАЧА В ОРКЕСТРАТОР
-                trading_allowed = self._get_global_allow_flag() and allow_by_hierarchy
+                # Глобальный флаг уже проверен в _needs_senior: без него allow_by_hierarchy = False
+                trading_allowed = allow_by_hierarchy
                 
                 # Важно: Оркестратор работает по младшему ТФ, но с учетом фильтра старшего
                 self.orch.process_new_bar(
@@ -156,6 +177,36 @@ class TradingBot:
 
                 self.last_time = time_jr
 
+    def _last_close(self, data_jr):
+        """Close последнего бара в ценах (окно нормализовано скалером младшей модели)."""
+        scaler = self.brain_jr.scaler
+        return (data_jr[-1, 3] - scaler.min_[3]) / scaler.scale_[3]
+
+    def _needs_senior(self, p_close_jr, data_jr, atr_jr):
+        """
+        Ленивые этапы: SR нужен, только если агент торгует, торговля разрешена глобально
+        и прогноз JR уходит от текущей цены дальше нейтральной зоны (доля ATR).
+        Дешевые проверки идут первыми.
+        """
+        if self.mode != 'trade' or p_close_jr is None:
+            return False
+        if not self._get_global_allow_flag():
+            return False
+        neutral_zone = (atr_jr or 0.0) * JR_NEUTRAL_ATR_RATIO
+        return abs(p_close_jr - self._last_close(data_jr)) > neutral_zone
+
+    def _predict_senior(self):
+        """Данные и прогноз старшего ТФ (например, H1). None — данных недостаточно."""
+        data_sr, time_sr, _ = DataFactory.get_data(
+            self.symbol, self.tf_sr, self.brain_sr.window_size
+        )
+        if data_sr is None or len(data_sr) != self.brain_sr.window_size:
+            return None
+        self.sr_evals += 1
+        # Пока бар SR не сменился — из PredictionCache
+        p_close_sr, _, _ = self.brain_sr.predict(data_sr, bar_time=time_sr)
+        return p_close_sr
+
     def _update_visual_status(self):
         """Вынос логики статуса в отдельный метод для чистоты tick()"""
         if self.orch.needs_testing:
@@ -177,7 +228,17 @@ class TradingBot:
             "confidence": f"{self.orch.confidence_score}%", # Индекс доверия (оптимизация)
             "warnings": self.warnings,
             "is_active": not self.manual_stop,
-            "mode": self.mode
+            "mode": self.mode,
+            # Для шины состояний HMI (StateBus)
+            "prediction": [float(v) for v in self.brain_jr.last_prediction] if self.brain_jr.last_prediction is not None else None,
+            "mse_history": list(self.orch.ctrl.history_mse),
+            # Ленивая иерархия: сколько раз SR реально считался и сколько раз был пропущен
+            "sr_evals": self.sr_evals,
+            "sr_skipped": self.sr_skipped,
+            # Задание обучения (JobScheduler): этап, попытки, затраченный CPU
+            "job": JobScheduler.instance().get_progress(self.symbol_tf),
+            # Дистилляция: ускорение и изменение точности ученика относительно учителя
+            "distill": self.brain_jr.distill_report
         }
         
     def _check_pair_permission(self):
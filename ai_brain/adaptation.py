@@ -21,6 +21,7 @@ class Adaptation:
             return
 
         try:
+            self.brain.ensure_trainable()
             # 1. Подготовка данных через метод Brain (уже учитывает динамическое окно)
             X, y = self.brain.prepare_adaptation_data(data)
             
@@ -51,6 +52,8 @@ class Adaptation:
 
             # 5. Восстанавливаем оригинальный LR
             tf.keras.backend.set_value(self.brain.model.optimizer.lr, old_lr)
+            self.brain.fit_student(X, y, actual_epochs, adaptation_lr)
+            self.brain.on_weights_changed()
             
             mse = history.history['loss'][-1]
             log.info(f"[{self.brain.symbol_tf}] Адаптация завершена. Local MSE: {mse:.6f}")
@@ -61,7 +64,11 @@ class Adaptation:
     def force_update(self, X_batch, y_batch, epochs=5):
         """Принудительная адаптация на пакете свежих данных (например, после WARN)"""
         try:
+            self.brain.ensure_trainable()
             self.brain.model.fit(X_batch, y_batch, epochs=epochs, verbose=0, batch_size=len(X_batch))
+            self.brain.fit_student(X_batch, y_batch, epochs, self.brain.settings.get('learning_rate', 0.001),
+                                   batch_size=len(X_batch))
+            self.brain.on_weights_changed()
             log.info(f"[{self.brain.symbol_tf}] Принудительная адаптация пакета выполнена.")
         except Exception as e:
             log.error(f"[{self.brain.symbol_tf}] Ошибка при force_update: {e}")
@@ -0,0 +1,379 @@
+# FILE: ai_brain/benchmark.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Сравнение движков инференса Brain (Keras / ONNX Runtime) на стандартном окне 60x7:
+# задержка одиночного прогноза (p50 / p99), пропускная способность батча, прирост памяти процесса
+# и сверка выходов. Запуск: python -m ai_brain.benchmark [--runs N] [--batch B] [--agent ID]
+# Сравнение архитектур ModelBuilder на одной выборке (время обучения, задержка, параметры, MSE ModelTester):
+# python -m ai_brain.benchmark --architectures --agent ID [--epochs E]  (без --agent — синтетический ряд)
+# Раскладка рантайма обучения (процессы x потоки, привязка к ядрам, XLA): samples/sec суммарно по воркерам
+# python -m ai_brain.benchmark --training [--layouts 1x8,2x4,4x2] [--jit both|on|off] [--agent ID]
+# Подвыборка RecencySampler против всей истории (время обучения, MSE ModelTester):
+# python -m ai_brain.benchmark --sampler [--agent ID] [--epochs E] [--samples N]
+
+import os
+import gc
+import time
+import argparse
+import numpy as np
+from config import FEATURES, ONNX_PARITY_TOL
+from system_base.logger import get_logger
+
+log = get_logger("InferenceBenchmark")
+
+WINDOW = 60
+
+def _rss_mb():
+    """Резидентная память процесса, МБ (psutil, иначе /proc). None — недоступно."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+def _latency(fn, window, runs, warmup=20):
+    for _ in range(warmup):
+        fn(window)
+    times = np.empty(runs)
+    for i in range(runs):
+        t0 = time.perf_counter()
+        fn(window)
+        times[i] = time.perf_counter() - t0
+    return {"p50_ms": float(np.percentile(times, 50) * 1000), "p99_ms": float(np.percentile(times, 99) * 1000)}
+
+def _throughput(fn, batch, repeats=10):
+    fn(batch)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn(batch)
+    return len(batch) * repeats / (time.perf_counter() - t0)
+
+def _load_model(agent_id):
+    """Модель агента из бандла (если указан ID) или случайно инициализированная архитектура по умолчанию."""
+    from ai_brain.modelbuilder import ModelBuilder
+    if agent_id is None:
+        return ModelBuilder.build_lstm_model(WINDOW, FEATURES, compile_model=False), WINDOW
+    from ai_brain.bundle import read_bundle, bundle_path
+    bundle = read_bundle(bundle_path(agent_id))
+    win = int(bundle.settings.get('window_size', WINDOW))
+    model = ModelBuilder.build_lstm_model(win, FEATURES, bundle.settings, compile_model=False)
+    model.set_weights(bundle.weights)
+    return model, win
+
+def run_benchmark(runs=500, batch_size=64, agent_id=None, seed=0):
+    """-> { 'keras': {...}, 'onnx': {...} | None, 'parity_max_diff': float | None }"""
+    # tf2onnx импортирует TensorFlow: только здесь, а не при импорте модуля (воркеры --training
+    # настраивают рантайм TF до первого импорта)
+    from ai_brain import onnx_backend
+    rng = np.random.default_rng(seed)
+    rss0 = _rss_mb()
+    model, win = _load_model(agent_id)
+    window = rng.random((1, win, FEATURES)).astype(np.float32)
+    batch = rng.random((batch_size, win, FEATURES)).astype(np.float32)
+
+    keras_predict = lambda x: model.predict(x, verbose=0)
+    report = {"window": f"{win}x{FEATURES}", "batch": batch_size}
+    report["keras"] = _latency(keras_predict, window, runs)
+    report["keras"]["batch_samples_per_sec"] = _throughput(keras_predict, batch)
+    rss_keras = _rss_mb()
+    report["keras"]["rss_delta_mb"] = None if rss0 is None else rss_keras - rss0
+
+    report["onnx"], report["parity_max_diff"] = None, None
+    if not onnx_backend.ONNX_AVAILABLE:
+        log.warning("onnxruntime / tf2onnx не установлены: замер только для Keras.")
+        return report
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.onnx")
+        if not onnx_backend.export_onnx(model, win, FEATURES, path):
+            return report
+        gc.collect()
+        rss1 = _rss_mb()
+        predictor = onnx_backend.OnnxPredictor(path)
+        report["onnx"] = _latency(predictor.predict, window, runs)
+        report["onnx"]["batch_samples_per_sec"] = _throughput(predictor.predict, batch)
+        report["onnx"]["rss_delta_mb"] = None if rss1 is None else _rss_mb() - rss1
+
+        series = rng.random((win * 3, FEATURES)).astype(np.float32)
+        report["parity_max_diff"], report["parity_ok"] = onnx_backend.check_parity(
+            model, predictor, series, win, ONNX_PARITY_TOL)
+    return report
+
+# --- АРХИТЕКТУРЫ ---
+def _synthetic_dataset(n_rows, window, seed=0):
+    """Случайное блуждание OHLCV + RSI/ATR-подобные признаки, MinMax -> (X, y, scaler)."""
+    from sklearn.preprocessing import MinMaxScaler
+    from data_sys.databasemanager import make_windows
+
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 5e-4, n_rows))
+    spread = np.abs(rng.normal(0, 3e-4, n_rows))
+    open_ = np.r_[close[0], close[:-1]]
+    high, low = np.maximum(open_, close) + spread, np.minimum(open_, close) - spread
+    volume = rng.gamma(2.0, 500.0, n_rows)
+    diff = np.diff(close, prepend=close[0])
+    rsi = 50 + 50 * np.tanh(np.convolve(diff, np.ones(14) / 14, mode='same') / 5e-4)
+    atr = np.convolve(high - low, np.ones(14) / 14, mode='same')
+    raw = np.column_stack([open_, high, low, close, volume, rsi, atr])
+    scaler = MinMaxScaler()
+    data = scaler.fit_transform(raw).astype(np.float32)
+    X, y = make_windows(data, window)
+    return X, y, scaler
+
+def _load_dataset(agent_id, window):
+    """Выборка агента через load_training_data_parallel (shared memory, один раз на все архитектуры)."""
+    from data_sys.databasemanager import DatabaseManager
+    datasets = DatabaseManager().load_training_data_parallel([agent_id], {agent_id: window})
+    return datasets.get(agent_id)
+
+def run_architecture_benchmark(agent_id=None, architectures=None, epochs=5, runs=200, seed=0):
+    """
+    Каждая архитектура обучается на одной и той же выборке (90/10, как в Education) с настройками агента.
+    -> { arch: {params, train_sec, p50_ms, p99_ms, mse} }, либо None без данных.
+    """
+    import tensorflow as tf
+    from ai_brain.modelbuilder import ModelBuilder, ARCHITECTURES
+    from ai_brain.testing import ModelTester
+    from data_sys.databasemanager import DatabaseManager
+
+    settings = DatabaseManager().get_model_settings(agent_id) if agent_id else {}
+    win = int(settings.get('window_size', WINDOW))
+    batch_size = int(settings.get('batch_size', 32))
+
+    dataset = None
+    if agent_id is not None:
+        dataset = _load_dataset(agent_id, win)
+        if dataset is None:
+            log.error(f"[{agent_id}] Нет обучающей выборки для сравнения архитектур.")
+            return None
+        X, y, scaler = dataset.X, dataset.y, dataset.scaler
+    else:
+        X, y, scaler = _synthetic_dataset(20000, win, seed)
+
+    split = int(len(X) * 0.9)
+    X_train, X_test, y_train, y_test = X[:split], X[split:], y[:split], y[split:]
+    window = np.ascontiguousarray(X_test[:1], dtype=np.float32)
+    report = {}
+    try:
+        for arch in architectures or ARCHITECTURES:
+            tf.keras.utils.set_random_seed(seed)
+            model = ModelBuilder.build_lstm_model(win, FEATURES, {**settings, 'architecture': arch})
+            t0 = time.perf_counter()
+            model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size, verbose=0)
+            train_sec = time.perf_counter() - t0
+            _, mse = ModelTester.run_performance_test(agent_id or "SYNTHETIC", model, X_test, y_test, scaler)
+            report[arch] = {"params": int(model.count_params()), "train_sec": train_sec,
+                            **_latency(lambda x, m=model: m.predict(x, verbose=0), window, runs), "mse": float(mse)}
+            log.info(f"[{arch}] params={report[arch]['params']} train={train_sec:.1f}s mse={mse:.6f}")
+            del model
+            tf.keras.backend.clear_session()
+    finally:
+        if dataset is not None:
+            dataset.release()
+    return report
+
+def pick_cheapest(report, mse_tolerance=0.1):
+    """Самая быстрая (p50) архитектура с MSE не хуже лучшей более чем на mse_tolerance (доля)."""
+    best = min(r["mse"] for r in report.values())
+    eligible = [a for a, r in report.items() if r["mse"] <= best * (1 + mse_tolerance)]
+    return min(eligible, key=lambda a: (report[a]["p50_ms"], report[a]["params"]))
+
+def _print_arch_report(report, mse_tolerance):
+    print(f"{'архитектура':<12}{'параметры':>11}{'обучение, с':>13}{'p50, мс':>10}{'p99, мс':>10}{'MSE':>14}")
+    for arch, r in report.items():
+        print(f"{arch:<12}{r['params']:>11}{r['train_sec']:>13.1f}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['mse']:>14.3e}")
+    print(f"Дешевле всех в пределах +{mse_tolerance:.0%} MSE от лучшей: {pick_cheapest(report, mse_tolerance)}")
+
+# --- РАНТАЙМ ОБУЧЕНИЯ ---
+def _train_worker(task):
+    """
+    Процесс-воркер (spawn): рантайм настраивается до импорта TensorFlow, затем прогрев
+    (трассировка / XLA-компиляция шага) и замер model.fit -> samples/sec.
+    """
+    data_path, cores, threads, jit, settings, epochs = task
+    from ai_brain.runtime import TrainingRuntime
+    TrainingRuntime.configure_process(intra=threads, inter=1, cores=cores, jit_compile=jit)
+    from ai_brain.modelbuilder import ModelBuilder
+
+    X = np.load(data_path + ".X.npy", mmap_mode="r")
+    y = np.load(data_path + ".y.npy", mmap_mode="r")
+    batch_size = int(settings.get('batch_size', 32))
+    model = ModelBuilder.build_lstm_model(X.shape[1], FEATURES, settings)
+    model.fit(X[:batch_size * 8], y[:batch_size * 8], epochs=1, batch_size=batch_size, verbose=0)
+
+    t0 = time.perf_counter()
+    model.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0)
+    return len(X) * epochs / (time.perf_counter() - t0)
+
+def default_layouts(n_cores=None):
+    """(процессов, потоков на процесс) для числа ядер: 1 x N, 2 x N/2, 4 x N/4, N x 1."""
+    from ai_brain.runtime import TrainingRuntime
+    n = n_cores or len(TrainingRuntime.available_cores())
+    layouts = []
+    for workers in (1, 2, 4, n):
+        if workers <= n and (workers, n // workers) not in layouts:
+            layouts.append((workers, n // workers))
+    return layouts
+
+def run_training_benchmark(layouts=None, jit_modes=(False, True), agent_id=None, samples=8192, epochs=2, seed=0):
+    """
+    Каждый воркер — отдельный процесс на своем наборе ядер (TrainingRuntime.split_cores), все учат
+    одну и ту же выборку одновременно, как параллельные обучения на хосте.
+    -> [ {workers, threads, jit, samples_per_sec, per_worker} ] по убыванию samples_per_sec.
+    """
+    import tempfile
+    import multiprocessing as mp
+    from ai_brain.runtime import TrainingRuntime
+
+    settings = {}
+    if agent_id is not None:
+        from data_sys.databasemanager import DatabaseManager
+        settings = DatabaseManager().get_model_settings(agent_id)
+    win = int(settings.get('window_size', WINDOW))
+    if agent_id is not None:
+        dataset = _load_dataset(agent_id, win)
+        if dataset is None:
+            log.error(f"[{agent_id}] Нет обучающей выборки для замера рантайма.")
+            return None
+        X, y = np.ascontiguousarray(dataset.X[-samples:]), np.ascontiguousarray(dataset.y[-samples:])
+        dataset.release()
+    else:
+        X, y, _ = _synthetic_dataset(samples + win + 1, win, seed)
+        X, y = np.ascontiguousarray(X[-samples:]), np.ascontiguousarray(y[-samples:])
+
+    results = []
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "train")
+        np.save(data_path + ".X.npy", X)
+        np.save(data_path + ".y.npy", y)
+        for workers, threads in layouts or default_layouts():
+            slices = TrainingRuntime.split_cores(workers)
+            for jit in jit_modes:
+                tasks = [(data_path, cores, threads, jit, settings, epochs) for cores in slices]
+                try:
+                    with ctx.Pool(len(tasks)) as pool:
+                        rates = pool.map(_train_worker, tasks)
+                except Exception as e:
+                    log.error(f"Раскладка {workers}x{threads} (jit={jit}) не выполнена: {e}")
+                    continue
+                results.append({"workers": len(tasks), "threads": threads, "jit": jit,
+                                "samples_per_sec": float(sum(rates)), "per_worker": float(np.mean(rates))})
+                log.info(f"Раскладка {len(tasks)}x{threads} jit={jit}: {sum(rates):.0f} samples/sec")
+    return sorted(results, key=lambda r: -r["samples_per_sec"])
+
+# --- ПОДВЫБОРКА ОБУЧЕНИЯ ---
+def run_sampler_benchmark(agent_id=None, epochs=5, samples_per_epoch=None, history=100000, seed=0):
+    """
+    Одна и та же модель (настройки агента, одинаковая инициализация) учится на всех окнах
+    и на подвыборке RecencySampler; обе оцениваются ModelTester на одной отложенной части (10%).
+    -> { 'full': {train_sec, mse}, 'sampled': {...}, 'windows', 'per_epoch' } или None.
+    """
+    import tensorflow as tf
+    from config import SAMPLER_SAMPLES_PER_EPOCH
+    from ai_brain.modelbuilder import ModelBuilder
+    from ai_brain.testing import ModelTester
+    from ai_brain.sampler import RecencySampler, fit_sampled
+    from data_sys.databasemanager import DatabaseManager
+
+    settings = DatabaseManager().get_model_settings(agent_id) if agent_id else {}
+    win = int(settings.get('window_size', WINDOW))
+    batch_size = int(settings.get('batch_size', 32))
+
+    dataset = None
+    if agent_id is not None:
+        dataset = _load_dataset(agent_id, win)
+        if dataset is None:
+            log.error(f"[{agent_id}] Нет обучающей выборки для сравнения подвыборки.")
+            return None
+        X, y, scaler = dataset.X, dataset.y, dataset.scaler
+    else:
+        X, y, scaler = _synthetic_dataset(history, win, seed)
+
+    split = int(len(X) * 0.9)
+    X_train, X_test, y_train, y_test = X[:split], X[split:], y[:split], y[split:]
+    sampler = RecencySampler(X_train, samples_per_epoch=samples_per_epoch or SAMPLER_SAMPLES_PER_EPOCH, seed=seed)
+    report = {"windows": len(X_train), "per_epoch": sampler.samples_per_epoch}
+    try:
+        for name, smp in (("full", None), ("sampled", sampler)):
+            tf.keras.utils.set_random_seed(seed)
+            model = ModelBuilder.build_lstm_model(win, FEATURES, settings)
+            train_sec = fit_sampled(model, X_train, y_train, epochs, batch_size, smp)
+            _, mse = ModelTester.run_performance_test(agent_id or "SYNTHETIC", model, X_test, y_test, scaler)
+            report[name] = {"train_sec": train_sec, "mse": float(mse)}
+            del model
+            tf.keras.backend.clear_session()
+    finally:
+        if dataset is not None:
+            dataset.release()
+    return report
+
+def _print_sampler_report(report):
+    full, sampled = report["full"], report["sampled"]
+    print(f"Окон обучения: {report['windows']}, подвыборка: {report['per_epoch']} на эпоху")
+    print(f"{'режим':<12}{'обучение, с':>13}{'MSE':>14}")
+    for name in ("full", "sampled"):
+        print(f"{name:<12}{report[name]['train_sec']:>13.1f}{report[name]['mse']:>14.3e}")
+    delta = (sampled["mse"] - full["mse"]) / full["mse"] if full["mse"] > 0 else 0.0
+    print(f"Ускорение x{full['train_sec'] / sampled['train_sec']:.1f}, изменение MSE {delta:+.1%}")
+
+def _print_training_report(results):
+    print(f"{'процессы x потоки':<20}{'XLA':>6}{'samples/sec':>14}{'на процесс':>13}")
+    for r in results:
+        print(f"{str(r['workers']) + ' x ' + str(r['threads']):<20}{'да' if r['jit'] else 'нет':>6}"
+              f"{r['samples_per_sec']:>14.0f}{r['per_worker']:>13.0f}")
+    if results:
+        best = results[0]
+        print(f"Лучшая раскладка: {best['workers']} x {best['threads']}, XLA {'вкл' if best['jit'] else 'выкл'} "
+              f"(TRAIN_INTRA_OP_THREADS={best['threads']}, TRAIN_JIT_COMPILE={best['jit']})")
+
+def _print_report(report):
+    print(f"Окно {report['window']}, батч {report['batch']}")
+    print(f"{'движок':<8}{'p50, мс':>10}{'p99, мс':>10}{'батч, окон/с':>16}{'RSS +МБ':>10}")
+    for name in ("keras", "onnx"):
+        r = report.get(name)
+        if r is None:
+            print(f"{name:<8}{'—':>10}")
+            continue
+        rss = "—" if r["rss_delta_mb"] is None else f"{r['rss_delta_mb']:.1f}"
+        print(f"{name:<8}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['batch_samples_per_sec']:>16.0f}{rss:>10}")
+    if report["parity_max_diff"] is not None:
+        verdict = "OK" if report["parity_ok"] else "FAIL"
+        print(f"Паритет ONNX/Keras: max|diff| = {report['parity_max_diff']:.2e} -> {verdict}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк движков инференса Keras / ONNX Runtime")
+    parser.add_argument("--runs", type=int, default=500, help="Одиночных прогнозов на движок")
+    parser.add_argument("--batch", type=int, default=64, help="Размер батча для пропускной способности")
+    parser.add_argument("--agent", default=None, help="ID агента: замер на его обученной модели (бандл) / выборке")
+    parser.add_argument("--architectures", action="store_true", help="Сравнение архитектур ModelBuilder")
+    parser.add_argument("--epochs", type=int, default=5, help="Эпох обучения на архитектуру")
+    parser.add_argument("--mse-tol", type=float, default=0.1, help="Допуск MSE от лучшей архитектуры (доля)")
+    parser.add_argument("--training", action="store_true", help="Раскладки рантайма обучения (samples/sec)")
+    parser.add_argument("--layouts", default=None, help="Раскладки 'процессы x потоки', например 1x8,2x4")
+    parser.add_argument("--jit", choices=("both", "on", "off"), default="both", help="Замер с XLA / без")
+    parser.add_argument("--samples", type=int, default=None,
+                        help="Окон в выборке замера обучения (--training, 8192) / на эпоху (--sampler)")
+    parser.add_argument("--sampler", action="store_true", help="RecencySampler против всей истории")
+    args = parser.parse_args()
+    if args.sampler:
+        sampler_report = run_sampler_benchmark(args.agent, args.epochs, args.samples)
+        if sampler_report:
+            _print_sampler_report(sampler_report)
+    elif args.training:
+        layouts = [tuple(int(v) for v in item.split("x")) for item in args.layouts.split(",")] if args.layouts else None
+        jit_modes = {"both": (False, True), "on": (True,), "off": (False,)}[args.jit]
+        train_report = run_training_benchmark(layouts, jit_modes, args.agent, args.samples or 8192, args.epochs)
+        if train_report:
+            _print_training_report(train_report)
+    elif args.architectures:
+        arch_report = run_architecture_benchmark(args.agent, epochs=args.epochs, runs=args.runs)
+        if arch_report:
+            _print_arch_report(arch_report, args.mse_tol)
+    else:
+        _print_report(run_benchmark(args.runs, args.batch, args.agent))
@@ -1,15 +1,24 @@
 # ai_brain/brain.py
 import os
+import itertools
 import numpy as np
 import joblib
-from config import MODELS_DIR, FEATURES
-from ai_brain.modelbuilder import ModelBuilder
+from config import MODELS_DIR, FEATURES, ONNX_PARITY_TOL
+from ai_brain.modelbuilder import ModelBuilder, DEFAULT_ARCHITECTURE
+from ai_brain.streaming import StreamingLSTM
+from ai_brain.prediction_cache import PredictionCache
+from ai_brain.residency import ModelResidency
+from ai_brain.bundle import bundle_path, student_path, read_bundle, read_header, write_bundle, ARCH_KEYS
+from ai_brain import onnx_backend
 from system_base.logger import get_logger
 
-from data_sys.databasemanager import DatabaseManager
+from data_sys.databasemanager import DatabaseManager, _get_indicator_settings
 
 log = get_logger("Brain")
 
+# Версии моделей — общий счетчик процесса: ключи PredictionCache не совпадут у разных Brain
+_MODEL_VERSIONS = itertools.count(1)
+
 class Brain:
     def __init__(self, symbol_tf):
         self.symbol_tf = symbol_tf
@@ -23,22 +32,84 @@ class Brain:
         
         # 2. ПЕРЕДАЕМ НАСТРОЙКИ В СТРОИТЕЛЬ
         self.settings = self.db.get_model_settings(self.symbol_tf)
-        self.window_size = self.settings.get('window_size', 60)
-        # Теперь передаем ТОЛЬКО локальное значение:
-        self.model = ModelBuilder.build_lstm_model(self.window_size, FEATURES, self.settings)
-        
+        self.bundle_path = bundle_path(self.symbol_tf)
+        self.fingerprint = None
+        # self.settings — актуальные настройки БД (по ним строятся и обучаются новые модели).
+        # self.live_settings — настройки графа живой модели: архитектура обученных весов из заголовка
+        # бандла (веса гарантированно совпадут с графом), остальное — из БД.
+        self.live_settings = dict(self.settings)
+        if os.path.exists(self.bundle_path):
+            try:
+                stored = read_header(self.bundle_path).settings
+                stored.setdefault('architecture', DEFAULT_ARCHITECTURE) # Бандлы до выбора архитектуры — стек LSTM
+                self.live_settings.update({k: stored[k] for k in ARCH_KEYS if k in stored})
+            except Exception as e:
+                log.error(f"[{self.symbol_tf}] Заголовок бандла не прочитан: {e}")
+        self.window_size = self.live_settings.get('window_size', 60)
         self.last_prediction = None
         self.scaler = None
+        self._model = None
+
+        # Теперь передаем ТОЛЬКО локальное значение. Граф для инференса, оптимизатор — перед обучением
+        self.model = ModelBuilder.build_lstm_model(self.window_size, FEATURES, self.live_settings, compile_model=False)
+        self.model_version = next(_MODEL_VERSIONS) # Новая при каждой смене весов (ключ PredictionCache)
+
+        # Потоковый инференс (opt-in через model_settings.inference_mode = 'stream')
+        self.inference_mode = self.settings.get('inference_mode', 'window')
+        self.stream = None
+
+        # Движок инференса (model_settings.backend): 'keras' или 'onnx'
+        self.backend = self.settings.get('backend', 'keras')
+        self.onnx = None
+        self.onnx_path = onnx_backend.onnx_path(self.symbol_tf)
+
+        # Ученик дистилляции (Distiller): если есть — обслуживает прогнозы вместо учителя self.model
+        self.student = None
+        self.student_path = student_path(self.symbol_tf)
+        self.distill_report = None
         
         self.weights_path = os.path.join(MODELS_DIR, f"lstm_{self.symbol_tf}.h5")
         self.scaler_path = os.path.join(MODELS_DIR, f"scaler_{self.symbol_tf}.pkl")
 
+    @property
+    def model(self):
+        """Модель под управлением ModelResidency: вытесненная собирается заново при обращении."""
+        if self._model is None:
+            ModelResidency.reload(self)
+        else:
+            ModelResidency.touch(self)
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+        ModelResidency.register(self)
+
+    @property
+    def serving_model(self):
+        """Модель прогнозов: ученик дистилляции, иначе учитель."""
+        return self.student if self.student is not None else self.model
+
     def load_weights(self):
+        """Бандл model_{ID}.fxb (веса + скалер одним файлом), иначе наследие: .h5 + .pkl."""
+        if os.path.exists(self.bundle_path):
+            try:
+                bundle = read_bundle(self.bundle_path)
+                self.model.set_weights(bundle.weights)
+                self.scaler = bundle.scaler
+                self.fingerprint = bundle.fingerprint
+                self._load_student()
+                self.on_weights_changed(from_disk=True)
+                return True
+            except Exception as e:
+                log.error(f"[{self.symbol_tf}] Ошибка загрузки бандла: {e}")
+
         if os.path.exists(self.weights_path):
             try:
                 self.model.load_weights(self.weights_path)
                 if os.path.exists(self.scaler_path):
                     self.scaler = joblib.load(self.scaler_path)
+                    self.on_weights_changed(from_disk=True)
                     return True
                 else:
                     log.error(f"[{self.symbol_tf}] Scaler (.pkl) не найден.")
@@ -46,30 +117,232 @@ class Brain:
                 log.error(f"[{self.symbol_tf}] Ошибка загрузки весов: {e}")
         return False
 
-    def predict(self, data_window):
+    def save_bundle(self, model, scaler, fingerprint=None, settings=None):
+        """
+        Атомарная запись бандла: веса, скалер, настройки, индикаторы, отпечаток выборки.
+        settings — настройки, по которым построена model (по умолчанию — граф живой модели).
+        """
+        write_bundle(self.bundle_path, self.symbol_tf, model.get_weights(), scaler, settings or self.live_settings,
+                     _get_indicator_settings(self.symbol_tf), fingerprint)
+        self.fingerprint = fingerprint
+
+    # --- УЧЕНИК (ДИСТИЛЛЯЦИЯ) ---
+    def _load_student(self):
+        """Ученик с диска — только если он дистиллирован из текущего учителя (тот же отпечаток выборки)."""
+        self.student = None
+        if not os.path.exists(self.student_path):
+            return
+        try:
+            bundle = read_bundle(self.student_path)
+            if self.fingerprint is None or bundle.extra.get('teacher_fingerprint') != self.fingerprint:
+                log.info(f"[{self.symbol_tf}] Ученик дистилляции устарел (другой учитель), прогноз — учителем.")
+                return
+            student = ModelBuilder.build_lstm_model(bundle.settings.get('window_size', self.window_size), FEATURES,
+                                                    bundle.settings, compile_model=False)
+            student.set_weights(bundle.weights)
+            self.student = student
+            self.distill_report = bundle.extra.get('distillation')
+        except Exception as e:
+            log.error(f"[{self.symbol_tf}] Ошибка загрузки ученика: {e}")
+
+    def set_student(self, student, settings, report, scaler, fingerprint):
+        """
+        Итог дистилляции: student=None — ученик отклонен (прежний удаляется, прогноз учителем).
+        Вызывается до on_weights_changed, чтобы поток / ONNX пересобрались под обслуживающую модель.
+        """
+        self.distill_report = report
+        if student is None:
+            self.student = None
+            if os.path.exists(self.student_path):
+                os.remove(self.student_path)
+            return
+        write_bundle(self.student_path, self.symbol_tf, student.get_weights(), scaler, settings,
+                     _get_indicator_settings(self.symbol_tf), fingerprint,
+                     extra={'teacher_fingerprint': fingerprint, 'distillation': report})
+        self.student = student
+
+    def fit_student(self, X, y, epochs, learning_rate, batch_size=1):
+        """Адаптация ученика на том же пакете, что и учитель (иначе он отстанет от учителя)."""
+        if self.student is None:
+            return
+        if getattr(self.student, 'optimizer', None) is None:
+            ModelBuilder.compile_model(self.student, {**self.settings, 'learning_rate': learning_rate})
+        self.student.fit(X, y, epochs=epochs, batch_size=batch_size, verbose=0)
+
+    def ensure_trainable(self):
+        """Живая модель собрана без оптимизатора: компиляция перед обучением / адаптацией."""
+        model = self.model
+        if getattr(model, 'optimizer', None) is None:
+            ModelBuilder.compile_model(model, self.settings)
+        return model
+
+    def settings_changed(self):
+        """Архитектура или окно в БД отличаются от живой модели: новое обучение — на новом графе."""
+        defaults = {'window_size': 60, 'lstm_units': 100, 'dropout_rate': 0.2, 'architecture': DEFAULT_ARCHITECTURE}
+        return any(self.settings.get(k, v) != self.live_settings.get(k, v) for k, v in defaults.items())
+
+    def predict(self, data_window, bar_time=None):
         """
         data_window: нормализованный тензор [WINDOW_SIZE, FEATURES]
+        bar_time: время последнего бара окна; без него ключ кэша — хэш окна.
         """
         if self.scaler is None:
             if not self.load_weights():
                 raise RuntimeError(f"Модель для {self.symbol_tf} не готова.")
 
-        x_input = np.expand_dims(data_window, axis=0)
-        raw_pred = self.model.predict(x_input, verbose=0)[0] # Ожидаем [Close, High, Low] нормализованные
+        keys = [(self.symbol_tf, PredictionCache.window_digest(data_window), self.model_version)]
+        if bar_time is not None:
+            keys.insert(0, (self.symbol_tf, int(bar_time), self.model_version))
+        cached = PredictionCache.get(keys)
+        if cached is not None:
+            self.last_prediction = np.array(cached)
+            return cached
+
+        if self.stream is not None:
+            # Один шаг LSTM на закрытый бар вместо прогона всего окна
+            raw_pred = self.stream.predict(data_window)
+        elif self.onnx is not None:
+            # onnxruntime: без обращения к Keras-модели (вытесненная модель не перезагружается)
+            raw_pred = self.onnx.predict(data_window)[0]
+        else:
+            x_input = np.expand_dims(data_window, axis=0)
+            raw_pred = self.serving_model.predict(x_input, verbose=0)[0] # Ожидаем [Close, High, Low] нормализованные
         
-        # ДЕНОРМАЛИЗАЦИЯ (Индексы в Scaler: 0:Open, 1:High, 2:Low, 3:Close, 4:Vol, 5:RSI, 6:ATR)
-        # ВАЖНО: В Education.py и DataFactory порядок должен быть именно таким.
         try:
-            p_close = (raw_pred[0] - self.scaler.min_[3]) / self.scaler.scale_[3]
-            p_high  = (raw_pred[1] - self.scaler.min_[1]) / self.scaler.scale_[1]
-            p_low   = (raw_pred[2] - self.scaler.min_[2]) / self.scaler.scale_[2]
+            p_close, p_high, p_low = (float(v) for v in self._denormalize(raw_pred))
             
             self.last_prediction = np.array([p_close, p_high, p_low])
+            PredictionCache.put(keys, (p_close, p_high, p_low))
             return p_close, p_high, p_low
         except Exception as e:
             log.error(f"[{self.symbol_tf}] Ошибка денормализации: {e}")
             return None, None, None
 
+    def predict_batch(self, windows):
+        """
+        Прогноз по набору окон [B, WINDOW_SIZE, FEATURES] одним вызовом (бэктест, сверка, бенчмарк).
+        Возвращает [B, 3]: Close, High, Low в реальных ценах. Кэш и потоковое состояние не используются.
+        """
+        if self.scaler is None:
+            if not self.load_weights():
+                raise RuntimeError(f"Модель для {self.symbol_tf} не готова.")
+        windows = np.asarray(windows, dtype=np.float32)
+        if self.onnx is not None:
+            raw = self.onnx.predict(windows)
+        else:
+            raw = self.serving_model.predict(windows, verbose=0)
+        return self._denormalize(raw)
+
+    def test_mse(self, X, y, scaler):
+        """
+        MSE обслуживающей модели на чужой выборке: окна X и факт y нормированы скалером scaler
+        (новый скалер теневого обучения). Окна переводятся в нормировку self.scaler, прогноз —
+        обратно в нормировку scaler, чтобы MSE сравнивался с ModelTester теневой модели.
+        -> MSE или None (нет весов / другое окно).
+        """
+        if self.scaler is None or X.shape[1] != self.window_size:
+            return None
+        raw = (X - scaler.min_) / scaler.scale_
+        x_live = (raw * self.scaler.scale_ + self.scaler.min_).astype(np.float32)
+        pred = self.predict_batch(x_live)
+        cols = [3, 1, 2]
+        pred_scaled = pred * scaler.scale_[cols] + scaler.min_[cols]
+        return float(np.mean((pred_scaled - y) ** 2))
+
+    def _denormalize(self, raw):
+        """
+        raw [..., 3] нормализованные [Close, High, Low] -> реальные цены.
+        Индексы в Scaler: 0:Open, 1:High, 2:Low, 3:Close, 4:Vol, 5:RSI, 6:ATR
+        ВАЖНО: В Education.py и DataFactory порядок должен быть именно таким.
+        """
+        cols = [3, 1, 2]
+        return (np.asarray(raw, dtype=np.float64) - self.scaler.min_[cols]) / self.scaler.scale_[cols]
+
+    def build_shadow(self):
+        """
+        Модель для обучения по актуальным настройкам БД. Веса живой модели копируются (если загружены),
+        только когда архитектура и окно не менялись.
+        """
+        shadow = ModelBuilder.build_lstm_model(self.settings.get('window_size', 60), FEATURES, self.settings)
+        if self.scaler is not None and not self.settings_changed():
+            shadow.set_weights(self.model.get_weights())
+        return shadow
+
+    def swap_model(self, model, scaler, fingerprint=None, distilled=None):
+        """
+        Горячая замена обученной теневой модели. Вызывается из потока main loop между барами:
+        пара (model, scaler) меняется одним присваиванием, живая модель работала до этого момента.
+        Бандл пишется атомарно, рестарт не увидит половину файла.
+        distilled: (student | None, settings, report) — итог дистилляции теневой модели.
+        Модель построена по self.settings (build_shadow): граф живой модели и окно берутся оттуда.
+        """
+        self.save_bundle(model, scaler, fingerprint, self.settings)
+        student, settings, report = distilled or (None, None, None)
+        self.set_student(student, settings, report, scaler, fingerprint)
+        self.live_settings = dict(self.settings)
+        self.window_size = self.live_settings.get('window_size', 60)
+        self.model, self.scaler = model, scaler
+        self.on_weights_changed()
+        log.info(f"[{self.symbol_tf}] Горячая замена модели: версия {self.model_version}")
+
+    def on_weights_changed(self, from_disk=False):
+        """
+        Вызывается после загрузки / обучения / адаптации весов:
+        новая версия модели (старые прогнозы в кэше больше не совпадут), пересборка потокового состояния
+        и сессии ONNX (после обучения — новый экспорт, при загрузке с диска — готовый .onnx, если он свежий).
+        """
+        self.model_version = next(_MODEL_VERSIONS)
+        self._init_stream()
+        self._init_onnx(export=not from_disk)
+
+    def _init_stream(self):
+        """Потоковое состояние для текущей модели (после смены весов или перезагрузки из ModelResidency)."""
+        if self.inference_mode != 'stream':
+            return
+        serving = self.student if self.student is not None else self._model
+        try:
+            if self.stream is None or self.stream.model is not serving:
+                self.stream = StreamingLSTM(serving, resync_every=int(self.settings.get('stream_resync', 60)))
+            else:
+                self.stream.reload_weights()
+        except ValueError as e:
+            log.error(f"[{self.symbol_tf}] Потоковый инференс недоступен, оконный режим: {e}")
+            self.stream = None
+            self.inference_mode = 'window'
+
+    def _init_onnx(self, export=False):
+        """
+        Сессия onnxruntime для backend = 'onnx'. Экспорт model_{ID}.onnx — после смены весов
+        (export=True) или если файл отсутствует / экспортирован из других весов: в metadata_props .onnx
+        хранятся отпечаток выборки бандла и отпечаток весов, они сверяются с загруженной моделью
+        (после адаптации .onnx новее бандла, но веса в нем другие). Новый экспорт сверяется с Keras;
+        при любой ошибке агент остается на Keras.
+        """
+        if self.backend != 'onnx':
+            return
+        try:
+            model = self.serving_model
+            meta = {'fingerprint': str(self.fingerprint), 'weights': onnx_backend.weights_digest(model)}
+            predictor = None
+            if not export and os.path.exists(self.onnx_path):
+                predictor = onnx_backend.OnnxPredictor(self.onnx_path)
+                if any(predictor.metadata.get(k) != v for k, v in meta.items()):
+                    log.info(f"[{self.symbol_tf}] {os.path.basename(self.onnx_path)} экспортирован из других весов, повторный экспорт.")
+                    predictor = None
+            if predictor is None:
+                if not onnx_backend.export_onnx(model, self.window_size, FEATURES, self.onnx_path, meta):
+                    raise RuntimeError("экспорт не выполнен")
+                predictor = onnx_backend.OnnxPredictor(self.onnx_path)
+                probe = np.random.default_rng(0).random((2 * self.window_size, FEATURES)).astype(np.float32)
+                max_diff, ok = onnx_backend.check_parity(model, predictor, probe, self.window_size, ONNX_PARITY_TOL)
+                if not ok:
+                    raise RuntimeError(f"расхождение с Keras {max_diff:.2e}")
+            self.onnx = predictor
+        except Exception as e:
+            log.error(f"[{self.symbol_tf}] ONNX недоступен, инференс через Keras: {e}")
+            self.onnx = None
+            self.backend = 'keras'
+
     def calculate_mse(self, fact_ohl):
         """fact_ohl: [Close, High, Low] в реальных ценах"""
         if self.last_prediction is None: return 0.0
@@ -0,0 +1,180 @@
+# FILE: ai_brain/bundle.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Единый файл модели агента (model_{ID}.fxb): веса, параметры скалера, настройки,
+# параметры индикаторов и отпечаток обучающей выборки. Веса — сырые массивы, выровненные по 64 байта,
+# читаются через mmap без пересборки графа и оптимизатора. Запись атомарная (tmp + os.replace).
+#
+# Формат v1:
+#   8 байт   magic b'FXLSTMB1'
+#   4 байта  длина JSON-заголовка (uint32 LE)
+#   N байт   JSON-заголовок (arrays: name, dtype, shape, offset, nbytes)
+#   ...      массивы, каждый с offset, кратным 64
+
+import os
+import json
+import time
+import struct
+import hashlib
+import tempfile
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler
+from config import MODELS_DIR
+from system_base.logger import get_logger
+
+log = get_logger("ModelBundle")
+
+MAGIC = b'FXLSTMB1'
+FORMAT_VERSION = 1
+ALIGN = 64
+# Настройки, определяющие архитектуру: берутся из бандла, а не из БД, чтобы веса всегда совпали с графом
+ARCH_KEYS = ('window_size', 'lstm_units', 'dropout_rate', 'architecture')
+_SCALER_FIELDS = ('min_', 'scale_', 'data_min_', 'data_max_', 'data_range_')
+
+def bundle_path(symbol_tf):
+    return os.path.join(MODELS_DIR, f"model_{symbol_tf}.fxb")
+
+def student_path(symbol_tf):
+    """Бандл ученика (дистилляция): обслуживает прогнозы вместо учителя model_{ID}.fxb."""
+    return os.path.join(MODELS_DIR, f"model_{symbol_tf}.student.fxb")
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+def fingerprint_training_data(X, y):
+    """Отпечаток обучающей выборки: формы, цели и крайние окна (без материализации всех окон)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((X.shape, y.shape)).encode())
+    h.update(np.ascontiguousarray(y).tobytes())
+    if len(X):
+        h.update(np.ascontiguousarray(X[0]).tobytes())
+        h.update(np.ascontiguousarray(X[-1]).tobytes())
+    return h.hexdigest()
+
+def scaler_to_params(scaler):
+    params = {f: np.asarray(getattr(scaler, f)).tolist() for f in _SCALER_FIELDS}
+    params['feature_range'] = list(scaler.feature_range)
+    params['n_samples_seen_'] = int(getattr(scaler, 'n_samples_seen_', 0))
+    return params
+
+def scaler_from_params(params):
+    """Обученный MinMaxScaler из параметров (transform / денормализация без pickle)."""
+    scaler = MinMaxScaler(feature_range=tuple(params['feature_range']))
+    for f in _SCALER_FIELDS:
+        setattr(scaler, f, np.asarray(params[f], dtype=np.float64))
+    scaler.n_features_in_ = len(params['min_'])
+    scaler.n_samples_seen_ = params.get('n_samples_seen_', 0)
+    return scaler
+
+class ModelBundle:
+    """Содержимое бандла. weights — представления mmap (копируются при set_weights)."""
+
+    def __init__(self, header, weights=None):
+        self.header = header
+        self.weights = weights
+
+    @property
+    def symbol_tf(self):
+        return self.header['symbol_tf']
+
+    @property
+    def settings(self):
+        return self.header['settings']
+
+    @property
+    def indicators(self):
+        return self.header['indicators']
+
+    @property
+    def fingerprint(self):
+        return self.header['fingerprint']
+
+    @property
+    def scaler(self):
+        return scaler_from_params(self.header['scaler'])
+
+    @property
+    def extra(self):
+        return self.header.get('extra') or {}
+
+def write_bundle(path, symbol_tf, weights, scaler, settings, indicators, fingerprint=None, extra=None):
+    """
+    Атомарная запись бандла: читатель видит либо старый файл, либо новый целиком.
+    extra — произвольные JSON-метаданные (например, отчет дистилляции ученика).
+    """
+    arrays, offset = [], 0
+    weights = [np.ascontiguousarray(w) for w in weights]
+    for i, w in enumerate(weights):
+        arrays.append({"name": f"w{i}", "dtype": w.dtype.str, "shape": list(w.shape), "offset": offset, "nbytes": w.nbytes})
+        offset = _align(offset + w.nbytes)
+
+    header = {
+        "format": FORMAT_VERSION,
+        "symbol_tf": symbol_tf,
+        "created": time.time(),
+        "settings": settings,
+        "indicators": indicators,
+        "scaler": scaler_to_params(scaler),
+        "fingerprint": fingerprint,
+        "extra": extra,
+        "arrays": arrays,
+    }
+    raw = json.dumps(header, ensure_ascii=False, default=lambda o: o.item() if hasattr(o, 'item') else str(o)).encode('utf-8')
+    data_start = _align(len(MAGIC) + 4 + len(raw))
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".fxb.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(raw)))
+            f.write(raw)
+            for meta, w in zip(arrays, weights):
+                f.seek(data_start + meta["offset"])
+                f.write(w.tobytes())
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def _read_header(f):
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError(f"Неизвестный формат модели (magic {magic!r})")
+    (length,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(length).decode('utf-8'))
+    if header.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Версия бандла {header.get('format')} не поддерживается")
+    return header, _align(len(MAGIC) + 4 + length)
+
+def read_header(path):
+    """Только заголовок (скалер, настройки, отпечаток) — без чтения весов."""
+    with open(path, "rb") as f:
+        return ModelBundle(_read_header(f)[0])
+
+def read_bundle(path):
+    """Заголовок + веса как представления np.memmap (страницы подгружаются ОС по требованию)."""
+    with open(path, "rb") as f:
+        header, data_start = _read_header(f)
+    mm = np.memmap(path, dtype=np.uint8, mode="r")
+    weights = []
+    for meta in header["arrays"]:
+        start = data_start + meta["offset"]
+        buf = mm[start:start + meta["nbytes"]]
+        weights.append(buf.view(np.dtype(meta["dtype"])).reshape(meta["shape"]))
+    return ModelBundle(header, weights)
+
+if __name__ == "__main__":
+    # Замер: python -m ai_brain.bundle [ID] — время чтения бандла (заголовок + mmap весов)
+    import sys
+    aid = sys.argv[1] if len(sys.argv) > 1 else "EURUSD_H1"
+    path = bundle_path(aid)
+    t0 = time.perf_counter()
+    b = read_bundle(path)
+    total = sum(float(np.asarray(w).sum()) for w in b.weights)  # Касание всех страниц
+    print(f"{path}: {len(b.weights)} массивов, {(time.perf_counter() - t0) * 1000:.2f} мс, "
+          f"отпечаток {b.fingerprint}, checksum {total:.4f}")
@@ -0,0 +1,110 @@
+# FILE: ai_brain/distillation.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Дистилляция обученной модели (учителя) в малую модель-ученика для инференса.
+# Ученик учится на прогнозах учителя по всей истории (на train — смесь с фактом, DISTILL_ALPHA) и принимается,
+# только если его MSE в ModelTester по факту отложенной части не хуже учителя более чем на DISTILL_MSE_TOLERANCE.
+# Включается DISTILL_ENABLED (второе обучение и замер задержки после каждого EDUCATION).
+# Отчет по агентам: python -m ai_brain.distillation
+
+import time
+import numpy as np
+from config import (FEATURES, DISTILL_STUDENT_ARCH, DISTILL_STUDENT_UNITS, DISTILL_EPOCHS, DISTILL_ALPHA,
+                    DISTILL_MSE_TOLERANCE, DISTILL_LATENCY_BATCH)
+from ai_brain.modelbuilder import ModelBuilder
+from ai_brain.testing import ModelTester
+from system_base.logger import get_logger
+
+log = get_logger("Distillation")
+
+def _cost_per_window_ms(model, windows, repeats=3):
+    """
+    Вычислительная стоимость одного окна: лучший из repeats прогонов батча через скомпилированный
+    forward (tf.function) / размер батча. Постоянные накладные расходы model.predict на вызов
+    одинаковы для учителя и ученика и в сравнение не входят.
+    """
+    import tensorflow as tf
+
+    forward = tf.function(lambda x: model(x, training=False))
+    x = tf.constant(windows)
+    forward(x)
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        forward(x).numpy()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000 / len(windows)
+
+class Distiller:
+    """
+    distill(teacher, ...) -> (student | None, report). Модель учителя не изменяется.
+    Ученик — та же ширина окна, архитектура DISTILL_STUDENT_ARCH шириной DISTILL_STUDENT_UNITS.
+    """
+
+    def __init__(self, brain):
+        self.brain = brain
+
+    def student_settings(self):
+        return {**self.brain.settings, 'architecture': DISTILL_STUDENT_ARCH, 'lstm_units': DISTILL_STUDENT_UNITS}
+
+    def distill(self, teacher, X, y, split, scaler, teacher_mse, is_sim_mode=False):
+        """
+        X, y — вся выборка Education (окна и факт), split — граница train/test.
+        Ученик учится на всех окнах X: на train цель — DISTILL_ALPHA * прогноз учителя + (1 - DISTILL_ALPHA) * факт,
+        на отложенной части — только прогноз учителя (факт y[split:] в обучение не попадает).
+        Тест — на отложенной части по факту, тем же ModelTester, что и учитель.
+        """
+        symbol_tf = self.brain.symbol_tf
+        settings = self.student_settings()
+        stg = self.brain.settings
+        epochs = 1 if is_sim_mode else DISTILL_EPOCHS
+        batch = int(stg.get('batch_size', 32))
+
+        t0 = time.perf_counter()
+        target = teacher.predict(X, batch_size=max(batch, 256), verbose=0)
+        target[:split] = DISTILL_ALPHA * target[:split] + (1.0 - DISTILL_ALPHA) * y[:split]
+
+        student = ModelBuilder.build_lstm_model(X.shape[1], FEATURES, settings)
+        student.fit(X, target, epochs=epochs, batch_size=batch, verbose=0)
+        _, student_mse = ModelTester.run_performance_test(symbol_tf, student, X[split:], y[split:], scaler)
+
+        windows = np.ascontiguousarray(X[-DISTILL_LATENCY_BATCH:], dtype=np.float32)
+        teacher_ms = _cost_per_window_ms(teacher, windows)
+        student_ms = _cost_per_window_ms(student, windows)
+
+        delta = (student_mse - teacher_mse) / teacher_mse if teacher_mse > 0 else 0.0
+        kept = bool(delta <= DISTILL_MSE_TOLERANCE)
+        report = {
+            "architecture": settings['architecture'],
+            "units": settings['lstm_units'],
+            "teacher_params": int(teacher.count_params()),
+            "student_params": int(student.count_params()),
+            "teacher_mse": float(teacher_mse),
+            "student_mse": float(student_mse),
+            "accuracy_delta": float(delta),
+            "teacher_ms": teacher_ms,
+            "student_ms": student_ms,
+            "speedup": teacher_ms / student_ms if student_ms > 0 else 0.0,
+            "distill_sec": time.perf_counter() - t0,
+            "kept": kept,
+        }
+        verdict = "принят" if kept else f"отклонен (допуск {DISTILL_MSE_TOLERANCE:.0%})"
+        log.info(f"[{symbol_tf}] Дистилляция: ученик {verdict}. Ускорение x{report['speedup']:.1f} "
+                 f"({teacher_ms:.3f} -> {student_ms:.3f} мс/окно), MSE {teacher_mse:.6f} -> {student_mse:.6f} "
+                 f"({delta:+.1%}), параметров {report['teacher_params']} -> {report['student_params']}")
+        return (student if kept else None), report
+
+if __name__ == "__main__":
+    # Отчет по всем агентам с учеником: python -m ai_brain.distillation
+    import glob
+    import os
+    from config import MODELS_DIR
+    from ai_brain.bundle import read_header
+
+    print(f"{'агент':<16}{'архитектура':>12}{'параметры':>18}{'ускорение':>11}{'ΔMSE':>9}")
+    for path in sorted(glob.glob(os.path.join(MODELS_DIR, "model_*.student.fxb"))):
+        header = read_header(path)
+        r = header.extra.get('distillation', {})
+        if not r:
+            continue
+        params = f"{r['teacher_params']} -> {r['student_params']}"
+        print(f"{header.symbol_tf:<16}{r['architecture']:>12}{params:>18}{r['speedup']:>10.1f}x{r['accuracy_delta']:>+9.1%}")
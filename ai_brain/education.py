@@ -2,15 +2,15 @@
 # LOCATION: PROJ_AI_FOREX_2026/ai_brain/
 # DESCRIPTION: Модуль первичного обучения модели с использованием динамических настроек из БД.
 
-import numpy as np
-import joblib
-import os
-import pandas as pd
-from sklearn.preprocessing import MinMaxScaler
 # Удален WINDOW_SIZE, так как он теперь в brain.window_size
-from root.config import MODELS_DIR, FEATURES 
 from system_base.logger import get_logger
+from data_sys.databasemanager import prepare_scaled_features, make_windows
 from ai_brain.testing import ModelTester
+from ai_brain.bundle import fingerprint_training_data
+from ai_brain.distillation import Distiller
+from ai_brain.sampler import RecencySampler, fit_sampled
+from ai_brain.hot_swap import stop_callback
+from config import DISTILL_ENABLED, SAMPLER_ENABLED
 
 log = get_logger("Education")
 
@@ -18,15 +18,72 @@ class Education:
     def __init__(self, brain, db_manager):
         self.brain = brain
         self.db = db_manager
+        self.distiller = Distiller(brain)
 
-    def run_full_cycle(self, symbol_tf, is_sim_mode=False):
+    def run_full_cycle(self, symbol_tf, is_sim_mode=False, dataset=None):
         """
-        Полный цикл обучения.
+        Полный цикл обучения. Есть живая модель — учится теневая копия (brain.build_shadow), живая
+        не затрагивается до swap_model; живой модели нет — обучается сама brain.model.
         Параметры окна, эпох и батча берутся из индивидуальных настроек БД (brain.settings).
+        dataset: готовый SharedTrainingSet из DatabaseManager.load_training_data_parallel.
         """
+        if self.brain.scaler is not None or self.brain.settings_changed():
+            model = self.brain.build_shadow()
+        else:
+            model = self.brain.ensure_trainable()
+        result = self._train(model, symbol_tf, is_sim_mode, dataset)
+        if result is None:
+            return False
+        scaler, is_valid, mse_score, fingerprint, data = result
+
+        # 8. Дистилляция: малый ученик обслуживает прогнозы, если точность в допуске
+        distilled = self._distill(model, data, scaler, is_valid, mse_score, is_sim_mode)
+
+        # 9. Сохранение артефактов (п.3 ТЗ): один бандл атомарно, затем ученик, скалер и новая версия модели
+        # (для backend = 'onnx' — экспорт model_{ID}.onnx после бандла)
+        self.brain.swap_model(model, scaler, fingerprint, distilled)
+        
+        log.info(f"[{symbol_tf}] EDUCATION завершен. MSE: {mse_score:.6f}")
+        return True
+
+    def train_shadow(self, symbol_tf, is_sim_mode=False, dataset=None, cancel=None):
+        """
+        Обучение теневой копии (brain.build_shadow) — для фонового потока ShadowTrainer.
+        Живая модель не затрагивается. cancel: threading.Event — остановка обучения, результат None.
+        dataset: SharedTrainingSet задания JobScheduler (иначе — последовательный препроцессинг).
+        -> {"model", "scaler", "valid", "mse", "fingerprint", "distilled", "test": (X_test, y_test)} или None.
+        "test" — копия отложенной части выборки (сегмент выборки освобождается), на ней JobScheduler
+        сравнивает с живой моделью.
+        """
+        model = self.brain.build_shadow()
+        callbacks = [stop_callback(cancel)] if cancel is not None else None
+        result = self._train(model, symbol_tf, is_sim_mode, dataset, callbacks)
+        if result is None or (cancel is not None and cancel.is_set()):
+            return None
+        scaler, is_valid, mse_score, fingerprint, data = result
+        log.info(f"[{symbol_tf}] EDUCATION (теневая модель) завершен. MSE: {mse_score:.6f}")
+        distilled = self._distill(model, data, scaler, is_valid, mse_score, is_sim_mode)
+        X, y, split = data
+        return {"model": model, "scaler": scaler, "valid": is_valid, "mse": mse_score, "fingerprint": fingerprint,
+                "distilled": distilled, "test": (X[split:].copy(), y[split:].copy())}
+
+    def _distill(self, teacher, data, scaler, is_valid, mse_score, is_sim_mode):
+        """-> (ученик | None, настройки ученика, отчет | None). Ошибка дистилляции не срывает обучение."""
+        if not DISTILL_ENABLED or not is_valid:
+            return None, None, None
+        X, y, split = data
+        try:
+            student, report = self.distiller.distill(teacher, X, y, split, scaler, mse_score, is_sim_mode)
+            return student, self.distiller.student_settings(), report
+        except Exception as e:
+            log.error(f"[{self.brain.symbol_tf}] Ошибка дистилляции, прогноз — учителем: {e}")
+            return None, None, None
+
+    def _train(self, model, symbol_tf, is_sim_mode=False, dataset=None, callbacks=None):
+        """Данные, обучение и тест model -> (scaler, is_valid, mse, отпечаток выборки, (X, y, split)) или None."""
         # 1. Получаем актуальные настройки из объекта brain (синхронизировано с БД)
         stg = self.brain.settings
-        win_size = self.brain.window_size
+        win_size = stg.get('window_size', 60)
         db_epochs = stg.get('epochs', 20)
         db_batch = stg.get('batch_size', 32)
 
@@ -43,61 +100,48 @@ class Education:
 
         log.info(f"[{symbol_tf}] Запуск EDUCATION (Эпох: {actual_epochs}, Окно: {win_size}, Лимит: {data_limit})")
         
-        # 2. Загрузка данных
-        raw_data = self.db.get_history(symbol_tf, limit=data_limit)
-        # Используем win_size вместо WINDOW_SIZE
-        if raw_data is None or len(raw_data) < win_size * 2:
-            log.error(f"[{symbol_tf}] Недостаточно данных для обучения.")
-            return False
-
-        # 3. DataFrame и расчет 7 признаков (OHLCV + RSI + ATR)
-        df = pd.DataFrame(raw_data, columns=['open', 'high', 'low', 'close', 'volume'])
-        
-        import pandas_ta as ta
-        df.ta.rsi(length=14, append=True)
-        df.ta.atr(length=14, append=True)
-        df.dropna(inplace=True)
+        # 2-5. Данные: готовая выборка из shared memory или последовательный препроцессинг
+        if dataset is not None and dataset.window_size == win_size:
+            X, y, scaler = dataset.X, dataset.y, dataset.scaler
+        else:
+            raw_data = self.db.get_history(symbol_tf, limit=data_limit)
+            # Используем win_size вместо WINDOW_SIZE
+            if raw_data is None or len(raw_data) < win_size * 2:
+                log.error(f"[{symbol_tf}] Недостаточно данных для обучения.")
+                return None
 
-        # 4. Масштабирование
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        scaled_data = scaler.fit_transform(df.values)
-        
-        # 5. Подготовка последовательностей (Используем win_size)
-        X, y = self._prepare_sequences(scaled_data, win_size, target_cols=[3, 1, 2])
+            # 7 признаков (OHLCV + RSI + ATR) и масштабирование — общая функция с пайплайном
+            scaled_data, scaler = prepare_scaled_features(raw_data, symbol_tf)
+            if scaled_data is None or len(scaled_data) < win_size * 2:
+                log.error(f"[{symbol_tf}] Недостаточно данных после расчета индикаторов.")
+                return None
+            X, y = make_windows(scaled_data, win_size)
         
         split = int(len(X) * 0.9)
         X_train, X_test = X[:split], X[split:]
         y_train, y_test = y[:split], y[split:]
 
-        # 6. Обучение модели
-        self.brain.model.fit(
-            X_train, y_train, 
-            epochs=actual_epochs, 
-            batch_size=current_batch, 
-            validation_data=(X_test, y_test),
-            verbose=0
-        )
-        
+        # 6. Обучение модели. Длинная история — фиксированный бюджет окон на эпоху (RecencySampler),
+        # оценка — ModelTester на отложенной части ниже
+        sampler = RecencySampler(X_train) if SAMPLER_ENABLED else None
+        if sampler is not None and sampler.active:
+            log.info(f"[{symbol_tf}] Подвыборка обучения: {sampler.describe()}")
+            fit_sampled(model, X_train, y_train, actual_epochs, current_batch, sampler, callbacks)
+        else:
+            model.fit(
+                X_train, y_train, 
+                epochs=actual_epochs, 
+                batch_size=current_batch, 
+                validation_data=(X_test, y_test),
+                callbacks=callbacks,
+                verbose=0
+            )
+
         # 7. Тестирование качества
         tester = ModelTester()
-        is_valid, mse_score = tester.run_performance_test(symbol_tf, self.brain.model, X_test, y_test, scaler)
+        is_valid, mse_score = tester.run_performance_test(symbol_tf, model, X_test, y_test, scaler)
         
         if not is_valid and not is_sim_mode:
             log.warning(f"[{symbol_tf}] Низкая точность MSE: {mse_score:.6f}")
 
-        # 8. Сохранение артефактов (п.3 ТЗ)
-        self.brain.model.save_weights(self.brain.weights_path)
-        joblib.dump(scaler, self.brain.scaler_path)
-        
-        # Обновляем скалер в памяти объекта brain для немедленной работы
-        self.brain.scaler = scaler
-        
-        log.info(f"[{symbol_tf}] EDUCATION завершен. MSE: {mse_score:.6f}")
-        return True
-
-    def _prepare_sequences(self, data, window, target_cols):
-        X, y = [], []
-        for i in range(len(data) - window):
-            X.append(data[i : (i + window)])
-            y.append(data[i + window, target_cols])
-        return np.array(X), np.array(y)
+        return scaler, is_valid, mse_score, fingerprint_training_data(X, y), (X, y, split)
@@ -0,0 +1,91 @@
+# FILE: ai_brain/hot_swap.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Фоновое обучение теневой модели Brain (двойная буферизация).
+# Живая модель обслуживает прогнозы, пока теневая учится; замена — Brain.swap_model между барами.
+
+import time
+import threading
+from system_base.logger import get_logger
+
+log = get_logger("HotSwap")
+
+class ShadowTrainer:
+    """
+    Один фоновый поток на переобучение: Education.train_shadow().
+    poll() -> None, пока идет обучение; затем результат train_shadow (или None при сбое / отмене).
+    cancel() останавливает обучение после текущего батча, результат отбрасывается.
+    cpu_sec — CPU процесса за время обучения (TensorFlow считает в своих потоках).
+    dataset: SharedTrainingSet из JobScheduler; освобождает его задание, когда поток завершился.
+    """
+
+    _active = set()          # Идущие фоновые обучения (ограничение HOT_SWAP_MAX_PARALLEL)
+    _active_lock = threading.Lock()
+
+    @classmethod
+    def running_count(cls):
+        with cls._active_lock:
+            return len(cls._active)
+
+    def __init__(self, educator, symbol_tf, is_sim_mode=False, dataset=None):
+        self.educator = educator
+        self.symbol_tf = symbol_tf
+        self.is_sim_mode = is_sim_mode
+        self.dataset = dataset
+        self.result = None
+        self.cpu_sec = 0.0
+        self.wall_sec = 0.0
+        self._done = threading.Event()
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._active_lock:
+            self._active.add(self)
+        self._thread = threading.Thread(target=self._run, name=f"Shadow-{self.symbol_tf}", daemon=True)
+        self._thread.start()
+        log.info(f"[{self.symbol_tf}] Фоновое обучение теневой модели запущено. Живая модель продолжает работу.")
+        return self
+
+    def _run(self):
+        cpu0, wall0 = time.process_time(), time.time()
+        try:
+            self.result = self.educator.train_shadow(self.symbol_tf, is_sim_mode=self.is_sim_mode,
+                                                     dataset=self.dataset, cancel=self._cancel)
+        except Exception as e:
+            log.error(f"[{self.symbol_tf}] Ошибка фонового обучения: {e}")
+            self.result = None
+        finally:
+            if self.cancelled:
+                self.result = None
+            self.cpu_sec = time.process_time() - cpu0
+            self.wall_sec = time.time() - wall0
+            with self._active_lock:
+                self._active.discard(self)
+            self._done.set()
+
+    def cancel(self):
+        if not self.done:
+            log.info(f"[{self.symbol_tf}] Фоновое обучение отменено, теневая модель будет отброшена.")
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def poll(self):
+        return self.result if self.done else None
+
+def stop_callback(event):
+    """Callback Keras: model.fit завершается после батча, на котором выставлен event."""
+    import tensorflow as tf
+
+    class StopOnEvent(tf.keras.callbacks.Callback):
+        def on_train_batch_end(self, batch, logs=None):
+            if event.is_set():
+                self.model.stop_training = True
+
+    return StopOnEvent()
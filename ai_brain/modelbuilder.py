@@ -1,30 +1,102 @@
 import tensorflow as tf
 from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dropout, Dense
+from tensorflow.keras.layers import LSTM, GRU, Conv1D, Cropping1D, Flatten, GlobalAveragePooling1D, Dropout, Dense
 from tensorflow.keras.optimizers import Adam, RMSprop, SGD
+from ai_brain.runtime import TrainingRuntime
+
+# Архитектуры model_settings.architecture. 'lstm2' — исходный стек LSTM -> LSTM (по умолчанию)
+ARCHITECTURES = ('lstm2', 'lstm1', 'gru', 'conv1d', 'tcn')
+DEFAULT_ARCHITECTURE = 'lstm2'
 
 class ModelBuilder:
     @staticmethod
-    def build_lstm_model(window_size, n_features, settings=None):
-        """Строит модель на основе настроек из БД (2026)."""
+    def build_lstm_model(window_size, n_features, settings=None, compile_model=True):
+        """
+        Строит модель на основе настроек из БД (2026).
+        settings['architecture'] выбирает сеть (ARCHITECTURES), выход всегда Dense(3) [Close, High, Low].
+        compile_model=False — граф только для инференса (без оптимизатора): быстрая загрузка из бандла.
+        """
         # Если настройки не переданы, берем жесткие дефолты
         u = settings.get('lstm_units', 100) if settings else 100
         d = settings.get('dropout_rate', 0.2) if settings else 0.2
-        lr = settings.get('learning_rate', 0.001) if settings else 0.001
-        opt_name = settings.get('optimizer', 'Adam') if settings else 'Adam'
+        arch = settings.get('architecture', DEFAULT_ARCHITECTURE) if settings else DEFAULT_ARCHITECTURE
+
+        builders = {
+            'lstm2': ModelBuilder._lstm2,
+            'lstm1': ModelBuilder._lstm1,
+            'gru': ModelBuilder._gru,
+            'conv1d': ModelBuilder._conv1d,
+            'tcn': ModelBuilder._tcn,
+        }
+        if arch not in builders:
+            raise ValueError(f"Неизвестная архитектура '{arch}', доступны: {', '.join(ARCHITECTURES)}")
 
         model = Sequential()
+        builders[arch](model, window_size, n_features, int(u), d)
+        model.add(Dense(units=3)) # [Close, High, Low]
+
+        if compile_model:
+            ModelBuilder.compile_model(model, settings)
+        return model
+
+    @staticmethod
+    def _lstm2(model, window_size, n_features, u, d):
         model.add(LSTM(units=u, return_sequences=True, input_shape=(window_size, n_features)))
         model.add(Dropout(d))
-        
+
         # Второй слой: масштабируемый
         model.add(LSTM(units=max(u // 2, 10), return_sequences=False))
         model.add(Dropout(d))
-        
-        model.add(Dense(units=3)) # [Close, High, Low]
+
+    @staticmethod
+    def _lstm1(model, window_size, n_features, u, d):
+        """Один слой LSTM: примерно вдвое дешевле стека по времени шага."""
+        model.add(LSTM(units=u, input_shape=(window_size, n_features)))
+        model.add(Dropout(d))
+
+    @staticmethod
+    def _gru(model, window_size, n_features, u, d):
+        """Один слой GRU: три гейта вместо четырех (~3/4 параметров LSTM той же ширины)."""
+        model.add(GRU(units=u, input_shape=(window_size, n_features)))
+        model.add(Dropout(d))
+
+    @staticmethod
+    def _conv1d(model, window_size, n_features, u, d):
+        """Причинные свертки по времени + усреднение: без рекуррентности, весь батч параллельно."""
+        filters = max(u // 2, 16)
+        model.add(Conv1D(filters, kernel_size=5, padding='causal', activation='relu', input_shape=(window_size, n_features)))
+        model.add(Conv1D(filters, kernel_size=5, padding='causal', activation='relu'))
+        model.add(GlobalAveragePooling1D())
+        model.add(Dropout(d))
+
+    @staticmethod
+    def _tcn(model, window_size, n_features, u, d):
+        """
+        Облегченный TCN: стек причинных сверток с растущей дилатацией (1, 2, 4, ...), пока
+        рецептивное поле не покроет окно; выход — последний шаг (Cropping1D + Flatten).
+        Без остаточных связей, чтобы модель оставалась Sequential (бандл, ONNX, residency).
+        """
+        filters = max(u // 2, 16)
+        kernel, dilation, receptive = 3, 1, 1
+        model.add(Conv1D(filters, kernel, padding='causal', dilation_rate=dilation, activation='relu',
+                         input_shape=(window_size, n_features)))
+        receptive += (kernel - 1) * dilation
+        while receptive < window_size:
+            dilation *= 2
+            model.add(Conv1D(filters, kernel, padding='causal', dilation_rate=dilation, activation='relu'))
+            receptive += (kernel - 1) * dilation
+        model.add(Cropping1D(cropping=(window_size - 1, 0)))
+        model.add(Flatten())
+        model.add(Dropout(d))
+
+    @staticmethod
+    def compile_model(model, settings=None):
+        """Оптимизатор и loss — перед обучением / адаптацией."""
+        lr = settings.get('learning_rate', 0.001) if settings else 0.001
+        opt_name = settings.get('optimizer', 'Adam') if settings else 'Adam'
 
         opts = {'Adam': Adam, 'RMSprop': RMSprop, 'SGD': SGD}
         optimizer = opts.get(opt_name, Adam)(learning_rate=lr)
-        
-        model.compile(optimizer=optimizer, loss='mean_squared_error')
-        return model
+
+        # XLA для шага обучения (TRAIN_JIT_COMPILE): выигрыш зависит от CPU — см. бенчмарк --training
+        model.compile(optimizer=optimizer, loss='mean_squared_error', jit_compile=TrainingRuntime.jit_compile())
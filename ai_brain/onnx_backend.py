@@ -0,0 +1,107 @@
+# FILE: ai_brain/onnx_backend.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Инференс через ONNX Runtime (model_settings.backend = 'onnx').
+# Экспорт модели ModelBuilder в model_{ID}.onnx (tf2onnx) и сессия onnxruntime без рантайма Keras.
+# Зависимости опциональны: без onnxruntime / tf2onnx агент остается на Keras.
+
+import os
+import time
+import hashlib
+import tempfile
+import numpy as np
+from config import MODELS_DIR, ONNX_INTRA_OP_THREADS, ONNX_OPSET
+from system_base.logger import get_logger
+
+log = get_logger("OnnxBackend")
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    import tf2onnx
+except ImportError:
+    tf2onnx = None
+
+ONNX_AVAILABLE = ort is not None and tf2onnx is not None
+
+def onnx_path(symbol_tf):
+    return os.path.join(MODELS_DIR, f"model_{symbol_tf}.onnx")
+
+def weights_digest(model):
+    """Отпечаток весов модели (blake2b): какие именно веса экспортированы в .onnx."""
+    h = hashlib.blake2b(digest_size=16)
+    for w in model.get_weights():
+        h.update(np.ascontiguousarray(w).tobytes())
+    return h.hexdigest()
+
+def export_onnx(model, window_size, n_features, path, metadata=None):
+    """
+    Keras -> ONNX (вход [batch, window, features] float32). Запись атомарная. -> True / False.
+    Конвертируется forward-функция модели (tf.function): from_keras не поддерживает модели Keras 3.
+    metadata: словарь строк в metadata_props файла (отпечатки весов для проверки актуальности).
+    """
+    if not ONNX_AVAILABLE:
+        log.error("Экспорт ONNX недоступен: не установлены onnxruntime / tf2onnx.")
+        return False
+    import tensorflow as tf
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".onnx.tmp")
+    os.close(fd)
+    try:
+        t0 = time.perf_counter()
+        spec = (tf.TensorSpec((None, window_size, n_features), tf.float32, name="window"),)
+        forward = tf.function(lambda x: model(x, training=False))
+        proto, _ = tf2onnx.convert.from_function(forward, input_signature=spec, opset=ONNX_OPSET)
+        for key, value in (metadata or {}).items():
+            entry = proto.metadata_props.add()
+            entry.key, entry.value = str(key), str(value)
+        with open(tmp, "wb") as f:
+            f.write(proto.SerializeToString())
+        os.replace(tmp, path)
+        log.info(f"Экспорт ONNX: {os.path.basename(path)} за {(time.perf_counter() - t0) * 1000:.0f} мс")
+        return True
+    except Exception as e:
+        log.error(f"Ошибка экспорта ONNX {os.path.basename(path)}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+
+class OnnxPredictor:
+    """Сессия onnxruntime. predict(batch [B, window, features]) -> сырой выход Dense [B, 3]."""
+
+    def __init__(self, path, threads=ONNX_INTRA_OP_THREADS):
+        if ort is None:
+            raise RuntimeError("onnxruntime не установлен")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.metadata = dict(self.session.get_modelmeta().custom_metadata_map)
+        self.path = path
+
+    def predict(self, batch):
+        x = np.ascontiguousarray(batch, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[None, ...]
+        return self.session.run(None, {self.input_name: x})[0]
+
+def check_parity(model, predictor, series, window_size, tol=1e-4):
+    """
+    Сверка ONNX с Keras на скользящих окнах ряда series [N, features] (одним батчем).
+    Возвращает (max_abs_diff, ok).
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    windows = sliding_window_view(series, (window_size, series.shape[1]))[:, 0].astype(np.float32)
+    ref = np.asarray(model.predict(windows, verbose=0), dtype=np.float64)
+    out = np.asarray(predictor.predict(windows), dtype=np.float64)
+    max_diff = float(np.max(np.abs(out - ref)))
+    ok = max_diff <= tol
+    log.info(f"Паритет ONNX/Keras: max|diff|={max_diff:.2e} на {len(windows)} окнах (tol={tol})")
+    return max_diff, ok
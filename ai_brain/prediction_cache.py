@@ -0,0 +1,56 @@
+# FILE: ai_brain/prediction_cache.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Мемоизация Brain.predict. Ключ: (symbol_tf, время бара или хэш окна, версия модели).
+# Каждое окно проходит через сеть не более одного раза; LRU-вытеснение по PREDICTION_CACHE_SIZE.
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from config import PREDICTION_CACHE_SIZE
+
+class PredictionCache:
+    """Общий кэш процесса (все агенты). Значение — денормализованный прогноз (close, high, low)."""
+
+    _entries = OrderedDict()
+    stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def window_digest(data_window):
+        """Хэш содержимого окна — для вызовов без времени бара (например, из Orchestrator)."""
+        arr = np.ascontiguousarray(data_window)
+        return hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest()
+
+    @classmethod
+    def get(cls, keys):
+        """Первый найденный ключ из keys -> прогноз или None."""
+        for key in keys:
+            value = cls._entries.get(key)
+            if value is not None:
+                cls._entries.move_to_end(key)
+                cls.stats["hits"] += 1
+                return value
+        cls.stats["misses"] += 1
+        return None
+
+    @classmethod
+    def put(cls, keys, value):
+        for key in keys:
+            cls._entries[key] = value
+            cls._entries.move_to_end(key)
+        while len(cls._entries) > PREDICTION_CACHE_SIZE:
+            cls._entries.popitem(last=False)
+            cls.stats["evictions"] += 1
+
+    @classmethod
+    def invalidate(cls, symbol_tf=None):
+        if symbol_tf is None:
+            cls._entries.clear()
+            return
+        for key in [k for k in cls._entries if k[0] == symbol_tf]:
+            del cls._entries[key]
+
+    @classmethod
+    def get_stats(cls):
+        total = cls.stats["hits"] + cls.stats["misses"]
+        return {**cls.stats, "size": len(cls._entries),
+                "hit_rate_%": round(cls.stats["hits"] / total * 100, 1) if total else 0.0}
@@ -0,0 +1,202 @@
+# FILE: ai_brain/residency.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Резидентность моделей Brain в памяти. Бюджет RESIDENCY_BUDGET_MB, вытеснение LRU
+# (агенты на паузе и редкие D1 вытесняются первыми), перезагрузка по требованию из .npz весов
+# (или бандла модели) и упреждающая загрузка перед закрытием бара агента.
+
+import os
+import time
+import uuid
+import weakref
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import (FEATURES, RESIDENCY_BUDGET_MB, RESIDENCY_MODEL_OVERHEAD_MB, RESIDENCY_CACHE_DIR,
+                    RESIDENCY_RARE_BAR_SEC)
+from ai_brain.modelbuilder import ModelBuilder
+from ai_brain.bundle import read_bundle
+from system_base.bar_clock import TF_SECONDS
+from system_base.logger import get_logger
+
+log = get_logger("ModelResidency", db_type='system')
+
+# Веса + два слота Adam на параметр (float32)
+_BYTES_PER_PARAM = 4 * 3
+
+class ModelResidency:
+    """
+    Реестр процесса: { ключ экземпляра Brain: weakref(brain) } в порядке последнего обращения.
+    Ключ (uuid) выдается экземпляру при первой регистрации: у двух Brain одного symbol_tf
+    (пересозданный агент) разные записи и разные .npz. Brain, собранный сборщиком мусора,
+    выбывает из реестра сам (weakref.finalize), unregister() — явное удаление.
+    Brain.model — свойство: обращение отмечает модель, вытесненная модель собирается заново.
+    enforce() вызывается из main loop (поток агентов), не во время прогноза.
+    """
+
+    _entries = OrderedDict()
+    _sizes = {}
+    _lock = threading.RLock()
+    budget_bytes = RESIDENCY_BUDGET_MB * 2**20
+    stats = {"evictions": 0, "reloads": 0, "prefetches": 0, "reload_ms_total": 0.0, "reload_ms_max": 0.0}
+
+    @classmethod
+    def _key(cls, brain):
+        key = getattr(brain, '_residency_key', None)
+        if key is None:
+            key = brain._residency_key = uuid.uuid4().hex
+            brain._residency_path = os.path.join(RESIDENCY_CACHE_DIR, f"resident_{brain.symbol_tf}_{key}.npz")
+            brain._residency_finalizer = weakref.finalize(brain, cls._forget, key, brain._residency_path)
+        return key
+
+    @classmethod
+    def _cache_path(cls, brain):
+        cls._key(brain)
+        return brain._residency_path
+
+    @classmethod
+    def _forget(cls, key, path):
+        with cls._lock:
+            cls._entries.pop(key, None)
+            cls._sizes.pop(key, None)
+        if os.path.exists(path):
+            os.remove(path)
+
+    @classmethod
+    def _alive(cls):
+        """[(ключ, brain)] живых экземпляров в порядке LRU."""
+        return [(key, brain) for key, ref in cls._entries.items() if (brain := ref()) is not None]
+
+    @staticmethod
+    def estimate_bytes(model):
+        return model.count_params() * _BYTES_PER_PARAM + RESIDENCY_MODEL_OVERHEAD_MB * 2**20
+
+    # --- РЕЕСТР ---
+    @classmethod
+    def register(cls, brain):
+        """Новая / замененная модель Brain становится резидентной."""
+        with cls._lock:
+            key = cls._key(brain)
+            cls._entries[key] = weakref.ref(brain)
+            cls._entries.move_to_end(key)
+            cls._sizes[key] = cls.estimate_bytes(brain._model) if brain._model is not None else 0
+
+    @classmethod
+    def unregister(cls, brain):
+        """Агент удален / пересоздан: запись и .npz вытеснения удаляются, модель остается у brain."""
+        finalizer = getattr(brain, '_residency_finalizer', None)
+        if finalizer is not None:
+            finalizer()
+
+    @classmethod
+    def touch(cls, brain):
+        with cls._lock:
+            key = getattr(brain, '_residency_key', None)
+            if key in cls._entries:
+                cls._entries.move_to_end(key)
+
+    @classmethod
+    def resident_bytes(cls):
+        with cls._lock:
+            return sum(cls._sizes.get(key, 0) for key, brain in cls._alive() if brain._model is not None)
+
+    # --- ВЫТЕСНЕНИЕ / ЗАГРУЗКА ---
+    @classmethod
+    def evict(cls, brain):
+        """Веса -> .npz (быстрая загрузка без пересчета), модель и потоковое состояние освобождаются."""
+        with cls._lock:
+            model = brain._model
+            if model is None:
+                return
+            os.makedirs(RESIDENCY_CACHE_DIR, exist_ok=True)
+            path = cls._cache_path(brain)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, *model.get_weights())
+            os.replace(tmp, path)
+
+            brain._model = None
+            brain.stream = None
+            cls.stats["evictions"] += 1
+            log.info(f"[{brain.symbol_tf}] Модель вытеснена из памяти.")
+
+    @classmethod
+    def reload(cls, brain):
+        """Граф без оптимизатора и веса: .npz вытеснения, иначе бандл, иначе наследие .h5."""
+        with cls._lock:
+            if brain._model is not None:
+                return
+            t0 = time.perf_counter()
+            model = ModelBuilder.build_lstm_model(brain.window_size, FEATURES, brain.live_settings, compile_model=False)
+            path = cls._cache_path(brain)
+            if os.path.exists(path):
+                with np.load(path) as npz:
+                    model.set_weights([npz[f"arr_{i}"] for i in range(len(npz.files))])
+            elif os.path.exists(brain.bundle_path):
+                model.set_weights(read_bundle(brain.bundle_path).weights)
+            elif os.path.exists(brain.weights_path):
+                model.load_weights(brain.weights_path)
+            brain._model = model
+            brain._init_stream()
+            cls.register(brain)
+
+            ms = (time.perf_counter() - t0) * 1000
+            cls.stats["reloads"] += 1
+            cls.stats["reload_ms_total"] += ms
+            cls.stats["reload_ms_max"] = max(cls.stats["reload_ms_max"], ms)
+            log.info(f"[{brain.symbol_tf}] Модель загружена в память за {ms:.0f} мс.")
+
+    @classmethod
+    def prefetch(cls, brains):
+        """Агенты, чей бар скоро закроется: загрузка заранее, чтобы тик не ждал сборки модели."""
+        for brain in brains:
+            if brain._model is None and brain.scaler is not None:
+                cls.stats["prefetches"] += 1
+                cls.reload(brain)
+            else:
+                cls.touch(brain)
+
+    @staticmethod
+    def _rare(brain):
+        """Редкий ТФ (D1 и старше): бар закрывается раз в сутки, модель простаивает."""
+        return TF_SECONDS.get(brain.symbol_tf.rsplit('_', 1)[-1], 0) >= RESIDENCY_RARE_BAR_SEC
+
+    @classmethod
+    def enforce(cls, pinned=(), paused=()):
+        """
+        Вытеснение, пока резидентный объем выше бюджета. Порядок: модели агентов на паузе (paused),
+        затем редких ТФ (RESIDENCY_RARE_BAR_SEC), затем остальные; внутри группы — LRU.
+        Не вытесняются: pinned (агенты текущего тика / prefetch) и модели без обученных весов.
+        """
+        pinned_ids = {id(b) for b in pinned}
+        paused_ids = {id(b) for b in paused}
+        with cls._lock:
+            used = cls.resident_bytes()
+            if used <= cls.budget_bytes:
+                return
+            candidates = [(key, brain) for key, brain in cls._alive()
+                          if id(brain) not in pinned_ids and brain._model is not None and brain.scaler is not None]
+            # sorted устойчив: порядок LRU внутри группы сохраняется
+            candidates.sort(key=lambda kb: 0 if id(kb[1]) in paused_ids else 1 if cls._rare(kb[1]) else 2)
+            for key, brain in candidates:
+                if used <= cls.budget_bytes:
+                    break
+                used -= cls._sizes.get(key, 0)
+                cls.evict(brain)
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            alive = cls._alive()
+            resident = sum(1 for _, b in alive if b._model is not None)
+            reloads = cls.stats["reloads"]
+            return {
+                "resident": resident,
+                "registered": len(alive),
+                "resident_mb": round(cls.resident_bytes() / 2**20, 1),
+                "budget_mb": round(cls.budget_bytes / 2**20, 1),
+                "evictions": cls.stats["evictions"],
+                "reloads": reloads,
+                "prefetches": cls.stats["prefetches"],
+                "reload_ms_avg": round(cls.stats["reload_ms_total"] / reloads, 1) if reloads else 0.0,
+                "reload_ms_max": round(cls.stats["reload_ms_max"], 1),
+            }
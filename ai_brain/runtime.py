@@ -0,0 +1,98 @@
+# FILE: ai_brain/runtime.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Конфигурация рантайма TensorFlow для обучения (Education / Adaptation / теневые модели):
+# потоки intra/inter-op, привязка процесса к ядрам, oneDNN и XLA (jit_compile шага обучения).
+# configure_process() вызывается ДО первого импорта TensorFlow (root/main.py, воркеры бенчмарка).
+
+import os
+from config import TRAIN_JIT_COMPILE, TRAIN_INTRA_OP_THREADS, TRAIN_INTER_OP_THREADS, TRAIN_CPU_AFFINITY, TRAIN_ONEDNN
+from system_base.logger import get_logger
+
+log = get_logger("TrainingRuntime", db_type='system')
+
+class TrainingRuntime:
+    """
+    Настройки процесса (потоки TF создаются один раз на процесс, поэтому раскладка задается
+    процессу целиком). Несколько обучений на одном хосте — отдельные процессы с непересекающимися
+    наборами ядер (split_cores), каждый со своим числом потоков.
+    """
+
+    _applied = None
+    _jit = TRAIN_JIT_COMPILE
+
+    @classmethod
+    def jit_compile(cls):
+        """Флаг XLA для model.compile (ModelBuilder.compile_model)."""
+        return bool(cls._jit)
+
+    @staticmethod
+    def split_cores(n_workers, cores=None):
+        """Непересекающиеся наборы ядер для n_workers процессов обучения (остаток — первым)."""
+        cores = list(cores) if cores is not None else sorted(TrainingRuntime.available_cores())
+        n_workers = max(1, min(n_workers, len(cores)))
+        size, extra = divmod(len(cores), n_workers)
+        slices, start = [], 0
+        for i in range(n_workers):
+            end = start + size + (1 if i < extra else 0)
+            slices.append(cores[start:end])
+            start = end
+        return slices
+
+    @staticmethod
+    def available_cores():
+        if hasattr(os, "sched_getaffinity"):
+            return set(os.sched_getaffinity(0))
+        return set(range(os.cpu_count() or 1))
+
+    @staticmethod
+    def set_affinity(cores):
+        """Привязка процесса к ядрам: sched_setaffinity (Linux), иначе psutil (Windows). -> bool."""
+        cores = sorted(int(c) for c in cores)
+        try:
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, cores)
+                return True
+            import psutil
+            psutil.Process().cpu_affinity(cores)
+            return True
+        except ImportError:
+            log.warning("Привязка к ядрам недоступна: нет sched_setaffinity и psutil.")
+        except (OSError, ValueError) as e:
+            log.error(f"Ошибка привязки к ядрам {cores}: {e}")
+        return False
+
+    @classmethod
+    def configure_process(cls, intra=TRAIN_INTRA_OP_THREADS, inter=TRAIN_INTER_OP_THREADS,
+                          cores=TRAIN_CPU_AFFINITY, onednn=TRAIN_ONEDNN, jit_compile=TRAIN_JIT_COMPILE):
+        """
+        intra / inter: потоки TF (0 — выбор TensorFlow по числу ядер).
+        cores: список ядер процесса (None — без привязки). onednn: оптимизации oneDNN.
+        jit_compile: XLA для моделей, компилируемых после вызова.
+        Переменные окружения уже заданные пользователем не перезаписываются.
+        """
+        cls._jit = jit_compile
+        os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1" if onednn else "0")
+        os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+        if cores:
+            cls.set_affinity(cores)
+            # Без явного числа потоков TF берет все ядра хоста, а не доступные процессу
+            intra = intra or len(cores)
+        if intra:
+            os.environ.setdefault("OMP_NUM_THREADS", str(intra))
+
+        import tensorflow as tf
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra))
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter))
+        except RuntimeError as e:
+            # Рантайм уже инициализирован (первая операция TF прошла раньше) — потоки не меняются
+            log.warning(f"Потоки TensorFlow не изменены: {e}")
+
+        cls._applied = {"intra": int(intra), "inter": int(inter), "cores": sorted(cores) if cores else None,
+                        "onednn": os.environ["TF_ENABLE_ONEDNN_OPTS"] == "1", "jit_compile": cls.jit_compile()}
+        log.info(f"Рантайм обучения: {cls._applied}")
+        return cls._applied
+
+    @classmethod
+    def get_config(cls):
+        return cls._applied
@@ -0,0 +1,87 @@
+# FILE: ai_brain/sampler.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Подвыборка окон обучения для Education: фиксированное число окон на эпоху,
+# вес по давности (период полураспада в барах) и стратификация по режиму волатильности
+# (квантили ATR), чтобы редкие волатильные участки не терялись при сильном весе свежих данных.
+
+import time
+import numpy as np
+from config import SAMPLER_SAMPLES_PER_EPOCH, SAMPLER_HALF_LIFE_BARS, SAMPLER_ATR_STRATA
+from system_base.logger import get_logger
+
+log = get_logger("RecencySampler")
+
+ATR_COLUMN = 6  # Индекс ATR в признаках (0:Open, 1:High, 2:Low, 3:Close, 4:Vol, 5:RSI, 6:ATR)
+
+class RecencySampler:
+    """
+    Окна X_train в хронологическом порядке. sample_epoch() -> отсортированные индексы окон эпохи:
+    каждая страта ATR получает равную квоту, внутри страты выбор без возвращения с весом
+    0.5 ** (давность / half_life). Недобор малых страт добирается из остальных окон по весу давности.
+    """
+
+    def __init__(self, X_train, samples_per_epoch=SAMPLER_SAMPLES_PER_EPOCH, half_life=SAMPLER_HALF_LIFE_BARS,
+                 n_strata=SAMPLER_ATR_STRATA, seed=None):
+        n = len(X_train)
+        self.n = n
+        self.samples_per_epoch = min(int(samples_per_epoch), n)
+        self.rng = np.random.default_rng(seed)
+
+        age = (n - 1) - np.arange(n)
+        self.weights = 0.5 ** (age / float(half_life))
+
+        # Режим волатильности — ATR последнего бара окна (масштаб не важен: квантили)
+        atr = np.asarray(X_train[:, -1, ATR_COLUMN], dtype=np.float64)
+        edges = np.quantile(atr, np.linspace(0, 1, n_strata + 1)[1:-1])
+        self.strata = np.searchsorted(edges, atr, side='right')
+        self.n_strata = n_strata
+
+    @property
+    def active(self):
+        """Подвыборка имеет смысл, только если окон больше бюджета эпохи."""
+        return self.samples_per_epoch < self.n
+
+    def _choose(self, candidates, k):
+        p = self.weights[candidates]
+        return self.rng.choice(candidates, size=k, replace=False, p=p / p.sum())
+
+    def sample_epoch(self):
+        if not self.active:
+            return np.arange(self.n)
+        quota = self.samples_per_epoch // self.n_strata
+        chosen = []
+        for s in range(self.n_strata):
+            members = np.flatnonzero(self.strata == s)
+            if len(members):
+                chosen.append(self._choose(members, min(quota, len(members))))
+        idx = np.concatenate(chosen) if chosen else np.empty(0, dtype=np.int64)
+
+        short = self.samples_per_epoch - len(idx)
+        if short > 0:
+            rest = np.setdiff1d(np.arange(self.n), idx, assume_unique=True)
+            idx = np.concatenate([idx, self._choose(rest, min(short, len(rest)))])
+        return np.sort(idx)
+
+    def describe(self):
+        """Сводка для лога: окна, бюджет эпохи, доли страт ATR."""
+        share = np.bincount(self.strata, minlength=self.n_strata) / self.n
+        return {"windows": self.n, "per_epoch": self.samples_per_epoch,
+                "strata_share": [round(float(v), 3) for v in share]}
+
+def fit_sampled(model, X_train, y_train, epochs, batch_size, sampler=None, callbacks=None):
+    """
+    model.fit по эпохам на подвыборке sampler (новая подвыборка каждую эпоху) или на всех окнах.
+    callbacks: callbacks Keras; выставленный ими model.stop_training прерывает и цикл эпох.
+    Возвращает время обучения, с.
+    """
+    t0 = time.perf_counter()
+    if sampler is None or not sampler.active:
+        model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size, callbacks=callbacks, verbose=0)
+        return time.perf_counter() - t0
+    for _ in range(epochs):
+        idx = sampler.sample_epoch()
+        # Хронологический порядок не нужен: shuffle внутри fit
+        model.fit(X_train[idx], y_train[idx], epochs=1, batch_size=batch_size, callbacks=callbacks, verbose=0)
+        if getattr(model, 'stop_training', False):
+            break
+    return time.perf_counter() - t0
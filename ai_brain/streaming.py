@@ -0,0 +1,141 @@
+# FILE: ai_brain/streaming.py
+# LOCATION: PROJ_AI_FOREX_2026/ai_brain/
+# DESCRIPTION: Потоковый инференс стека ModelBuilder (LSTM -> LSTM -> Dense) на NumPy.
+# Скрытые состояния (h, c) обоих слоев продвигаются на один бар вместо прогона всего окна.
+
+import numpy as np
+from system_base.logger import get_logger
+
+log = get_logger("StreamingLSTM")
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+class _LSTMCell:
+    """Ячейка Keras LSTM (activation=tanh, recurrent_activation=sigmoid, порядок гейтов i, f, c, o)."""
+
+    def __init__(self, kernel, recurrent_kernel, bias):
+        self.W = kernel.astype(np.float64)
+        self.U = recurrent_kernel.astype(np.float64)
+        self.b = bias.astype(np.float64)
+        self.units = self.U.shape[0]
+
+    def zero_state(self):
+        return np.zeros(self.units), np.zeros(self.units)
+
+    def step(self, x, h, c):
+        z = x @ self.W + h @ self.U + self.b
+        i, f, g, o = np.split(z, 4)
+        c = _sigmoid(f) * c + _sigmoid(i) * np.tanh(g)
+        h = _sigmoid(o) * np.tanh(c)
+        return h, c
+
+    def run(self, seq):
+        """Полный прогон последовательности с нулевого состояния -> (выходы по шагам, h, c)."""
+        h, c = self.zero_state()
+        # Входная проекция всех шагов одним матричным умножением
+        xw = seq @ self.W + self.b
+        out = np.empty((len(seq), self.units))
+        for t in range(len(seq)):
+            z = xw[t] + h @ self.U
+            i, f, g, o = np.split(z, 4)
+            c = _sigmoid(f) * c + _sigmoid(i) * np.tanh(g)
+            h = _sigmoid(o) * np.tanh(c)
+            out[t] = h
+        return out, h, c
+
+class StreamingLSTM:
+    """
+    Состояние агента: (h1, c1, h2, c2) после последнего бара.
+    Если новое окно — это прошлое, сдвинутое на один бар, выполняется один шаг обоих слоев.
+    Иначе (пропуск баров, смена данных) и каждые resync_every баров — полный прогон окна
+    с нулевого состояния, что ограничивает дрейф относительно оконного инференса.
+    """
+
+    def __init__(self, model, resync_every=60):
+        self.model = model
+        self.resync_every = max(int(resync_every), 1)
+        self.stats = {"steps": 0, "resyncs": 0}
+        self.reload_weights()
+
+    def reload_weights(self):
+        """Снимок весов модели (после обучения / адаптации) и сброс состояния."""
+        lstm, dense = [], None
+        for layer in self.model.layers:
+            kind = layer.__class__.__name__
+            if kind == 'LSTM':
+                lstm.append(_LSTMCell(*layer.get_weights()))
+            elif kind == 'Dense':
+                dense = layer.get_weights()
+            elif kind != 'Dropout':
+                raise ValueError(f"Слой {kind} не поддерживается потоковым инференсом")
+        if len(lstm) != 2 or dense is None:
+            raise ValueError("Ожидается стек ModelBuilder 'lstm2': LSTM -> LSTM -> Dense")
+
+        self.l1, self.l2 = lstm
+        self.dense_w, self.dense_b = (w.astype(np.float64) for w in dense)
+        self.reset()
+
+    def reset(self):
+        self._state = None
+        self._last_window = None
+        self._since_sync = 0
+
+    def _full_sync(self, window):
+        seq1, h1, c1 = self.l1.run(window)
+        _, h2, c2 = self.l2.run(seq1)
+        self._state = (h1, c1, h2, c2)
+        self._since_sync = 0
+        self.stats["resyncs"] += 1
+
+    def _is_shifted(self, window):
+        prev = self._last_window
+        return (prev is not None and prev.shape == window.shape
+                and np.array_equal(window[:-1], prev[1:]))
+
+    def predict(self, window):
+        """window: [window_size, features] (нормализованный) -> сырой выход Dense [3]."""
+        window = np.asarray(window, dtype=np.float64)
+
+        if self._state is not None and np.array_equal(window, self._last_window):
+            pass # Тот же бар: состояние уже актуально
+        elif self._state is not None and self._since_sync < self.resync_every and self._is_shifted(window):
+            h1, c1, h2, c2 = self._state
+            h1, c1 = self.l1.step(window[-1], h1, c1)
+            h2, c2 = self.l2.step(h1, h2, c2)
+            self._state = (h1, c1, h2, c2)
+            self._since_sync += 1
+            self.stats["steps"] += 1
+        else:
+            self._full_sync(window)
+
+        self._last_window = window.copy()
+        return self._state[2] @ self.dense_w + self.dense_b
+
+def check_parity(model, series, window_size, resync_every=60, tol=1e-3):
+    """
+    Сверка потокового режима с оконным model.predict на скользящих окнах ряда series [N, features].
+    Возвращает (max_abs_diff, ok).
+    """
+    stream = StreamingLSTM(model, resync_every=resync_every)
+    max_diff = 0.0
+    for end in range(window_size, len(series) + 1):
+        window = series[end - window_size:end]
+        ref = np.asarray(model.predict(window[None, ...], verbose=0)[0], dtype=np.float64)
+        max_diff = max(max_diff, float(np.max(np.abs(stream.predict(window) - ref))))
+    ok = max_diff <= tol
+    log.info(f"Паритет потокового инференса: max|diff|={max_diff:.2e} (tol={tol}), "
+             f"шагов {stream.stats['steps']}, ресинков {stream.stats['resyncs']}")
+    return max_diff, ok
+
+if __name__ == "__main__":
+    # Ручная проверка: python -m ai_brain.streaming (нужен TensorFlow)
+    from ai_brain.modelbuilder import ModelBuilder
+    from config import FEATURES
+
+    rng = np.random.default_rng(0)
+    win = 60
+    model = ModelBuilder.build_lstm_model(win, FEATURES)
+    series = rng.random((win * 4, FEATURES)).astype(np.float32)
+    diff, ok = check_parity(model, series, win)
+    print(f"max|diff| = {diff:.2e} -> {'OK' if ok else 'FAIL'}")
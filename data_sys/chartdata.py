@@ -0,0 +1,93 @@
+# FILE: data_sys/chartdata.py
+# LOCATION: PROJ_AI_FOREX_2026/data_sys/
+# DESCRIPTION: Сервис данных для hmi_charts. Кривые доходности по агентам и периодам,
+# прореженные LTTB до фиксированного бюджета точек и закэшированные до появления новых сделок.
+
+import time
+import numpy as np
+import pandas as pd
+from data_sys.stat import StatManager
+from config import CHART_TIME_RANGES, CHART_POINT_BUDGET
+from system_base.logger import get_logger
+
+log = get_logger("ChartData")
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: индексы n_out точек, сохраняющих форму кривой.
+    x, y: float-массивы одинаковой длины (x монотонно возрастает).
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # Среднее следующей корзины (для последней — последняя точка)
+        n_start, n_end = end, min(int((i + 2) * every) + 1, n)
+        avg_x = x[n_start:n_end].mean()
+        avg_y = y[n_start:n_end].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        idx[i + 1] = a
+
+    idx[-1] = n - 1
+    return idx
+
+class ChartDataService:
+    """
+    Кривые считаются сразу для всех агентов и всех периодов CHART_TIME_RANGES
+    и пересчитываются только при изменении кэша сделок StatManager (новый тикет).
+    """
+
+    # { (magic, budget): {"version": tuple, "curves": {days: {agent_id: DataFrame}}} }
+    _cache = {}
+
+    def __init__(self, stat_mgr=None, point_budget=CHART_POINT_BUDGET):
+        self.stat = stat_mgr if stat_mgr else StatManager()
+        self.point_budget = point_budget
+
+    def get_equity_curves(self, days):
+        """{agent_id: DataFrame[index=time, cum_profit]} — не больше point_budget точек на кривую."""
+        deals = self.stat.sync()
+        # Новые сделки или смена часа (сдвиг начала окна периода) -> пересчет
+        version = (len(deals), int(deals['ticket'].max()) if not deals.empty else 0, int(time.time() // 3600))
+        key = (self.stat.magic, self.point_budget)
+
+        cached = self._cache.get(key)
+        if cached is None or cached['version'] != version:
+            t0 = time.perf_counter()
+            cached = {"version": version, "curves": self._build_all(deals)}
+            self._cache[key] = cached
+            log.info(f"Кривые доходности пересчитаны за {(time.perf_counter() - t0) * 1000:.1f} мс ({len(deals)} сделок)")
+
+        if days not in cached['curves']:
+            cached['curves'][days] = self._build_range(deals, days)
+        return cached['curves'][days]
+
+    def _build_all(self, deals):
+        return {days: self._build_range(deals, days) for days in CHART_TIME_RANGES.values()}
+
+    def _build_range(self, deals, days):
+        if deals.empty:
+            return {}
+
+        since = int(time.time()) - days * 86400
+        df = deals[deals['time'] >= since].sort_values(['time', 'ticket'])
+
+        curves = {}
+        for aid, g in df.groupby('agent_id'):
+            x = g['time'].to_numpy(dtype=np.float64)
+            y = g['profit'].cumsum().to_numpy(dtype=np.float64)
+            keep = lttb(x, y, self.point_budget)
+            curves[aid] = pd.DataFrame(
+                {"cum_profit": y[keep]},
+                index=pd.to_datetime(g['time'].to_numpy()[keep], unit='s')
+            )
+        return curves
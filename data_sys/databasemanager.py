@@ -3,43 +3,113 @@ import sqlite3
 import pandas as pd
 import pandas_ta as ta
 import os
-import joblib
+import numpy as np
+from multiprocessing import shared_memory
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.preprocessing import MinMaxScaler
 from mpire import WorkerPool
-from config import DB_PATH, MODELS_DIR, TF_SETTINGS
+from config import DB_PATH, TF_SETTINGS
 from system_base.logger import get_logger
 
 log = get_logger("DatabaseManager")
 
-def _process_symbol_data(args):
-    """Параллельный препроцессинг для конкретной таблицы (Symbol_TF)"""
-    symbol_tf, raw_values = args
+# Строгий порядок признаков (идентично DataFactory и Brain)
+FEATURE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'rsi', 'atr']
+TARGET_COLUMNS = [3, 1, 2]  # Close, High, Low
+
+# Поля model_settings, добавленные после первой версии схемы: {колонка: (тип SQL, значение по умолчанию)}.
+# Отсутствующие колонки добавляются в существующую БД через ALTER TABLE.
+EXTRA_SETTINGS = {
+    'inference_mode': ('TEXT', 'window'),   # 'window' — полный прогон окна, 'stream' — потоковый LSTM
+    'stream_resync': ('INTEGER', 60),       # Полный пересчет окна каждые N баров в режиме 'stream'
+    'backend': ('TEXT', 'keras'),           # Движок инференса: 'keras' или 'onnx' (onnxruntime)
+    'architecture': ('TEXT', 'lstm2'),      # Сеть ModelBuilder: lstm2 / lstm1 / gru / conv1d / tcn
+}
+
+def _get_indicator_settings(symbol_tf):
+    """Параметры RSI/ATR по суффиксу ID (идентично DataFactory)."""
+    tf_suffix = symbol_tf.split('_')[-1]
+    return next((v for k, v in TF_SETTINGS.items() if v['suffix'] == tf_suffix),
+                {'rsi': 14, 'atr': 14}) # Дефолтные значения 2026 года
+
+def prepare_scaled_features(raw_values, symbol_tf):
+    """
+    Единый препроцессинг для Education и параллельного пайплайна:
+    OHLCV -> 7 признаков (O, H, L, C, V, RSI, ATR) -> MinMax [0, 1].
+    Возвращает (scaled float32 [N, 7], scaler) или (None, None).
+    """
     if raw_values is None or len(raw_values) < 100:
-        return symbol_tf, None
-    
-    # 1. Создаем DataFrame
+        return None, None
+
     df = pd.DataFrame(raw_values, columns=['open', 'high', 'low', 'close', 'volume'])
-    
-    # 2. Определяем настройки индикаторов по суффиксу из ID
-    tf_suffix = symbol_tf.split('_')[-1]
-    
-    # Согласованный поиск настроек (идентично DataFactory)
-    stg = next((v for k, v in TF_SETTINGS.items() if v['suffix'] == tf_suffix), 
-               {'rsi': 14, 'atr': 14}) # Дефолтные значения 2026 года
-    
-    df.ta.rsi(length=stg.get('rsi', 14), append=True)
-    df.ta.atr(length=stg.get('atr', 14), append=True)
+    stg = _get_indicator_settings(symbol_tf)
+    df['rsi'] = ta.rsi(df['close'], length=stg.get('rsi', 14))
+    df['atr'] = ta.atr(df['high'], df['low'], df['close'], length=stg.get('atr', 14))
     df.dropna(inplace=True)
 
-    # 3. Нормализация (FEATURES = 7: O, H, L, C, V, RSI, ATR)
     scaler = MinMaxScaler(feature_range=(0, 1))
-    scaled_values = scaler.fit_transform(df)
-    
-    # 4. Сохранение скалера в models/ (для Brain.py и DataFactory.get_data)
-    scaler_path = os.path.join(MODELS_DIR, f"scaler_{symbol_tf}.pkl")
-    joblib.dump(scaler, scaler_path)
-    
-    return symbol_tf, scaled_values
+    scaled = scaler.fit_transform(df[FEATURE_COLUMNS].values).astype(np.float32)
+    return scaled, scaler
+
+def make_windows(data, window_size):
+    """
+    Окна [N - window, window, 7] как view без копирования (sliding_window_view)
+    и цели [Close, High, Low] следующего бара.
+    """
+    X = sliding_window_view(data, (window_size, data.shape[1]))[:-1, 0]
+    y = data[window_size:, TARGET_COLUMNS]
+    return X, y
+
+def _process_symbol_data(symbol_tf, shm_name, max_rows, limit):
+    """
+    Воркер MPIRE: сам читает свою таблицу (в родителя данные не грузятся),
+    считает признаки и пишет скалированную матрицу в shared memory.
+    """
+    raw_values = DatabaseManager().get_history(symbol_tf, limit=limit)
+    scaled, scaler = prepare_scaled_features(raw_values, symbol_tf)
+    if scaled is None:
+        return symbol_tf, 0, None
+
+    n_rows = min(len(scaled), max_rows)
+    # Сегментом владеет родитель: воркер только пишет и закрывает свой дескриптор
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        buf = np.ndarray((max_rows, len(FEATURE_COLUMNS)), dtype=np.float32, buffer=shm.buf)
+        buf[:n_rows] = scaled[-n_rows:]
+        del buf
+    finally:
+        shm.close()
+
+    return symbol_tf, n_rows, scaler
+
+class SharedTrainingSet:
+    """
+    Готовая обучающая выборка агента в shared memory.
+    X — окна-view поверх сегмента, y — цели. Сегментом владеет родитель (release()).
+    """
+    def __init__(self, symbol_tf, shm, n_rows, scaler, window_size):
+        self.symbol_tf = symbol_tf
+        self.scaler = scaler
+        self.window_size = window_size
+        self._shm = shm
+        self.data = np.ndarray((n_rows, len(FEATURE_COLUMNS)), dtype=np.float32, buffer=shm.buf)
+        self.X, self.y = make_windows(self.data, window_size)
+
+    def __len__(self):
+        return len(self.X)
+
+    def release(self):
+        """Освобождение сегмента после обучения."""
+        self.data = self.X = self.y = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # На окна еще ссылается Keras/срезы — память уйдет вместе с ними
+            pass
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
 
 class DatabaseManager:
     def __init__(self):
@@ -84,27 +154,58 @@ class DatabaseManager:
             log.error(f"[{symbol_tf}] Ошибка чтения истории: {e}")
             return None
 
-    def load_training_data_parallel(self, symbol_tf_list):
-        """Массовый препроцессинг данных из разных таблиц"""
+    def load_training_data_parallel(self, symbol_tf_list, window_sizes=None, limit=100000):
+        """
+        Массовый препроцессинг для Education: каждый воркер читает свою таблицу сам,
+        результат — SharedTrainingSet в shared memory (без пиклинга массивов).
+        window_sizes: {symbol_tf: window} — по умолчанию из model_settings.
+        """
+        window_sizes = window_sizes or {}
+        segments = {}
         tasks = []
         with self._get_conn() as conn:
             for symbol_tf in symbol_tf_list:
                 # Проверка существования таблицы
-                cursor = conn.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{symbol_tf}'")
-                if cursor.fetchone():
-                    query = f"SELECT open, high, low, close, volume FROM {symbol_tf} ORDER BY time ASC"
-                    raw = pd.read_sql(query, conn).values
-                    if len(raw) > 0:
-                        tasks.append((symbol_tf, raw))
-        
+                cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (symbol_tf,))
+                if not cursor.fetchone():
+                    continue
+                # Родитель узнает только размер, чтобы выделить сегмент заранее
+                total = conn.execute(f"SELECT COUNT(*) FROM {symbol_tf}").fetchone()[0]
+                max_rows = min(total, limit)
+                if max_rows < 100:
+                    continue
+                shm = shared_memory.SharedMemory(create=True, size=max_rows * len(FEATURE_COLUMNS) * 4)
+                segments[symbol_tf] = shm
+                tasks.append((symbol_tf, shm.name, max_rows, limit))
+
         if not tasks:
             return {}
 
         log.info(f"Запуск MPIRE препроцессинга для {len(tasks)} таблиц...")
-        with WorkerPool(n_jobs=os.cpu_count()) as pool:
-            results = pool.map(_process_symbol_data, tasks)
-        
-        return {res[0]: res[1] for res in results if res is not None}
+        try:
+            with WorkerPool(n_jobs=min(len(tasks), os.cpu_count() or 1)) as pool:
+                results = pool.map(_process_symbol_data, tasks)
+        except Exception as e:
+            log.error(f"Ошибка параллельного препроцессинга: {e}")
+            results = []
+
+        datasets = {}
+        for symbol_tf, n_rows, scaler in results:
+            shm = segments.pop(symbol_tf)
+            window = window_sizes.get(symbol_tf) or self.get_model_settings(symbol_tf).get('window_size', 60)
+            if scaler is None or n_rows < window * 2:
+                log.warning(f"[{symbol_tf}] Недостаточно данных для обучающей выборки.")
+                shm.close()
+                shm.unlink()
+                continue
+            datasets[symbol_tf] = SharedTrainingSet(symbol_tf, shm, n_rows, scaler, int(window))
+
+        # Сегменты упавших воркеров
+        for shm in segments.values():
+            shm.close()
+            shm.unlink()
+
+        return datasets
     
     def get_model_settings(self, symbol_tf):
         """Получение настроек модели из БД (версия 2026 с window_size)."""
@@ -116,7 +217,8 @@ class DatabaseManager:
             'optimizer': 'Adam', 
             'lstm_units': 100, 
             'dropout_rate': 0.2,
-            'error_multiplier': 1.5  # Множитель порога ATR (Новое 2026)
+            'error_multiplier': 1.5,  # Множитель порога ATR (Новое 2026)
+            **{k: v[1] for k, v in EXTRA_SETTINGS.items()}
         }
         
         try:
@@ -132,25 +234,35 @@ class DatabaseManager:
                                 lstm_units INTEGER, 
                                 dropout_rate REAL,
                                 error_multiplier REAL)""")
+                self._migrate_settings(conn)
                 
                 query = "SELECT * FROM model_settings WHERE model_id = ?"
                 df = pd.read_sql(query, conn, params=(symbol_tf,))
                 
                 if df.empty:
                     cols = ', '.join(defaults.keys())
-                    # Теперь у нас 9 знаков ? (model_id + 8 параметров)
-                    conn.execute(f"INSERT INTO model_settings (model_id, {cols}) VALUES (?,?,?,?,?,?,?,?,?)",
+                    marks = ', '.join(['?'] * (len(defaults) + 1)) # model_id + параметры
+                    conn.execute(f"INSERT INTO model_settings (model_id, {cols}) VALUES ({marks})",
                                  (symbol_tf, *defaults.values()))
                     conn.commit()
                     return defaults
                 
                 res = df.iloc[0].to_dict()
                 res.pop('model_id')
-                return res
+                # NULL в новых колонках старых записей -> значения по умолчанию
+                return {k: (defaults[k] if k in defaults and pd.isna(v) else v) for k, v in res.items()}
         except Exception as e:
             log.error(f"[{symbol_tf}] Ошибка настроек в БД: {e}")
             return defaults
 
+    def _migrate_settings(self, conn):
+        """Добавление колонок EXTRA_SETTINGS в таблицу model_settings старых БД."""
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(model_settings)")}
+        for col, (sql_type, default) in EXTRA_SETTINGS.items():
+            if col not in existing:
+                conn.execute(f"ALTER TABLE model_settings ADD COLUMN {col} {sql_type} DEFAULT {default!r}")
+                log.info(f"model_settings: добавлена колонка {col}")
+
     def save_model_settings(self, symbol_tf, settings):
         """Запись настроек в БД."""
         try:
@@ -168,5 +280,11 @@ class DatabaseManager:
                     settings['dropout_rate'], settings['error_multiplier'], # <-- Добавлено
                     symbol_tf
                 ))
+                # Дополнительные поля пишутся, только если переданы (старые формы их не знают)
+                extra = {k: settings[k] for k in EXTRA_SETTINGS if k in settings}
+                if extra:
+                    self._migrate_settings(conn)
+                    sets = ', '.join(f"{k}=?" for k in extra)
+                    conn.execute(f"UPDATE model_settings SET {sets} WHERE model_id=?", (*extra.values(), symbol_tf))
         except Exception as e:
             log.error(f"[{symbol_tf}] Ошибка сохранения настроек: {e}")
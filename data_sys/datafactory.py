@@ -3,7 +3,6 @@ import os, joblib, time
 import pandas as pd
 import pandas_ta as ta
 import numpy as np
-from data_sys.yfinance_provider import YFinanceProvider
 
 # Пытаемся импортировать конфиг из пакета root (согласно структуре main.py)
 try:
@@ -13,6 +12,8 @@ except ImportError:
 
 from system_base.logger import get_logger
 from data_sys.mt5_provider import MT5Provider
+from data_sys.provider_gateway import ProviderGateway
+from ai_brain.bundle import bundle_path, read_header
 
 log = get_logger("DataFactory")
 
@@ -24,16 +25,20 @@ class DataFactory:
 
     @classmethod
     def _get_scaler(cls, symbol_tf, path):
-        """Загружает скалер в память один раз или обновляет при изменении файла (mtime)."""
+        """
+        Загружает скалер в память один раз или обновляет при изменении файла (mtime).
+        path — бандл модели (.fxb, читается только заголовок) или наследие .pkl.
+        """
         try:
             current_mtime = os.path.getmtime(path)
             cached = cls._scalers_cache.get(symbol_tf)
 
-            if not cached or cached['mtime'] < current_mtime:
+            if not cached or cached['mtime'] < current_mtime or cached.get('path') != path:
                 log.info(f"[{symbol_tf}] Загрузка/Обновление скалера из файла.")
                 cls._scalers_cache[symbol_tf] = {
-                    'scaler': joblib.load(path),
-                    'mtime': current_mtime
+                    'scaler': read_header(path).scaler if path.endswith('.fxb') else joblib.load(path),
+                    'mtime': current_mtime,
+                    'path': path
                 }
             return cls._scalers_cache[symbol_tf]['scaler']
         except Exception as e:
@@ -57,10 +62,8 @@ class DataFactory:
         # Для 2026 года берем запас 50, так как RSI/ATR обычно требуют 14-30 баров
         request_count = window_size + 50
         
-        if cfg.IS_SIMULATION:
-            raw_rates = YFinanceProvider.get_raw_rates(symbol, tf_str, request_count)
-        else:
-            raw_rates = MT5Provider.get_raw_rates(symbol, tf_str, request_count)
+        # Через шлюз: повторный запрос той же серии в пределах такта не уходит к источнику
+        raw_rates = ProviderGateway.get_raw_rates(symbol, tf_str, request_count, simulation=cfg.IS_SIMULATION)
 
         if raw_rates is None:
             return None, None, None
@@ -104,7 +107,9 @@ class DataFactory:
 
         # 4. Нормализация
         symbol_tf = f"{symbol}_{tf_str}"
-        scaler_path = os.path.join(cfg.MODELS_DIR, f"scaler_{symbol_tf}.pkl")
+        scaler_path = bundle_path(symbol_tf)
+        if not os.path.exists(scaler_path):
+            scaler_path = os.path.join(cfg.MODELS_DIR, f"scaler_{symbol_tf}.pkl")
         
         if not os.path.exists(scaler_path):
             log.error(f"[{symbol_tf}] Скалер не найден: {scaler_path}")
@@ -2,6 +2,7 @@
 import MetaTrader5 as mt5
 import time
 from system_base.logger import get_logger
+from system_base.broker_gateway import BrokerGateway
 
 log = get_logger("MT5Provider")
 
@@ -25,7 +26,7 @@ class MT5Provider:
 
         for attempt in range(3):
             # Запрос к терминалу
-            rates = mt5.copy_rates_from_pos(symbol, tf_mt5, 0, count)
+            rates = BrokerGateway.instance().copy_rates_from_pos(symbol, tf_mt5, 0, count)
             
             if rates is not None and len(rates) >= count:
                 return rates
@@ -40,7 +41,7 @@ class MT5Provider:
     def check_terminal():
         """Проверка коннекта к торговому серверу."""
         try:
-            terminal_info = mt5.terminal_info()
+            terminal_info = BrokerGateway.instance().call("terminal_info")
             if terminal_info is None:
                 return False
             return terminal_info.connected
@@ -0,0 +1,113 @@
+# FILE: data_sys/provider_gateway.py
+# LOCATION: PROJ_AI_FOREX_2026/data_sys/
+# DESCRIPTION: Шлюз перед MT5Provider / YFinanceProvider. Одинаковые запросы в окне свежести
+# (и одновременные запросы из разных потоков) схлопываются в один вызов к источнику (single-flight).
+
+import time
+import threading
+from data_sys.mt5_provider import MT5Provider
+from data_sys.yfinance_provider import YFinanceProvider
+from system_base.broker_gateway import BrokerGateway
+from config import GATEWAY_FRESHNESS_SEC, GATEWAY_SYMBOL_INFO_TTL
+from system_base.logger import get_logger
+
+log = get_logger("ProviderGateway", db_type='system')
+
+class ProviderGateway:
+    """
+    Кэш на процесс: { key: (value, fetched_at) }.
+    Ключ — серия (источник, символ, ТФ) или справочный запрос (symbol_info / symbol_info_tick).
+    Нагрузка на брокера за цикл: O(различных серий), а не O(вызовов).
+    """
+
+    _cache = {}
+    _inflight = {}   # { key: threading.Event } — запрос уже выполняется другим потоком
+    _lock = threading.Lock()
+    stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    @classmethod
+    def _get(cls, key, fetch, ttl, accept=None):
+        """
+        Значение из кэша, если оно свежее ttl (и подходит под accept), иначе один вызов fetch().
+        Параллельные запросы того же ключа ждут результата лидера.
+        """
+        waited = False
+        while True:
+            with cls._lock:
+                entry = cls._cache.get(key)
+                if entry is not None and time.monotonic() - entry[1] < ttl and (accept is None or accept(entry[0])):
+                    if not waited:
+                        cls.stats["hits"] += 1
+                    return entry[0]
+
+                event = cls._inflight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    cls._inflight[key] = event
+                    if not waited:
+                        cls.stats["misses"] += 1
+                    break
+                if not waited:
+                    cls.stats["coalesced"] += 1
+                    waited = True
+
+            # Ждем лидера и перечитываем кэш
+            event.wait()
+
+        try:
+            value = fetch()
+            with cls._lock:
+                cls._cache[key] = (value, time.monotonic())
+            return value
+        finally:
+            with cls._lock:
+                cls._inflight.pop(key, None)
+            event.set()
+
+    # --- СЕРИИ БАРОВ ---
+    @classmethod
+    def get_raw_rates(cls, symbol, tf_str, count, simulation=False):
+        """
+        Бары из MT5 (или Yahoo в симуляции). Запрос меньшей глубины обслуживается
+        хвостом уже загруженной более длинной серии.
+        """
+        source = "yf" if simulation else "mt5"
+        provider = YFinanceProvider if simulation else MT5Provider
+
+        def enough(rates):
+            return rates is None or len(rates) >= count
+
+        rates = cls._get(("rates", source, symbol, tf_str),
+                         lambda: provider.get_raw_rates(symbol, tf_str, count),
+                         GATEWAY_FRESHNESS_SEC, accept=enough)
+        if rates is None or len(rates) <= count:
+            return rates
+        return rates[-count:]
+
+    # --- СПРАВОЧНЫЕ ЗАПРОСЫ ---
+    @classmethod
+    def symbol_info(cls, symbol):
+        """Спецификация символа меняется редко: отдельный TTL (GATEWAY_SYMBOL_INFO_TTL)."""
+        return cls._get(("symbol_info", symbol), lambda: BrokerGateway.instance().symbol_info(symbol), GATEWAY_SYMBOL_INFO_TTL)
+
+    @classmethod
+    def symbol_info_tick(cls, symbol):
+        return cls._get(("tick", symbol), lambda: BrokerGateway.instance().symbol_info_tick(symbol), GATEWAY_FRESHNESS_SEC)
+
+    # --- СЕРВИС ---
+    @classmethod
+    def invalidate(cls, symbol=None):
+        """Сброс кэша (весь или по символу), например после отправки ордера."""
+        with cls._lock:
+            if symbol is None:
+                cls._cache.clear()
+            else:
+                for key in [k for k in cls._cache if symbol in k]:
+                    cls._cache.pop(key, None)
+
+    @classmethod
+    def get_stats(cls):
+        with cls._lock:
+            total = cls.stats["hits"] + cls.stats["misses"] + cls.stats["coalesced"]
+            saved = cls.stats["hits"] + cls.stats["coalesced"]
+            return {**cls.stats, "hit_rate_%": round(saved / total * 100, 1) if total else 0.0}
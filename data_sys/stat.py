@@ -1,62 +1,229 @@
 # data_sys/stat.py
+import sqlite3
+import time
 import MetaTrader5 as mt5
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from system_base.logger import get_logger
-from config import MAGIC_NUMBER
+from system_base.broker_gateway import BrokerGateway
+from config import MAGIC_NUMBER, DB_PATH, STAT_SYNC_SEC, STAT_HISTORY_DAYS
 
 log = get_logger("StatManager")
 
+DEAL_COLUMNS = ['ticket', 'time', 'agent_id', 'symbol', 'comment', 'type', 'price', 'volume', 'profit']
+
 class StatManager:
+    """
+    Аналитика сделок поверх локального кэша (SQLite, таблица deals_cache).
+    Из MT5 догружаются только сделки новее последнего закэшированного тикета,
+    бегущие агрегаты по агентам (PnL, пик, просадка, дневные корзины) обновляются инкрементально
+    и обслуживают get_agents_metrics без пересчета по всему кэшу.
+    """
+
+    # Кэш на процесс (Streamlit создает StatManager на каждый rerun):
+    # { magic: {"df": DataFrame, "synced_at": float} }
+    _memory = {}
+
     def __init__(self, magic=MAGIC_NUMBER):
         self.magic = magic
 
-    def get_trades_history(self, symbol=None, days=90):
-        """
-        Получает историю сделок и фильтрует их по ID агента (Symbol_TF)
-        через комментарий или магическое число.
-        """
-        from_date = datetime.now() - timedelta(days=days)
+    def _get_conn(self):
+        conn = sqlite3.connect(DB_PATH, timeout=10)
+        conn.execute("""CREATE TABLE IF NOT EXISTS deals_cache (
+                        ticket INTEGER PRIMARY KEY, time INTEGER, magic INTEGER,
+                        agent_id TEXT, symbol TEXT, comment TEXT,
+                        type INTEGER, price REAL, volume REAL, profit REAL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_deals_cache_agent ON deals_cache(magic, agent_id, time)")
+        conn.execute("""CREATE TABLE IF NOT EXISTS deals_agg (
+                        magic INTEGER, agent_id TEXT,
+                        trades INTEGER, wins INTEGER, cum_pnl REAL, peak REAL, max_dd REAL,
+                        last_ticket INTEGER, PRIMARY KEY (magic, agent_id))""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS deals_daily (
+                        magic INTEGER, agent_id TEXT, day TEXT, pnl REAL, trades INTEGER, wins INTEGER,
+                        PRIMARY KEY (magic, agent_id, day))""")
+        return conn
+
+    # --- СИНХРОНИЗАЦИЯ КЭША ---
+    def sync(self, force=False):
+        """Догрузка новых сделок из MT5 (не чаще STAT_SYNC_SEC). Возвращает DataFrame кэша."""
+        mem = self._memory.get(self.magic)
+        if mem is not None and not force and time.time() - mem['synced_at'] < STAT_SYNC_SEC:
+            return mem['df']
+
+        try:
+            with self._get_conn() as conn:
+                if mem is None:
+                    # Блокировка записи до чтения: кэш и агрегаты читаются и дополняются согласованно
+                    conn.execute("BEGIN IMMEDIATE")
+                    df = pd.read_sql(f"SELECT {', '.join(DEAL_COLUMNS)} FROM deals_cache WHERE magic = ? ORDER BY time, ticket",
+                                     conn, params=(self.magic,))
+                    self._ensure_aggregates(conn, df)
+                else:
+                    df = mem['df']
+
+                new_df = self._fetch_new_deals(df)
+                if not new_df.empty:
+                    rows = new_df[DEAL_COLUMNS]
+                    insert = f"INSERT OR IGNORE INTO deals_cache (magic, {', '.join(DEAL_COLUMNS)}) VALUES ({', '.join(['?'] * (len(DEAL_COLUMNS) + 1))})"
+                    inserted = [conn.execute(insert, (self.magic, *row)).rowcount == 1 for row in rows.itertuples(index=False)]
+                    # Одна транзакция: в агрегаты идут только вставленные строки (остальные уже записал другой процесс)
+                    self._update_aggregates(conn, rows[inserted])
+                    df = rows if df.empty else pd.concat([df, rows], ignore_index=True)
+                    log.info(f"Кэш сделок: +{len(new_df)} (всего {len(df)})")
+        except Exception as e:
+            log.error(f"Ошибка синхронизации кэша сделок: {e}")
+            return mem['df'] if mem is not None else pd.DataFrame(columns=DEAL_COLUMNS)
+
+        self._memory[self.magic] = {"df": df, "synced_at": time.time()}
+        return df
+
+    def _fetch_new_deals(self, cached_df):
+        """Запрос к MT5 только с момента последней закэшированной сделки."""
         to_date = datetime.now()
-        
-        # 1. Запрашиваем всю историю сделок по магическому числу бота
-        # Мы не используем group_filter по символу здесь, чтобы иметь возможность 
-        # гибко фильтровать данные в DataFrame
-        deals = mt5.history_deals_get(from_date, to_date)
+        if cached_df.empty:
+            last_ticket = 0
+            from_date = to_date - timedelta(days=STAT_HISTORY_DAYS)
+        else:
+            last_ticket = int(cached_df['ticket'].max())
+            # Небольшое перекрытие на случай сдвига серверного времени; дубли отсекаются по тикету
+            from_date = datetime.fromtimestamp(int(cached_df['time'].max())) - timedelta(days=1)
 
+        deals = BrokerGateway.instance().history_deals_get(from_date, to_date)
         if deals is None or len(deals) == 0:
-            #log.info(f"Нет сделок за последние {days} дней.")
-            return pd.DataFrame(), {}
+            return pd.DataFrame(columns=DEAL_COLUMNS)
 
-        # 2. Превращаем в DataFrame
         df = pd.DataFrame(list(deals), columns=deals[0]._asdict().keys())
-        
-        # 3. Базовая фильтрация: наш Magic Number и только закрытые сделки (OUT)
-        df = df[(df['magic'] == self.magic) & (df['entry'] == mt5.DEAL_ENTRY_OUT)]
-        
+
+        # Наш Magic Number, только закрытые сделки (OUT) и только новые тикеты
+        df = df[(df['magic'] == self.magic) & (df['entry'] == mt5.DEAL_ENTRY_OUT) & (df['ticket'] > last_ticket)]
+        if df.empty:
+            return pd.DataFrame(columns=DEAL_COLUMNS)
+
+        # ID агента (Symbol_TF) пишется Trader'ом в comment, иначе — символ MT5
+        df = df.assign(agent_id=df['comment'].where(df['comment'].astype(bool), df['symbol']))
+        return df[DEAL_COLUMNS].sort_values(['time', 'ticket']).reset_index(drop=True)
+
+    def _ensure_aggregates(self, conn, cached_df):
+        """Кэш, записанный без агрегатов (пустой deals_agg для magic): агрегаты пересчитываются по кэшу."""
+        if cached_df.empty or conn.execute("SELECT 1 FROM deals_agg WHERE magic = ? LIMIT 1", (self.magic,)).fetchone():
+            return
+        conn.execute("DELETE FROM deals_daily WHERE magic = ?", (self.magic,))
+        self._update_aggregates(conn, cached_df)
+        log.info(f"Агрегаты сделок восстановлены по кэшу ({len(cached_df)} сделок)")
+
+    def _update_aggregates(self, conn, new_df):
+        """Инкрементальное обновление бегущих агрегатов по всем агентам одним group-by."""
+        if new_df.empty:
+            return
+        prev = pd.read_sql("SELECT agent_id, trades, wins, cum_pnl, peak, max_dd FROM deals_agg WHERE magic = ?",
+                           conn, params=(self.magic,)).set_index('agent_id')
+
+        df = new_df[['agent_id', 'ticket', 'time', 'profit']].sort_values(['time', 'ticket'])
+        base = prev.reindex(df['agent_id'].unique()).astype(float).fillna(0.0)
+
+        df['cum'] = df.groupby('agent_id')['profit'].cumsum() + df['agent_id'].map(base['cum_pnl'])
+        df['peak'] = np.maximum(df.groupby('agent_id')['cum'].cummax(), df['agent_id'].map(base['peak']))
+        df['dd'] = df['cum'] - df['peak']
+        df['win'] = (df['profit'] > 0).astype(int)
+
+        g = df.groupby('agent_id')
+        agg = pd.DataFrame({
+            'trades': base['trades'] + g.size(),
+            'wins': base['wins'] + g['win'].sum(),
+            'cum_pnl': g['cum'].last(),
+            'peak': g['peak'].last(),
+            'max_dd': np.minimum(base['max_dd'], g['dd'].min()),
+            'last_ticket': g['ticket'].max(),
+        })
+        conn.executemany(
+            "INSERT OR REPLACE INTO deals_agg VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(self.magic, aid, int(r.trades), int(r.wins), float(r.cum_pnl), float(r.peak), float(r.max_dd), int(r.last_ticket))
+             for aid, r in agg.iterrows()]
+        )
+
+        # Дневные корзины (UTC)
+        df['day'] = pd.to_datetime(df['time'], unit='s').dt.strftime('%Y-%m-%d')
+        daily = df.groupby(['agent_id', 'day']).agg(pnl=('profit', 'sum'), trades=('profit', 'size'), wins=('win', 'sum'))
+        conn.executemany(
+            """INSERT INTO deals_daily VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(magic, agent_id, day) DO UPDATE SET pnl = pnl + excluded.pnl,
+               trades = trades + excluded.trades, wins = wins + excluded.wins""",
+            [(self.magic, aid, day, float(r.pnl), int(r.trades), int(r.wins)) for (aid, day), r in daily.iterrows()]
+        )
+
+    # --- ЗАПРОСЫ ДЛЯ HMI ---
+    def get_trades_history(self, symbol=None, days=90):
+        """
+        Получает историю сделок и фильтрует их по ID агента (Symbol_TF)
+        через комментарий или магическое число. Данные — из локального кэша.
+        """
+        df = self.sync()
         if df.empty:
             return pd.DataFrame(), {}
 
-        # 4. ФИЛЬТРАЦИЯ ПО ID АГЕНТА (Symbol_TF)
-        # В 2026 году мы ожидаем, что в поле comment записан ID (напр. 'EURUSD_H1')
-        # Если передан конкретный символ/ID, фильтруем по нему
+        since = int((datetime.now() - timedelta(days=days)).timestamp())
+        mask = df['time'] >= since
+
+        # ФИЛЬТРАЦИЯ ПО ID АГЕНТА (Symbol_TF): точный символ MT5 или комментарий
         if symbol:
-            # Сначала пробуем фильтровать по точному совпадению символа MT5
-            # Затем по комментарию, если в нем хранится таймфрейм
-            mask = (df['symbol'] == symbol) | (df['comment'] == symbol)
-            df = df[mask]
+            mask &= (df['symbol'] == symbol) | (df['comment'] == symbol)
+        df = df[mask]
 
         if df.empty:
             return pd.DataFrame(), {}
 
         # Форматирование времени и индексация
-        df['time'] = pd.to_datetime(df['time'], unit='s')
-        df.set_index('time', inplace=True)
-        df = df.sort_index()
+        df = df.assign(time=pd.to_datetime(df['time'], unit='s')).set_index('time').sort_index()
 
         return df, self._calculate_metrics(df)
 
+    def get_agents_metrics(self, agent_ids=None, days=90):
+        """
+        Метрики агентов из бегущих агрегатов (индекс — agent_id), без прохода по сделкам кэша.
+        Сделки, win rate, прибыль и дневной Шарп — по дневным корзинам deals_daily за days;
+        пик и максимальная просадка — бегущие значения deals_agg за всю историю кэша.
+        """
+        self.sync()
+        since = int((datetime.now() - timedelta(days=days)).timestamp())
+        try:
+            with self._get_conn() as conn:
+                agg = pd.read_sql("SELECT agent_id, peak, max_dd FROM deals_agg WHERE magic = ?",
+                                  conn, params=(self.magic,)).set_index('agent_id')
+                daily = pd.read_sql("SELECT agent_id, day, pnl, trades, wins FROM deals_daily WHERE magic = ? AND day >= ?",
+                                    conn, params=(self.magic, pd.Timestamp(since, unit='s').strftime('%Y-%m-%d')))
+        except Exception as e:
+            log.error(f"Ошибка чтения агрегатов сделок: {e}")
+            return pd.DataFrame()
+        if agent_ids is not None:
+            daily = daily[daily['agent_id'].isin(agent_ids)]
+        if daily.empty:
+            return pd.DataFrame()
+
+        g = daily.groupby('agent_id')
+        trades = g['trades'].sum()
+
+        # Шарп (дневной): календарные дни от первой до последней корзины агента, пустые дни = 0
+        day = pd.to_datetime(daily['day'])
+        pnl = daily.assign(day=day).pivot(index='day', columns='agent_id', values='pnl')
+        pnl = pnl.reindex(pd.date_range(pnl.index.min(), pnl.index.max(), freq='D'))
+        first, last = day.groupby(daily['agent_id']).min(), day.groupby(daily['agent_id']).max()
+        idx = pnl.index.values[:, None]
+        in_range = (idx >= first[pnl.columns].values) & (idx <= last[pnl.columns].values)
+        pnl = pnl.fillna(0).where(in_range)
+        std = pnl.std()
+        sharpe = (pnl.mean() / std.where(std > 0)) * np.sqrt(252)
+
+        agg = agg.reindex(trades.index)
+        return pd.DataFrame({
+            "total_trades": trades,
+            "win_rate_%": (g['wins'].sum() / trades * 100).round(2),
+            "total_profit_usd": g['pnl'].sum().round(2),
+            "peak_usd": agg['peak'].round(2),
+            "max_drawdown_usd": agg['max_dd'].round(2),
+            "sharpe_ratio": sharpe.fillna(0.0).round(2),
+        })
+
     def _calculate_metrics(self, df):
         """Расчет финансовых метрик 2026"""
         total_trades = len(df)
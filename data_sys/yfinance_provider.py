@@ -1,22 +1,169 @@
 # data_sys/yfinance_provider.py
+import os
+import time
+import tempfile
 import yfinance as yf
 import pandas as pd
+from config import YF_CACHE_DIR, YF_REFRESH_SEC, YF_INITIAL_PERIOD
 from system_base.logger import get_logger
 
 log = get_logger("YFinanceProvider", db_type='system')
 
+OHLCV_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'tick_volume']
+
+def _to_epoch(ts):
+    """datetime (naive UTC, любая единица хранения) -> секунды epoch."""
+    return (ts - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+
+def _yf_download(symbol, interval, period=None, start=None):
+    """Загрузчик по умолчанию (сеть). Подменяется через YFinanceProvider.set_downloader()."""
+    if start is not None:
+        return yf.download(symbol, start=start, interval=interval, progress=False, auto_adjust=False)
+    return yf.download(symbol, period=period, interval=interval, progress=False, auto_adjust=False)
+
 class YFinanceProvider:
-    """Провайдер данных для режима симуляции (Yahoo Finance)."""
-    @staticmethod
-    def get_raw_rates(symbol, tf_str, count):
-        # Маппинг ТФ: M15->15m, H1->1h, H4->1h, D1->1d
-        yf_tf = {"M15": "15m", "H1": "1h", "H4": "1h", "D1": "1d"}.get(tf_str, "1h")
+    """
+    Провайдер данных для режима симуляции (Yahoo Finance).
+    Бары кэшируются по (symbol, interval) в памяти и на диске (YF_CACHE_DIR);
+    из сети догружается только хвост, H4 собирается из 1h локально.
+    """
+
+    # Маппинг ТФ: M15->15m, H1->1h, H4->1h (+ресемплинг), D1->1d
+    TF_MAP = {"M15": "15m", "H1": "1h", "H4": "1h", "D1": "1d"}
+    INTERVAL_SEC = {"15m": 900, "1h": 3600, "1d": 86400}
+    RESAMPLE = {"H4": "4h"}
+
+    downloader = staticmethod(_yf_download)
+
+    # { (symbol, interval): {"df": DataFrame, "checked_at": float} }
+    _frames = {}
+    # { (symbol, tf_str): (last_time, len исходного ряда, DataFrame) }
+    _resampled = {}
+
+    @classmethod
+    def set_downloader(cls, fn):
+        """Подмена загрузчика (офлайн-симуляция, проверки). fn(symbol, interval, period=None, start=None)."""
+        cls.downloader = staticmethod(fn)
+        cls._frames.clear()
+        cls._resampled.clear()
+
+    @classmethod
+    def get_raw_rates(cls, symbol, tf_str, count):
+        interval = cls.TF_MAP.get(tf_str, "1h")
         try:
-            data = yf.download(symbol, period="1mo", interval=yf_tf, progress=False)
-            if data.empty: return None
-            df = data.reset_index()
-            df = df.rename(columns={'Open':'open','High':'high','Low':'low','Close':'close','Volume':'tick_volume'})
+            df = cls._get_frame(symbol, interval)
+            if df is None or df.empty: return None
+
+            rule = cls.RESAMPLE.get(tf_str)
+            if rule:
+                df = cls._get_resampled(symbol, tf_str, df, rule)
+
             return df.tail(count).to_dict('records')
         except Exception as e:
             log.error(f"Ошибка YFinance [{symbol}]: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    # --- КЭШ ---
+    @classmethod
+    def _get_frame(cls, symbol, interval):
+        key = (symbol, interval)
+        entry = cls._frames.get(key)
+        if entry is None:
+            entry = {"df": cls._load_disk(symbol, interval), "checked_at": 0.0}
+            cls._frames[key] = entry
+
+        # Повторные тики в пределах YF_REFRESH_SEC — из памяти
+        if time.time() - entry['checked_at'] < YF_REFRESH_SEC:
+            return entry['df']
+
+        df = entry['df']
+        if df is None or df.empty:
+            fresh = cls._download(symbol, interval, period=YF_INITIAL_PERIOD.get(interval, "1mo"))
+        else:
+            # Перезапрашиваем последний (возможно незакрытый) бар и всё, что после него
+            start = pd.to_datetime(int(df['time'].iloc[-1]) - cls.INTERVAL_SEC[interval], unit='s', utc=True)
+            fresh = cls._download(symbol, interval, start=start)
+
+        entry['checked_at'] = time.time()
+        if fresh is None or fresh.empty:
+            return df
+
+        if df is not None and not df.empty:
+            fresh = pd.concat([df, fresh], ignore_index=True).drop_duplicates('time', keep='last')
+        df = fresh.sort_values('time').reset_index(drop=True)
+
+        entry['df'] = df
+        cls._save_disk(symbol, interval, df)
+        return df
+
+    @classmethod
+    def _get_resampled(cls, symbol, tf_str, src, rule):
+        """Локальный ресемплинг (1h -> H4), пересчет только при изменении исходного ряда."""
+        version = (int(src['time'].iloc[-1]), len(src))
+        cached = cls._resampled.get((symbol, tf_str))
+        if cached and cached[:2] == version:
+            return cached[2]
+
+        idx = pd.to_datetime(src['time'], unit='s')
+        df = src.set_index(idx).resample(rule, origin='epoch').agg({
+            'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'tick_volume': 'sum'
+        }).dropna(subset=['open'])
+        df.insert(0, 'time', _to_epoch(df.index))
+        df = df.reset_index(drop=True)
+
+        cls._resampled[(symbol, tf_str)] = (*version, df)
+        return df
+
+    @classmethod
+    def _download(cls, symbol, interval, period=None, start=None):
+        """None при пустом ответе или сбое сети — тогда обслуживается кэш."""
+        try:
+            data = cls.downloader(symbol, interval, period=period, start=start)
+        except Exception as e:
+            log.error(f"Загрузка YFinance [{symbol} {interval}] не удалась, используется кэш: {e}")
+            return None
+        if data is None or data.empty: return None
+        return cls._normalize(data)
+
+    @staticmethod
+    def _normalize(data):
+        """Ответ yf.download -> колонки OHLCV_COLUMNS, time — epoch (сек, UTC)."""
+        if isinstance(data.columns, pd.MultiIndex):
+            # Новые версии yfinance: (Price, Ticker)
+            data = data.droplevel(-1, axis=1)
+        df = data.reset_index()
+        date_col = df.columns[0]
+        ts = pd.to_datetime(df[date_col])
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert('UTC').dt.tz_localize(None)
+        df = df.rename(columns={'Open':'open','High':'high','Low':'low','Close':'close','Volume':'tick_volume'})
+        df['time'] = _to_epoch(ts)
+        return df[OHLCV_COLUMNS].dropna(subset=['close'])
+
+    # --- ДИСК ---
+    @staticmethod
+    def _cache_path(symbol, interval):
+        return os.path.join(YF_CACHE_DIR, f"{symbol.replace('=', '_').replace('/', '_')}_{interval}.pkl")
+
+    @classmethod
+    def _load_disk(cls, symbol, interval):
+        path = cls._cache_path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            log.error(f"Кэш YFinance [{symbol} {interval}] поврежден, будет загружен заново: {e}")
+            return None
+
+    @classmethod
+    def _save_disk(cls, symbol, interval, df):
+        """Атомарная запись: временный файл + os.replace."""
+        try:
+            os.makedirs(YF_CACHE_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=YF_CACHE_DIR, suffix=".tmp")
+            os.close(fd)
+            df.to_pickle(tmp)
+            os.replace(tmp, cls._cache_path(symbol, interval))
+        except Exception as e:
+            log.error(f"Не удалось сохранить кэш YFinance [{symbol} {interval}]: {e}")
@@ -2,8 +2,9 @@
 import streamlit as st
 import plotly.graph_objects as go
 import pandas as pd
-from data_sys.stat import StatManager
+from data_sys.chartdata import ChartDataService
 from root import config as cfg
+from hmi_pages.hmi_utils import read_core_states
 
 def render_charts_page():
     """
@@ -13,7 +14,7 @@ def render_charts_page():
     st.header("📈 Анализ кривых доходности и стратегий")
     
     symbol_tf_list = cfg.ACTIVE_AGENTS_IDS
-    stat_mgr = StatManager()
+    chart_data = ChartDataService()
     
     # Инициализация настроек визуализации в session_state, если их нет
     if 'chart_settings' not in st.session_state:
@@ -49,10 +50,11 @@ def render_charts_page():
     # Выбор периода данных для анализа
     time_range = st.select_slider(
         "Глубина анализа сделок", 
-        options=["Неделя", "Месяц", "Квартал", "Год"], 
+        options=list(cfg.CHART_TIME_RANGES), 
         value="Месяц"
     )
-    days_map = {"Неделя": 7, "Месяц": 30, "Квартал": 90, "Год": 365}
+    # Кривые уже прорежены до cfg.CHART_POINT_BUDGET точек и закэшированы до новых сделок
+    curves = chart_data.get_equity_curves(cfg.CHART_TIME_RANGES[time_range])
 
     fig = go.Figure()
     
@@ -60,14 +62,9 @@ def render_charts_page():
     for aid in symbol_tf_list:
         # Проверяем, включен ли график пользователем
         if st.session_state.chart_settings['visibility'].get(aid):
-            # Получаем историю торгов через StatManager
-            df, _ = stat_mgr.get_trades_history(symbol=aid, days=days_map[time_range])
+            df = curves.get(aid)
             
             if df is not None and not df.empty:
-                df = df.sort_index()
-                # Рассчитываем кумулятивную прибыль
-                df['cum_profit'] = df['profit'].cumsum()
-                
                 fig.add_trace(go.Scatter(
                     x=df.index, 
                     y=df['cum_profit'],
@@ -105,3 +102,32 @@ def render_charts_page():
         st.warning(f"Нет данных для отображения за период: {time_range}")
     
     st.info("💡 Используйте Range Slider внизу для детального изучения просадок.")
+
+    render_live_mse_chart(symbol_tf_list)
+
+def render_live_mse_chart(symbol_tf_list):
+    """Живая история MSE агентов из шины ядра (без диска и запросов к MT5)."""
+    states, _ = read_core_states()
+    if not states:
+        return
+
+    st.subheader("🧠 История ошибки прогноза (MSE)")
+    fig = go.Figure()
+    for aid in symbol_tf_list:
+        history = states.get(aid, {}).get("mse_history")
+        if history and st.session_state.chart_settings['visibility'].get(aid):
+            fig.add_trace(go.Scatter(
+                y=history, name=aid, mode='lines',
+                line=dict(color=st.session_state.chart_settings['colors'].get(aid), width=1.5),
+            ))
+
+    if len(fig.data) > 0:
+        fig.update_layout(
+            xaxis=dict(title="Бар (последние)", gridcolor="#333"),
+            yaxis=dict(title="MSE", gridcolor="#333"),
+            template="plotly_dark",
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            margin=dict(l=0, r=0, t=30, b=0)
+        )
+        st.plotly_chart(fig, use_container_width=True)
@@ -5,6 +5,7 @@ import tempfile
 from pathlib import Path
 from config import HMI_COMMANDS_PATH, BOT_STATES_PATH, IS_SIMULATION
 from system_base.logger import get_logger
+from hmi_pages.hmi_utils import read_core_states
 
 log = get_logger("DatabaseManager")
 
@@ -58,12 +59,8 @@ def _send_cmd(aid, action, value=True):
 def render_main_page():
     st.title(f"🚀 Monitor: {st.session_state.get('trading_mode', 'Active')}")
 
-    bot_states = {}
-    if os.path.exists(BOT_STATES_PATH):
-        try:
-            with open(BOT_STATES_PATH, "r") as f:
-                bot_states = json.load(f)
-        except: pass
+    # Шина состояний ядра (shared memory); bot_states.json — только если ядро не запущено
+    bot_states, _ = read_core_states(BOT_STATES_PATH)
 
     if st.button("▶️ START ALL (EDU -> TEST -> TRADE)", use_container_width=True, type="primary"):
         _send_cmd(None, "START_AUTO_ALL")
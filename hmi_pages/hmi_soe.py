@@ -3,7 +3,7 @@ import sqlite3
 import pandas as pd
 import os
 # Импортируем только то, что нужно для определения путей динамически
-from config import DB_DIR, IS_SIMULATION
+from config import DB_DIR, IS_SIMULATION, SOE_PAGE_SIZE
 # Импортируем путь к системной БД, который мы определили в логгере
 from system_base.logger import SYSTEM_DB_PATH 
 
@@ -12,6 +12,15 @@ def get_trading_db_path():
     db_name = "simulation_main.db" if IS_SIMULATION else "forex_main.db"
     return os.path.join(DB_DIR, db_name)
 
+def has_fts(conn, table_name):
+    """Есть ли теневая FTS5-таблица журнала (создается SQLiteHandler)."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                        (f"{table_name}_fts",)).fetchone() is not None
+
+def fts_phrase(text):
+    """Пользовательский ввод -> безопасная FTS5-фраза с префиксным совпадением последнего слова."""
+    return '"' + text.replace('"', '""') + '"*'
+
 def render_soe_page(symbol_tf_list):
     st.header("📜 Sequence of Events (SOE) Viewer")
     
@@ -48,7 +57,7 @@ def render_log_table(db_path, symbol_list, log_type):
     
     # 2. Панель фильтров
     with st.expander(f"🔍 Фильтры ({'Торговля' if log_type == 'trading' else 'Система'})", expanded=True):
-        f_col1, f_col2, f_col3 = st.columns([1, 1, 2])
+        f_col1, f_col2, f_col3, f_col4 = st.columns([1, 1, 1, 2])
         
         mod_filter = f_col1.multiselect(f"Модуль (Source) [{log_type}]:", 
             ["Trader", "Brain", "Orchestrator", "PositionManager", "Main", "SettingsManager"], 
@@ -57,11 +66,23 @@ def render_log_table(db_path, symbol_list, log_type):
         # Для системных логов фильтр агентов упрощен до SYSTEM
         current_symbols = symbol_list + ["SYSTEM"] if log_type == 'trading' else ["SYSTEM"]
         sym_filter = f_col2.multiselect("Агент (ID):", current_symbols, default=[])
+
+        level_filter = f_col3.multiselect("Уровень:", ["INFO", "WARNING", "ERROR", "CRITICAL"],
+                                          default=[], key=f"level_{log_type}")
         
-        search_query = f_col3.text_input("Поиск в логах:", placeholder="Например: 'ордер' или 'error'...", key=f"search_{log_type}")
+        search_query = f_col4.text_input("Поиск в логах:", placeholder="Например: 'ордер' или 'error'...", key=f"search_{log_type}")
+
+    # Keyset-пагинация: стек курсоров (timestamp, rowid) начала каждой открытой страницы.
+    # Сбрасывается при смене фильтров.
+    cursor_key = f"soe_cursors_{log_type}"
+    filters_sig = (tuple(mod_filter), tuple(sym_filter), tuple(level_filter), search_query)
+    if st.session_state.get(f"soe_filters_{log_type}") != filters_sig:
+        st.session_state[f"soe_filters_{log_type}"] = filters_sig
+        st.session_state[cursor_key] = [None]
+    cursors = st.session_state[cursor_key]
 
     # 3. Формирование SQL запроса
-    query = f"SELECT timestamp, name as Module, level, symbol, message FROM {table_name} WHERE 1=1"
+    query = f"SELECT rowid AS rid, timestamp, name as Module, level, symbol, message FROM {table_name} WHERE 1=1"
     params = []
 
     if mod_filter:
@@ -71,20 +92,37 @@ def render_log_table(db_path, symbol_list, log_type):
     if sym_filter:
         query += f" AND symbol IN ({','.join(['?']*len(sym_filter))})"
         params.extend(sym_filter)
-        
-    if search_query:
-        query += " AND (message LIKE ? OR level LIKE ?)"
-        params.append(f"%{search_query}%")
-        params.append(f"%{search_query}%")
 
-    query += " ORDER BY timestamp DESC LIMIT 1000"
+    if level_filter:
+        query += f" AND level IN ({','.join(['?']*len(level_filter))})"
+        params.extend(level_filter)
 
     # 4. Чтение данных
     try:
         conn = sqlite3.connect(db_path, timeout=10)
+
+        if search_query:
+            if has_fts(conn, table_name):
+                query += f" AND rowid IN (SELECT rowid FROM {table_name}_fts WHERE {table_name}_fts MATCH ?)"
+                params.append(fts_phrase(search_query))
+            else:
+                query += " AND message LIKE ?"
+                params.append(f"%{search_query}%")
+
+        if cursors[-1] is not None:
+            query += " AND (timestamp, rowid) < (?, ?)"
+            params.extend(cursors[-1])
+
+        # Одна лишняя строка — признак наличия следующей страницы
+        query += " ORDER BY timestamp DESC, rowid DESC LIMIT ?"
+        params.append(SOE_PAGE_SIZE + 1)
+
         df_logs = pd.read_sql(query, conn, params=params)
         conn.close()
 
+        has_next = len(df_logs) > SOE_PAGE_SIZE
+        df_logs = df_logs.head(SOE_PAGE_SIZE)
+
         if not df_logs.empty:
             def style_log_rows(row):
                 style = [''] * len(row)
@@ -95,7 +133,7 @@ def render_log_table(db_path, symbol_list, log_type):
                 return style
 
             st.dataframe(
-                df_logs.style.apply(style_log_rows, axis=1), 
+                df_logs.drop(columns=['rid']).style.apply(style_log_rows, axis=1), 
                 use_container_width=True,
                 height=500, # Уменьшил высоту, чтобы лучше вписывалось во вкладки
                 column_config={
@@ -103,6 +141,16 @@ def render_log_table(db_path, symbol_list, log_type):
                     "message": st.column_config.TextColumn("Событие", width="large")
                 }
             )
+
+            p_col1, p_col2, p_col3 = st.columns([1, 2, 1])
+            if p_col1.button("⬅️ Новее", key=f"soe_prev_{log_type}", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+            p_col2.caption(f"Страница {len(cursors)} · по {SOE_PAGE_SIZE} событий")
+            if p_col3.button("Старее ➡️", key=f"soe_next_{log_type}", disabled=not has_next):
+                last = df_logs.iloc[-1]
+                cursors.append((last['timestamp'], int(last['rid'])))
+                st.rerun()
         else:
             st.info("События не найдены. Проверьте фильтры или активность системы.")
 
@@ -122,6 +170,7 @@ def render_log_table(db_path, symbol_list, log_type):
                     conn.execute(f"DELETE FROM {table_name}")
                 st.success("Журнал очищен.")
                 st.session_state[confirm_key] = False
+                st.session_state[cursor_key] = [None]
                 st.rerun()
             except Exception as e:
                 st.error(f"Не удалось очистить лог: {e}")
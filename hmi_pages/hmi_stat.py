@@ -1,8 +1,8 @@
 # hmi_pages/hmi_stat.py
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from data_sys.stat import StatManager
+from hmi_pages.hmi_utils import read_core_states
 
 def render_stat_page(symbol_tf_list):
     """
@@ -18,6 +18,13 @@ def render_stat_page(symbol_tf_list):
     # 2. Инициализация только если есть данные
     stat_mgr = StatManager()
 
+    # Живой счет из шины ядра (без запроса к терминалу)
+    _, account = read_core_states()
+    if account and account.get("equity"):
+        e1, e2 = st.columns(2)
+        e1.metric("Equity (live)", f"${account['equity']:.2f}")
+        e2.metric("Balance", f"${account['balance']:.2f}")
+
     tab_stats, tab_history = st.tabs(["📈 Метрики и Диаграммы", "📑 Реестр сделок"])
 
     with tab_stats:
@@ -27,23 +34,19 @@ def render_stat_page(symbol_tf_list):
             default=symbol_tf_list
         )
         
-        all_trades = []
+        # Один проход по локальному кэшу сделок вместо запроса к MT5 на каждого агента
+        df_all, _ = stat_mgr.get_trades_history(days=90)
+        agents_metrics = stat_mgr.get_agents_metrics(selected_ids, days=90)
+
         summary_metrics = {"profit": 0, "trades": 0}
+        if not agents_metrics.empty:
+            summary_metrics["profit"] = agents_metrics["total_profit_usd"].sum()
+            summary_metrics["trades"] = int(agents_metrics["total_trades"].sum())
 
-        for aid in selected_ids:
-            # ВАЖНО: Передаем полный ID (aid) в stat_mgr.get_trades_history
-            # В stat.py должна быть реализована фильтрация по этому aid
-            df, metrics = stat_mgr.get_trades_history(symbol=aid, days=90)
-            
-            if not df.empty:
-                df['agent_id'] = aid
-                df['weekday'] = df.index.day_name()
-                all_trades.append(df)
-                summary_metrics["profit"] += metrics.get("total_profit_usd", 0)
-                summary_metrics["trades"] += metrics.get("total_trades", 0)
+        combined_df = df_all[df_all['agent_id'].isin(selected_ids)].copy() if not df_all.empty else df_all
 
-        if all_trades:
-            combined_df = pd.concat(all_trades)
+        if not combined_df.empty:
+            combined_df['weekday'] = combined_df.index.day_name()
 
             # 1. Верхние карточки (KPI)
             c1, c2, c3, c4 = st.columns(4)
@@ -3,6 +3,7 @@
 import streamlit as st
 import json
 import os
+from system_base.state_bus import StateBus
 
 # Путь к конфигу будет импортирован в hmi.py
 # from root import config as cfg 
@@ -22,6 +23,26 @@ def save_app_settings(settings, config_path):
     with open(config_path, "w", encoding="utf-8") as f:
         json.dump(settings, f, indent=4)
 
+def read_core_states(fallback_path=None):
+    """
+    Состояния агентов из шины ядра (shared memory, без диска и брокера).
+    Если ядро не запущено или шина не обновлялась дольше STATE_BUS_STALE_SEC — резервный снимок bot_states.json.
+    Возвращает (states, account); account = None при чтении с диска.
+    """
+    bus = StateBus.reader()
+    if bus is not None:
+        states, account = bus.read()
+        if states is not None:
+            return states, account
+
+    if fallback_path and os.path.exists(fallback_path):
+        try:
+            with open(fallback_path, "r") as f:
+                return json.load(f), None
+        except Exception:
+            pass
+    return {}, None
+
 @st.dialog("Настройка запуска системы 2026")
 def startup_dialog(config_path):
     st.write("Приветствуем! Выберите режим работы для текущей сессии:")
@@ -1,8 +1,9 @@
 # hmi_pages/settings_methods/get_available_assets.py
 
-import os, json, MetaTrader5 as mt5
+import os, json
 from datetime import datetime, timedelta
 from root import config as cfg
+from system_base.broker_gateway import BrokerGateway
 
 SYMBOLS_DIR_PATH = os.path.join(cfg.DB_DIR, "symbols_directory.json")
 
@@ -25,11 +26,12 @@ def get_available_assets():
             if datetime.now() - last_dt < timedelta(days=7): return data
         except: pass
 
-    if mt5.initialize():
-        syms = sorted([s.name for s in mt5.symbols_get() if s.visible])
+    broker = BrokerGateway.instance()
+    if broker.start():
+        syms = sorted([s.name for s in broker.symbols_get() or [] if s.visible])
         data["mt5"]["symbols"] = syms
         data["last_update"] = datetime.now().strftime("%Y-%m-%d")
         with open(SYMBOLS_DIR_PATH, "w") as f: 
             json.dump(data, f, indent=4)
-        mt5.shutdown()
+        broker.stop()
     return data
@@ -47,7 +47,8 @@ def lstm_settings_dialog():
         defaults = {
             'window_size': 60, 'epochs': 50, 'batch_size': 32, 
             'learning_rate': 0.001, 'optimizer': 'Adam', 
-            'lstm_units': 100, 'dropout_rate': 0.2, 'error_multiplier': 1.5
+            'lstm_units': 100, 'dropout_rate': 0.2, 'error_multiplier': 1.5,
+            'inference_mode': 'window', 'stream_resync': 60, 'backend': 'keras', 'architecture': 'lstm2'
         }
         db.save_model_settings(id_jr, defaults)
         db.save_model_settings(id_sr, defaults)
@@ -94,13 +95,36 @@ def render_model_settings_form(symbol_tf, key_suffix):
     opt = st.selectbox("Optimizer", opts, index=opt_idx, key=f"opt_{key_suffix}")
     
     st.markdown("---")
+    archs = ["lstm2", "lstm1", "gru", "conv1d", "tcn"]
+    saved_arch = str(cfg.get('architecture', 'lstm2'))
+    arch = st.selectbox("Архитектура", archs, index=archs.index(saved_arch) if saved_arch in archs else 0,
+                        help="lstm2 — стек LSTM (исходная), lstm1 / gru — один рекуррентный слой, "
+                             "conv1d / tcn — причинные свертки. Units задают ширину (фильтры = Units/2)",
+                        key=f"arch_{key_suffix}")
     col3, col4 = st.columns(2)
     units = col3.number_input("LSTM Units", 16, 256, get_i('lstm_units', 100), step=16, key=f"ut_{key_suffix}")
     drop = col4.number_input("Dropout", 0.0, 0.5, get_f('dropout_rate', 0.2), step=0.05, key=f"dr_{key_suffix}")
+
+    col5, col6 = st.columns(2)
+    modes = ["window", "stream"]
+    saved_mode = str(cfg.get('inference_mode', 'window'))
+    inf_mode = col5.selectbox("Инференс", modes, index=modes.index(saved_mode) if saved_mode in modes else 0,
+                              help="stream — один шаг LSTM на бар (скрытое состояние между барами)",
+                              key=f"inf_{key_suffix}")
+    resync = col6.number_input("Ресинк окна (бары)", 1, 1000, get_i('stream_resync', 60), key=f"rs_{key_suffix}")
+
+    backends = ["keras", "onnx"]
+    saved_backend = str(cfg.get('backend', 'keras'))
+    backend = st.selectbox("Движок инференса", backends,
+                           index=backends.index(saved_backend) if saved_backend in backends else 0,
+                           help="onnx — прогноз через onnxruntime (экспорт после обучения, сверка с Keras)",
+                           key=f"be_{key_suffix}")
     
     # Возвращаем подготовленный словарь
     return {
         'window_size': win_size, 'epochs': epochs, 'batch_size': batch,
         'learning_rate': lr, 'optimizer': opt, 'lstm_units': units,
-        'dropout_rate': drop, 'error_multiplier': get_f('error_multiplier', 1.5)
+        'dropout_rate': drop, 'error_multiplier': get_f('error_multiplier', 1.5),
+        'inference_mode': inf_mode, 'stream_resync': resync, 'backend': backend,
+        'architecture': arch
     }
\ No newline at end of file
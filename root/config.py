@@ -73,10 +73,10 @@ MAGIC_NUMBER = 202601
 SYMBOLS_LIST = ["EURUSD", "GBPUSD", "USDJPY", "AUDUSD", "USDCAD", "USDCHF", "NZDUSD"]
 
 TF_SETTINGS = {
-    mt5.TIMEFRAME_M15: {'rsi': 7,  'atr': 14, 'suffix': 'M15'},
-    mt5.TIMEFRAME_H1:  {'rsi': 7,  'atr': 14, 'suffix': 'H1'},
-    mt5.TIMEFRAME_H4:  {'rsi': 14, 'atr': 14, 'suffix': 'H4'},
-    mt5.TIMEFRAME_D1:  {'rsi': 14, 'atr': 14, 'suffix': 'D1'}
+    mt5.TIMEFRAME_M15: {'rsi': 7,  'atr': 14, 'suffix': 'M15', 'seconds': 900},
+    mt5.TIMEFRAME_H1:  {'rsi': 7,  'atr': 14, 'suffix': 'H1',  'seconds': 3600},
+    mt5.TIMEFRAME_H4:  {'rsi': 14, 'atr': 14, 'suffix': 'H4',  'seconds': 14400},
+    mt5.TIMEFRAME_D1:  {'rsi': 14, 'atr': 14, 'suffix': 'D1',  'seconds': 86400}
 }
 
 ACTIVE_TIMEFRAMES = [mt5.TIMEFRAME_H1, mt5.TIMEFRAME_D1]
@@ -86,6 +86,12 @@ ACTIVE_AGENTS_IDS = [f"{s}_{TF_SETTINGS[t]['suffix']}" for s in SYMBOLS_LIST for
 MIN_PROFIT_PTS = 200    
 COMMISSION_PTS = 50     
 BE_THRESHOLD = 0.5  
+TRAIL_ATR_MULT = 1.5    # Трейлинг: SL на 1.5 ATR от цены, когда прибыль >= 1.5 ATR
+SL_MIN_STEP_PTS = 10    # Модификация SL отправляется, только если он сдвигается минимум на N пунктов
+JR_NEUTRAL_ATR_RATIO = 0.1  # |прогноз JR - цена| меньше доли ATR -> нейтрально, SR не считается
+RR_MIN = 3.0            # Вход: прибыль >= RR_MIN * (риск + спред + комиссия)
+VOLATILITY_ATR_RATIO = 0.5  # Вход: диапазон прогноза (High - Low) не уже доли ATR
+MAX_CURRENCY_EXPOSURE = 3   # Портфель: |чистая позиция| по одной валюте, в сделках
 
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 def get_agent_id(symbol, tf_constant):
@@ -98,6 +104,115 @@ def get_model_path(agent_id):
 def get_scaler_path(agent_id):
     return os.path.join(MODELS_DIR, f"scaler_{agent_id}.pkl")
 
+# --- КЭШ БАРОВ YFINANCE (режим симуляции) ---
+YF_CACHE_DIR = os.path.join(DB_DIR, "yf_cache")
+YF_REFRESH_SEC = 60  # Повторные тики в пределах интервала обслуживаются из памяти
+YF_INITIAL_PERIOD = {"15m": "1mo", "1h": "3mo", "1d": "2y"}  # Первичная загрузка (лимиты Yahoo: 15m <= 60d)
+
+# --- ШЛЮЗ ПРОВАЙДЕРОВ (схлопывание повторных запросов) ---
+GATEWAY_FRESHNESS_SEC = 0.5     # Окно свежести баров и котировок (меньше такта main loop)
+GATEWAY_SYMBOL_INFO_TTL = 60    # Спецификация символа (digits, point) меняется редко
+
+# --- ЧАСЫ БАРОВ (планировщик main loop) ---
+BAR_CLOSE_GRACE_SEC = 2          # Запас после закрытия бара, пока брокер публикует новый бар
+BAR_RETRY_SEC = 2                # Повтор, если новый бар еще не появился
+BAR_MAX_RETRIES = 15             # После этого агент ждет следующего закрытия
+BAR_CLOCK_UTC_OFFSET_SEC = 0     # Смещение серверного времени брокера от UTC (выравнивание H4/D1)
+MARKET_CLOSE_UTC = (4, 22)       # Пятница 22:00 UTC — закрытие недели FX (weekday, hour)
+MARKET_OPEN_UTC = (6, 22)        # Воскресенье 22:00 UTC — открытие
+ALWAYS_OPEN_SYMBOLS = ["BTCUSD", "ETHUSD", "BTC-USD", "ETH-USD"]  # Торгуются 24/7
+POSITION_TICK_SEC = 1.0          # Быстрый путь PositionManager (REAL)
+MAIN_LOOP_MAX_SLEEP_SEC = 1.0    # Потолок сна: команды HMI и шина состояний остаются отзывчивыми
+
+# --- КОНТРОЛЬ ОШИБКИ ПРОГНОЗА (ErrorController / DriftEngine) ---
+WARN_THRESHOLD = 1.2        # MSE > среднее окна * 1.2 -> предупреждение (ADAPTATION после 3-х)
+ERR_THRESHOLD = 1.8         # MSE > среднее окна * 1.8 и разладка подтверждена -> EDUCATION
+DRIFT_WINDOW = 50           # Окно ошибок на агента (кольцевой буфер)
+DRIFT_CUSUM_K = 0.5         # CUSUM: допуск (в единицах z)
+DRIFT_CUSUM_H = 5.0         # CUSUM: порог тревоги
+DRIFT_PH_DELTA = 0.1        # Page-Hinkley: допуск
+DRIFT_PH_LAMBDA = 8.0       # Page-Hinkley: порог тревоги
+DRIFT_MIN_REL_STD = 0.1     # Нижняя граница масштаба z: доля среднего (окно без разброса)
+
+# --- ПЛАНИРОВЩИК ОБУЧЕНИЯ (JobScheduler) ---
+JOB_MAX_EDUCATIONS = 3              # Циклов EDUCATION на задание (защита от зацикливания)
+JOB_MAX_FITS = 3                    # Адаптаций (FIT) после каждого EDUCATION
+JOB_MAX_CPU_SEC = 3600              # CPU-бюджет одного задания
+JOB_BUDGET_WINDOW_SEC = 3600        # Скользящее окно учета CPU
+JOB_GLOBAL_CPU_PER_WINDOW_SEC = 2400  # Все задания за окно
+JOB_AGENT_CPU_PER_WINDOW_SEC = 900    # Один агент за окно (не вытесняет остальных)
+JOB_STEPS_PER_LOOP = 1              # Этапов за итерацию main loop
+HOT_SWAP_ENABLED = True             # EDUCATION рабочей модели — на теневой копии в фоне
+HOT_SWAP_MAX_PARALLEL = 1           # Одновременных фоновых обучений
+HOT_SWAP_MSE_TOLERANCE = 0.0        # Теневая модель ставится, если ее MSE не хуже живой более чем на долю (тот же тест)
+
+# --- РЕЗИДЕНТНОСТЬ МОДЕЛЕЙ В ПАМЯТИ (ModelResidency) ---
+RESIDENCY_BUDGET_MB = 1024          # Бюджет памяти под модели всех агентов
+RESIDENCY_MODEL_OVERHEAD_MB = 8     # Накладные расходы Keras на одну модель (граф, оптимизатор)
+RESIDENCY_PREFETCH_SEC = 30         # Загрузка модели заранее, если бар закроется в пределах N секунд
+RESIDENCY_CACHE_DIR = os.path.join(MODELS_DIR, "resident")  # Веса вытесненных моделей (.npz)
+RESIDENCY_RARE_BAR_SEC = 86400      # Модели ТФ с баром от N секунд (D1) вытесняются раньше остальных
+
+# --- КЭШ ПРОГНОЗОВ (Brain.predict) ---
+PREDICTION_CACHE_SIZE = 512  # Записей LRU на процесс (несколько баров на каждого агента)
+
+# --- ONNX RUNTIME (model_settings.backend = 'onnx') ---
+ONNX_OPSET = 13                 # Opset экспорта tf2onnx (LSTM поддерживается с 7, 13 — стабильный)
+ONNX_INTRA_OP_THREADS = 1       # Потоков на сессию: агентов много, окно маленькое
+ONNX_PARITY_TOL = 1e-4          # Допуск расхождения ONNX / Keras (нормализованные цены)
+
+# --- ДИСТИЛЛЯЦИЯ (малый ученик для инференса, Distiller) ---
+DISTILL_ENABLED = False         # Ученик после каждого EDUCATION (+ второе обучение и замер задержки)
+DISTILL_STUDENT_ARCH = 'gru'    # Архитектура ученика (ModelBuilder.ARCHITECTURES)
+DISTILL_STUDENT_UNITS = 16      # Ширина ученика (lstm_units)
+DISTILL_EPOCHS = 10             # Эпох обучения ученика (SIM — 1)
+DISTILL_ALPHA = 0.7             # Доля прогноза учителя в цели ученика (остальное — факт)
+DISTILL_MSE_TOLERANCE = 0.10    # Ученик принимается, если MSE хуже учителя не более чем на 10%
+DISTILL_LATENCY_BATCH = 1024    # Окон в замере стоимости прогноза (ускорение ученика)
+
+# --- ПОДВЫБОРКА ОБУЧЕНИЯ (RecencySampler) ---
+SAMPLER_ENABLED = True              # Education: фиксированный бюджет окон на эпоху вместо всей истории
+SAMPLER_SAMPLES_PER_EPOCH = 20000   # Окон на эпоху
+SAMPLER_HALF_LIFE_BARS = 20000      # Вес окна падает вдвое каждые N баров давности
+SAMPLER_ATR_STRATA = 4              # Режимов волатильности (квантили ATR) с равной квотой
+
+# --- РАНТАЙМ TENSORFLOW (TrainingRuntime) ---
+# Раскладку для своего числа ядер подбирать бенчмарком: python -m ai_brain.benchmark --training
+TRAIN_JIT_COMPILE = False       # XLA-компиляция шага обучения (model.compile(jit_compile=...))
+TRAIN_INTRA_OP_THREADS = 0      # Потоков внутри операции (0 — по числу ядер процесса)
+TRAIN_INTER_OP_THREADS = 0      # Параллельных операций (0 — выбор TensorFlow)
+TRAIN_CPU_AFFINITY = None       # Ядра процесса обучения, например [0, 1, 2, 3]; None — без привязки
+TRAIN_ONEDNN = True             # Оптимизации oneDNN (TF_ENABLE_ONEDNN_OPTS)
+
+# --- ШЛЮЗ БРОКЕРА (единый поток сессии MT5) ---
+BROKER_MAX_RPS = 50              # Лимит запросов к терминалу в секунду (token bucket)
+BROKER_CALL_TIMEOUT_SEC = 10     # Ожидание ответа на запрос из очереди
+
+# --- ЭКСТРЕННОЕ ЗАКРЫТИЕ (ShutdownManager.flatten) ---
+FLATTEN_WORKERS = 8              # Параллельных закрытий
+FLATTEN_DEADLINE_SEC = 15        # Общий дедлайн на закрытие всех позиций
+FLATTEN_MAX_RETRIES = 5          # Повторов на реквотах для одной позиции
+FLATTEN_RETRY_DELAY_SEC = 0.2
+FLATTEN_DEVIATION_PTS = 20       # Допустимое проскальзывание при закрытии
+
+# --- СТАТИСТИКА СДЕЛОК (локальный кэш deals_cache) ---
+STAT_SYNC_SEC = 10       # Не чаще одного запроса history_deals_get за интервал
+STAT_HISTORY_DAYS = 365  # Глубина первичной загрузки кэша
+
+# --- ГРАФИКИ ДОХОДНОСТИ (hmi_charts) ---
+CHART_TIME_RANGES = {"Неделя": 7, "Месяц": 30, "Квартал": 90, "Год": 365}
+CHART_POINT_BUDGET = 1000  # Максимум точек на кривую агента (прореживание LTTB)
+
+# --- ШИНА СОСТОЯНИЙ ЯДРО -> HMI (shared memory) ---
+STATE_BUS_NAME = "fxlstm_state_bus"
+STATE_BUS_MAX_AGENTS = 64       # Фиксированная раскладка сегмента
+STATE_BUS_MSE_DEPTH = 50        # Глубина истории MSE (= окну ErrorController)
+STATE_BUS_STALE_SEC = 15        # Шина без публикаций дольше N секунд — HMI читает bot_states.json
+BOT_STATES_FLUSH_SEC = 30       # Резервный снимок bot_states.json на диск
+
 # --- ЛОГИРОВАНИЕ ---
 LOG_FILE = os.path.join(SYS_BASE_DIR, 'trading_bot_2026.log')
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_RETENTION_DAYS = 30           # События старше удаляются автоматически (SQLite-журналы SOE)
+LOG_RETENTION_CHECK_EVERY = 1000  # Проверка ретенции раз в N записей обработчика
+SOE_PAGE_SIZE = 200               # Строк на страницу в SOE Viewer
@@ -5,7 +5,6 @@ import time
 import json
 import subprocess
 import importlib
-import MetaTrader5 as mt5
 
 
 # --- 1. КОРРЕКТИРОВКА ПУТЕЙ ---
@@ -21,9 +20,24 @@ if CURRENT_DIR not in sys.path:
 
 import config as cfg
 from system_base.logger import get_logger
+from ai_brain.runtime import TrainingRuntime
+
+# Потоки / ядра / oneDNN задаются до первой операции TensorFlow (импорт агентов ниже)
+TrainingRuntime.configure_process()
 from system_base.shutdown_manager import ShutdownManager
+from system_base.state_bus import StateBus
+from system_base.bar_clock import BarClock, TF_SECONDS
+from system_base.broker_gateway import BrokerGateway
+from system_base.job_scheduler import JobScheduler
+from system_base.control import ErrorController
 from agents.tradingbot import TradingBot
 from agents.positionmanager import PositionManager
+from agents.riskmanager import PortfolioRiskManager
+from data_sys.databasemanager import DatabaseManager
+from data_sys.provider_gateway import ProviderGateway
+from ai_brain.prediction_cache import PredictionCache
+from ai_brain.residency import ModelResidency
+from ai_brain.bundle import bundle_path
 
 log = get_logger("SYS_MAIN",  db_type='system')
 
@@ -61,18 +75,38 @@ def update_system_status():
         except Exception as e:
             log.debug(f"Ошибка чтения app_config: {e}")
 
+def prepare_training_datasets(agent_ids):
+    """
+    Параллельный препроцессинг для агентов без весов: актуализация БД,
+    затем MPIRE-воркеры готовят выборки в shared memory для Education.
+    """
+    need_training = [aid for aid in agent_ids
+                     if not os.path.exists(bundle_path(aid)) and not os.path.exists(cfg.get_model_path(aid))]
+    if not need_training:
+        return {}
+
+    db = DatabaseManager()
+    for aid in need_training:
+        symbol, tf = aid.split('_')
+        db.update_database(symbol, tf)
+
+    limit = 2000 if current_mode_is_sim else 100000 # Идентично лимитам Education
+    return db.load_training_data_parallel(need_training, limit=limit)
+
 def initialize_mt5_and_bots(active_bots):
     """Инициализация терминала (если нужно) и создание торговых агентов."""
     global mt5_initialized, bots_initialized
 
     # Инициализация MT5 только если выбран режим REAL
     if not current_mode_is_sim:
-        if not mt5.initialize():
+        if not BrokerGateway.instance().start():
             log.warning("MetaTrader 5 не обнаружен. Ожидание запуска терминала...")
             return False
         mt5_initialized = True
 
     log.info(f"Инициализация агентов. Режим: {'SIMULATION' if current_mode_is_sim else 'REAL'}")
+
+    datasets = prepare_training_datasets(cfg.ACTIVE_AGENTS_IDS)
     
     for aid in cfg.ACTIVE_AGENTS_IDS:
         try:
@@ -80,10 +114,13 @@ def initialize_mt5_and_bots(active_bots):
             # Передаем режим в зависимости от выбора пользователя
             mode_str = 'simulation' if current_mode_is_sim else 'trade'
             bot = TradingBot(symbol, tf, mode=mode_str)
-            bot.initialize_bot() 
+            bot.initialize_bot(dataset=datasets.get(aid)) 
             active_bots.append(bot)
         except Exception as e:
             log.error(f"Ошибка инициализации бота {aid}: {e}")
+        finally:
+            if aid in datasets:
+                datasets.pop(aid).release()
     
     bots_initialized = True
     return True
@@ -98,6 +135,11 @@ def main():
     
     active_bots = []
     pos_manager = PositionManager()
+    portfolio = PortfolioRiskManager()
+    state_bus = StateBus.create()
+    last_states_flush = 0.0
+    bar_clock = BarClock()
+    last_position_tick = 0.0
 
     try:
         while True:
@@ -114,6 +156,8 @@ def main():
                 if not initialize_mt5_and_bots(active_bots):
                     time.sleep(1)
                     continue
+                for bot in active_bots:
+                    bot.orch.portfolio = portfolio
 
             # 4. Обработка команд из очереди HMI (например, кнопка Stop или Смена режима)
             if os.path.exists(cfg.HMI_COMMANDS_PATH):
@@ -122,22 +166,66 @@ def main():
                 os.remove(cfg.HMI_COMMANDS_PATH)
 
             # 5. ОСНОВНОЙ РАБОЧИЙ ТИК
-            for bot in active_bots:
+            # Будим только агентов, у которых закрылся бар (BarClock), остальные не трогают брокера
+            now = time.time()
+            due = bar_clock.due(active_bots, now)
+            # Ошибки прогноза всех агентов бара — одним векторным шагом DriftEngine
+            ErrorController.update_batch([obs for bot in due if (obs := bot.observe_bar()) is not None])
+            for bot in due:
+                prev_time = bot.last_time
                 bot.tick()
+                bar_clock.mark_ticked(bot, advanced=bot.manual_stop or bot.last_time != prev_time)
+            # Входы всех агентов, закрывших бар, — одной портфельной оценкой
+            portfolio.flush()
+
+            # Обучение / тесты / адаптация — по одному этапу за итерацию в пределах CPU-бюджетов
+            JobScheduler.instance().run_pending(max_steps=cfg.JOB_STEPS_PER_LOOP)
+
+            # Модели в пределах бюджета памяти: загрузить тех, чей бар скоро, вытеснить давно не нужных
+            # (оба ТФ агента; агенты на паузе — первые кандидаты на вытеснение)
+            upcoming = [brain for b in bar_clock.upcoming(active_bots, cfg.RESIDENCY_PREFETCH_SEC) if not b.manual_stop
+                        for brain in (b.brain_jr, b.brain_sr)]
+            paused = [brain for b in active_bots if b.manual_stop for brain in (b.brain_jr, b.brain_sr)]
+            ModelResidency.prefetch(upcoming)
+            ModelResidency.enforce(pinned=upcoming, paused=paused)
             
-            # Управление открытыми сделками (только в REAL)
-            if not current_mode_is_sim:
-                pos_manager.manage_all_positions(cfg.SYMBOLS_LIST)
+            # Управление открытыми сделками (только в REAL) — быстрый тиковый путь
+            if not current_mode_is_sim and time.time() - last_position_tick >= cfg.POSITION_TICK_SEC:
+                # Комментарий позиции — голый символ: на символ один ATR, от агента с младшим ТФ
+                atr_map, atr_period = {}, {}
+                for bot in active_bots:
+                    period = TF_SECONDS.get(bot.tf, 0)
+                    if bot.last_atr and period < atr_period.get(bot.symbol, float('inf')):
+                        atr_map[bot.symbol], atr_period[bot.symbol] = bot.last_atr, period
+                pos_manager.manage_all_positions(cfg.SYMBOLS_LIST, atr_map=atr_map)
+                last_position_tick = time.time()
 
             # 6. ЭКСПОРТ ДАННЫХ ДЛЯ ВИЗУАЛИЗАЦИИ
+            # HMI читает шину в shared memory; JSON — редкий резервный снимок
             try:
                 states = {b.symbol_tf: b.get_state() for b in active_bots}
-                with open(cfg.BOT_STATES_PATH, "w", encoding="utf-8") as f:
-                    json.dump(states, f, indent=4)
-            except:
-                pass
-
-            time.sleep(1)
+                equity = balance = 0.0
+                if not current_mode_is_sim:
+                    account = BrokerGateway.instance().account_info()
+                    if account:
+                        equity, balance = account.equity, account.balance
+                state_bus.publish(states, equity=equity, balance=balance)
+
+                if time.time() - last_states_flush >= cfg.BOT_STATES_FLUSH_SEC:
+                    with open(cfg.BOT_STATES_PATH, "w", encoding="utf-8") as f:
+                        json.dump(states, f, indent=4)
+                    last_states_flush = time.time()
+                    log.info(f"ProviderGateway: {ProviderGateway.get_stats()}")
+                    log.info(f"PredictionCache: {PredictionCache.get_stats()}")
+                    log.info(f"JobScheduler: {JobScheduler.instance().get_stats()}")
+                    log.info(f"ModelResidency: {ModelResidency.get_stats()}")
+            except Exception as e:
+                log.debug(f"Ошибка публикации состояний: {e}")
+
+            # Сон до ближайшего закрытия бара (с потолком для команд HMI и позиций)
+            sleep_cap = cfg.MAIN_LOOP_MAX_SLEEP_SEC if current_mode_is_sim else min(cfg.MAIN_LOOP_MAX_SLEEP_SEC, cfg.POSITION_TICK_SEC)
+            until_bar = bar_clock.seconds_until_next()
+            time.sleep(sleep_cap if until_bar is None else min(sleep_cap, until_bar))
 
     except KeyboardInterrupt:
         log.info("Система остановлена пользователем.")
@@ -146,7 +234,8 @@ def main():
         if mt5_initialized or bots_initialized:
             shutdown_manager.execute(active_bots)
             if mt5_initialized:
-                mt5.shutdown()
+                BrokerGateway.instance().stop()
+        state_bus.close()
 
 if __name__ == "__main__":
     main()
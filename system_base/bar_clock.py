@@ -0,0 +1,97 @@
+# FILE: system_base/bar_clock.py
+# LOCATION: PROJ_AI_FOREX_2026/system_base/
+# DESCRIPTION: Часы баров для main loop. Следующее закрытие бара по таймфрейму (TF_SETTINGS),
+# учет выходных FX. Агент будится только к закрытию своего бара, а не опросом раз в секунду.
+
+import time
+from datetime import datetime, timezone, timedelta
+from config import (TF_SETTINGS, BAR_CLOSE_GRACE_SEC, BAR_RETRY_SEC, BAR_MAX_RETRIES,
+                    BAR_CLOCK_UTC_OFFSET_SEC, MARKET_CLOSE_UTC, MARKET_OPEN_UTC, ALWAYS_OPEN_SYMBOLS)
+from system_base.logger import get_logger
+
+log = get_logger("BarClock", db_type='system')
+
+TF_SECONDS = {v['suffix']: v['seconds'] for v in TF_SETTINGS.values()}
+
+def _week_seconds(weekday, hour):
+    return weekday * 86400 + hour * 3600
+
+def is_market_open(symbol, ts):
+    """FX закрыт с пятницы 22:00 до воскресенья 22:00 UTC; ALWAYS_OPEN_SYMBOLS — 24/7."""
+    if symbol in ALWAYS_OPEN_SYMBOLS:
+        return True
+    dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+    pos = _week_seconds(dt.weekday(), dt.hour) + dt.minute * 60 + dt.second
+    return not (_week_seconds(*MARKET_CLOSE_UTC) <= pos < _week_seconds(*MARKET_OPEN_UTC))
+
+def next_market_open(ts):
+    """Ближайшее открытие недели (UTC epoch) после ts."""
+    dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+    week_start = (dt - timedelta(days=dt.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    t_open = week_start.timestamp() + _week_seconds(*MARKET_OPEN_UTC)
+    return t_open if t_open > ts else t_open + 7 * 86400
+
+def next_bar_close(tf_str, ts):
+    """Время закрытия текущего бара (границы по серверному времени брокера)."""
+    period = TF_SECONDS.get(tf_str, 3600)
+    local = ts + BAR_CLOCK_UTC_OFFSET_SEC
+    return (local // period + 1) * period - BAR_CLOCK_UTC_OFFSET_SEC
+
+class BarClock:
+    """
+    Расписание агентов: { symbol_tf: {"due": epoch, "retries": int, "paused": bool} }.
+    Новый агент и агент, снятый с паузы, будятся сразу (первый бар без ожидания).
+    """
+
+    def __init__(self):
+        self._schedule = {}
+
+    def _next_due(self, symbol, tf_str, now):
+        close = next_bar_close(tf_str, now)
+        if not is_market_open(symbol, close - 1):
+            # Бар целиком в выходных: первый бар после открытия недели
+            close = next_bar_close(tf_str, next_market_open(close - 1))
+        return close + BAR_CLOSE_GRACE_SEC
+
+    def due(self, bots, now=None):
+        """Агенты, чей бар уже закрылся (или которых нужно разбудить немедленно)."""
+        now = now or time.time()
+        ready = []
+        for bot in bots:
+            entry = self._schedule.get(bot.symbol_tf)
+            if entry is None or entry['paused'] != bot.manual_stop:
+                entry = {"due": now, "retries": 0, "paused": bot.manual_stop}
+                self._schedule[bot.symbol_tf] = entry
+            if entry['due'] <= now:
+                ready.append(bot)
+        return ready
+
+    def upcoming(self, bots, horizon_sec, now=None):
+        """Агенты, чей бар закроется в ближайшие horizon_sec (упреждающая загрузка моделей)."""
+        now = now or time.time()
+        return [bot for bot in bots
+                if bot.symbol_tf in self._schedule and self._schedule[bot.symbol_tf]['due'] <= now + horizon_sec]
+
+    def mark_ticked(self, bot, advanced, now=None):
+        """
+        advanced=True — бар обработан (или агент на паузе): ждем следующего закрытия.
+        Иначе брокер еще не отдал новый бар — короткий повтор (не более BAR_MAX_RETRIES).
+        """
+        now = now or time.time()
+        entry = self._schedule[bot.symbol_tf]
+        entry['paused'] = bot.manual_stop
+        if advanced or entry['retries'] >= BAR_MAX_RETRIES:
+            if not advanced:
+                log.warning(f"[{bot.symbol_tf}] Новый бар не получен после {BAR_MAX_RETRIES} повторов.")
+            entry['due'] = self._next_due(bot.symbol, bot.tf, now)
+            entry['retries'] = 0
+        else:
+            entry['due'] = now + BAR_RETRY_SEC
+            entry['retries'] += 1
+
+    def seconds_until_next(self, now=None):
+        """Сколько спать до ближайшего закрытия (None — расписание пусто)."""
+        if not self._schedule:
+            return None
+        now = now or time.time()
+        return max(0.0, min(e['due'] for e in self._schedule.values()) - now)
@@ -0,0 +1,177 @@
+# FILE: system_base/broker_gateway.py
+# LOCATION: PROJ_AI_FOREX_2026/system_base/
+# DESCRIPTION: Единый шлюз к брокеру. API MetaTrader5 блокирующее и глобальное, поэтому сессией
+# владеет один поток: запросы идут через очередь с приоритетами и возвращают Future.
+
+import time
+import itertools
+import threading
+from queue import PriorityQueue
+from concurrent.futures import Future
+import MetaTrader5 as mt5
+from config import BROKER_MAX_RPS, BROKER_CALL_TIMEOUT_SEC
+from system_base.logger import get_logger
+
+log = get_logger("BrokerGateway", db_type='system')
+
+# Приоритеты очереди: закрытие раньше модификации, модификация раньше открытия, запросы — последними
+PRIORITY_CLOSE = 0
+PRIORITY_MODIFY = 1
+PRIORITY_OPEN = 2
+PRIORITY_QUERY = 3
+_PRIORITY_STOP = 99
+
+class BrokerGateway:
+    """
+    Синглтон процесса: BrokerGateway.instance().
+    До start() (HMI, скрипты) вызовы выполняются напрямую в текущем потоке.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, backend=None, max_rps=BROKER_MAX_RPS):
+        self.backend = backend if backend is not None else mt5
+        self.max_rps = max_rps
+        self._queue = PriorityQueue()
+        self._seq = itertools.count() # Порядок FIFO внутри одного приоритета
+        self._thread = None
+        self.running = False
+
+        self._symbol_info = {} # Спецификации символов на сессию (digits, point, ...)
+        self._tokens = float(max_rps)
+        self._last_refill = time.monotonic()
+        self.stats = {"calls": 0, "throttled": 0, "errors": 0, "symbol_info_hits": 0}
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def set_backend(cls, backend):
+        """Подмена бэкенда (эмулятор брокера, проверки). Останавливает текущую сессию."""
+        with cls._instance_lock:
+            if cls._instance is not None and cls._instance.running:
+                cls._instance.stop()
+            cls._instance = cls(backend=backend)
+            return cls._instance
+
+    # --- ЖИЗНЕННЫЙ ЦИКЛ СЕССИИ ---
+    def start(self, **init_kwargs):
+        """Поток шлюза + initialize() на нем. False — терминал недоступен (поток остановлен)."""
+        if self.running:
+            return True
+        self._thread = threading.Thread(target=self._run, name="BrokerGateway", daemon=True)
+        self.running = True
+        self._thread.start()
+
+        ok = self.call("initialize", priority=PRIORITY_CLOSE, **init_kwargs)
+        if not ok:
+            self.stop(shutdown=False)
+            return False
+        log.info(f"Сессия брокера открыта (лимит {self.max_rps} запросов/с)")
+        return True
+
+    def stop(self, shutdown=True):
+        """Завершение: оставшиеся в очереди запросы выполняются, затем shutdown() на потоке шлюза."""
+        if not self.running:
+            return
+        if shutdown:
+            self.submit("shutdown", priority=_PRIORITY_STOP - 1)
+        done = Future()
+        self._queue.put((_PRIORITY_STOP, next(self._seq), None, (), {}, done))
+        self._thread.join(timeout=BROKER_CALL_TIMEOUT_SEC)
+        self.running = False
+        self._thread = None
+        self._symbol_info.clear()
+        log.info(f"Сессия брокера закрыта. Статистика: {self.stats}")
+
+    # --- ОЧЕРЕДЬ ---
+    def submit(self, method, *args, priority=PRIORITY_QUERY, **kwargs):
+        """Постановка вызова backend.<method> в очередь -> Future."""
+        future = Future()
+        if not self.running or threading.current_thread() is self._thread:
+            # Без потока шлюза (или повторный вход с него) — прямой вызов
+            self._execute(method, args, kwargs, future)
+            return future
+        self._queue.put((priority, next(self._seq), method, args, kwargs, future))
+        return future
+
+    def call(self, method, *args, priority=PRIORITY_QUERY, **kwargs):
+        """Синхронный вызов через очередь. При таймауте/ошибке — None (как у самого API MT5)."""
+        try:
+            return self.submit(method, *args, priority=priority, **kwargs).result(timeout=BROKER_CALL_TIMEOUT_SEC)
+        except Exception as e:
+            log.error(f"Запрос {method} к брокеру не выполнен: {e}")
+            return None
+
+    def _run(self):
+        while True:
+            priority, _, method, args, kwargs, future = self._queue.get()
+            if priority == _PRIORITY_STOP:
+                future.set_result(None)
+                break
+            self._acquire_token()
+            self._execute(method, args, kwargs, future)
+
+    def _execute(self, method, args, kwargs, future):
+        try:
+            self.stats["calls"] += 1
+            future.set_result(getattr(self.backend, method)(*args, **kwargs))
+        except Exception as e:
+            self.stats["errors"] += 1
+            future.set_exception(e)
+
+    def _acquire_token(self):
+        """Token bucket: не более max_rps запросов в секунду (всплеск до max_rps)."""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.max_rps, self._tokens + (now - self._last_refill) * self.max_rps)
+            self._last_refill = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            self.stats["throttled"] += 1
+            time.sleep((1.0 - self._tokens) / self.max_rps)
+
+    # --- ТИПОВЫЕ ЗАПРОСЫ ---
+    def symbol_info(self, symbol):
+        info = self._symbol_info.get(symbol)
+        if info is not None:
+            self.stats["symbol_info_hits"] += 1
+            return info
+        info = self.call("symbol_info", symbol)
+        if info is not None:
+            self._symbol_info[symbol] = info
+        return info
+
+    def symbol_info_tick(self, symbol):
+        return self.call("symbol_info_tick", symbol)
+
+    def positions_get(self, **kwargs):
+        return self.call("positions_get", **kwargs)
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        return self.call("copy_rates_from_pos", symbol, timeframe, start_pos, count)
+
+    def history_deals_get(self, date_from, date_to):
+        return self.call("history_deals_get", date_from, date_to)
+
+    def account_info(self):
+        return self.call("account_info")
+
+    def symbols_get(self):
+        return self.call("symbols_get")
+
+    def order_send(self, request, priority=None):
+        """Приоритет по типу приказа: закрытие позиции -> модификация SL/TP -> открытие."""
+        if priority is None:
+            if request.get("action") == mt5.TRADE_ACTION_SLTP:
+                priority = PRIORITY_MODIFY
+            elif request.get("position"):
+                priority = PRIORITY_CLOSE
+            else:
+                priority = PRIORITY_OPEN
+        return self.call("order_send", request, priority=priority)
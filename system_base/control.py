@@ -1,50 +1,106 @@
 # sys/control.py
+import weakref
+from system_base.drift import DriftEngine
 from system_base.logger import get_logger
+from config import WARN_THRESHOLD, ERR_THRESHOLD
 
 log = get_logger("Control")
 
 class ErrorController:
-    def __init__(self, threshold_warn=None, threshold_err=None):
+    def __init__(self, threshold_warn=None, threshold_err=None, agent_id=None):
         """
         Инициализируется внутри каждого Orchestrator для конкретного Symbol_TF.
+        Окно ошибок и детекторы разладки живут в общем DriftEngine: свой слот у каждого экземпляра
+        (пересозданный контроллер того же агента не затирает чужое состояние), освобождается вместе с ним.
         """
-        self.history_mse = []
+        self.agent_id = agent_id
         # Если пороги не переданы, берем глобальные из config.py
         self.threshold_warn = threshold_warn if threshold_warn else WARN_THRESHOLD
         self.threshold_err = threshold_err if threshold_err else ERR_THRESHOLD
-        
+        self.last_threshold = 0.0             # Последний динамический порог (ATR * multiplier) для HMI
+
+        self.engine = DriftEngine.shared()
+        self.slot = self.engine.register()
+        weakref.finalize(self, self.engine.release, self.slot)
+        self._pending = None                  # (mse, статистика) из общего шага update_batch
+
         self.warning_count = 0                # Счетчик для запуска адаптации
         self.is_model_valid = True            # Флаг допуска к торгам (влияет на Trader)
         self.valid_forecasts_needed = 0       # "Карантин" после переобучения
+        self.drift_alarm = False              # Последний вердикт CUSUM / Page-Hinkley
+
+    @staticmethod
+    def update_batch(observations):
+        """
+        observations: [(ErrorController, mse)] — ошибки всех агентов, закрывших бар (main loop).
+        Один векторный шаг DriftEngine на всех; check() каждого контроллера берет свою строку.
+        """
+        if not observations:
+            return
+        engine = DriftEngine.shared()
+        stat = engine.update([c.slot for c, _ in observations], [mse for _, mse in observations])
+        for i, (ctrl, mse) in enumerate(observations):
+            ctrl._pending = (mse, {k: v[i] for k, v in stat.items()})
+
+    @property
+    def history_mse(self):
+        """Окно последних ошибок (хронологически)."""
+        return self.engine.history(self.slot)
 
-    def check(self, current_mse, dynamic_threshold):
-        self.threshold_err = dynamic_threshold  # Порог ERROR — это и есть наш ATR * multiplier
-        self.threshold_warn = dynamic_threshold * 0.8 # Порог WARNING — 80% от лимита
+    @property
+    def avg_mse(self):
+        """Скользящее среднее ошибки — O(1) из сумм DriftEngine."""
+        return self.engine.mean(self.slot)
+
+    def reset(self):
+        """Новая модель: окно ошибок, детекторы и карантин — с нуля."""
+        self.engine.clear(self.slot)
+        self.warning_count = 0
+        self.is_model_valid = True
+        self.valid_forecasts_needed = 0
+        self.drift_alarm = False
+        self._pending = None
+
+    def check(self, current_mse, dynamic_threshold=None):
         """
         Логика валидации модели 2026 года.
         Вызывается оркестратором при закрытии каждого нового бара.
+        ERROR (переобучение) — только если скачок ошибки подтвержден детектором разладки;
+        одиночный шумный бар засчитывается как предупреждение.
+        Если ошибка бара уже прошла общий шаг update_batch — берется его статистика.
         """
-        if not self.history_mse:
-            self.history_mse.append(current_mse)
+        if dynamic_threshold is not None:
+            self.last_threshold = dynamic_threshold
+
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            stat = pending[1]
+        else:
+            stat = {k: v[0] for k, v in self.engine.update([self.slot], [current_mse]).items()}
+        if stat["count"] == 0:
             return "OK"
 
-        # Рассчитываем скользящее среднее ошибки для оценки деградации
-        avg_mse = sum(self.history_mse) / len(self.history_mse)
-        
+        # Среднее окна до текущего бара
+        avg_mse = float(stat["mean"])
+        self.drift_alarm = bool(stat["alarm"])
+
         # 1. КРИТИЧЕСКАЯ ОШИБКА (Сигнал к RE-EDUCATION)
-        if current_mse > avg_mse * self.threshold_err:
-            log.error(f"Критический сбой точности! MSE {current_mse:.6f} > Порог {avg_mse*self.threshold_err:.6f}")
+        if current_mse > avg_mse * self.threshold_err and self.drift_alarm:
+            log.error(f"Критический сбой точности! MSE {current_mse:.6f} > Порог {avg_mse*self.threshold_err:.6f} "
+                      f"(CUSUM {stat['cusum']:.1f}, PH {stat['ph']:.1f})")
             self.is_model_valid = False
             self.valid_forecasts_needed = 4 # Модель уходит на карантин на 4 бара
             self.warning_count = 0
+            self.engine.reset_detectors(self.slot)
             return "ERROR"
 
-        # 2. ПРЕДУПРЕЖДЕНИЕ (Сигнал к ADAPTATION)
-        if current_mse > avg_mse * self.threshold_warn:
+        # 2. ПРЕДУПРЕЖДЕНИЕ (Сигнал к ADAPTATION): превышение порога или устойчивый дрейф
+        if current_mse > avg_mse * self.threshold_warn or self.drift_alarm:
             self.warning_count += 1
             log.warning(f"Warning {self.warning_count}/3: Повышенная ошибка прогноза.")
             if self.warning_count >= 3:
                 self.warning_count = 0
+                self.engine.reset_detectors(self.slot)
                 return "WARNING" # Оркестратор вызовет Adaptation.apply()
         else:
             # Снижаем счетчик предупреждений, если точность восстановилась
@@ -59,9 +115,4 @@ class ErrorController:
                 else:
                     log.info(f"Модель в карантине. Осталось подтверждений: {self.valid_forecasts_needed}")
 
-        # Обновляем историю MSE (окно из последних 50 баров)
-        self.history_mse.append(current_mse)
-        if len(self.history_mse) > 50: 
-            self.history_mse.pop(0)
-            
         return "OK"
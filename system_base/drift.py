@@ -0,0 +1,144 @@
+# FILE: system_base/drift.py
+# LOCATION: PROJ_AI_FOREX_2026/system_base/
+# DESCRIPTION: Детектор разладки ошибок прогноза. Потоки MSE всех агентов — в одном кольцевом
+# буфере [агенты x окно]; скользящие сумма/сумма квадратов за O(1), CUSUM и Page-Hinkley
+# обновляются одним векторным шагом по всем переданным агентам.
+
+import threading
+import numpy as np
+from config import DRIFT_WINDOW, DRIFT_CUSUM_K, DRIFT_CUSUM_H, DRIFT_PH_DELTA, DRIFT_PH_LAMBDA, DRIFT_MIN_REL_STD
+from system_base.logger import get_logger
+
+log = get_logger("DriftEngine", db_type='system')
+
+class DriftEngine:
+    """
+    Слот на контроллер: register() -> новый слот (освобожденные release() переиспользуются).
+    update(slots, values) возвращает статистику окна ДО нового значения и флаги тревоги детекторов.
+    Детекторы односторонние (рост ошибки) и работают в нормированных единицах z = (x - mean) / scale,
+    scale = max(std, mean * DRIFT_MIN_REL_STD): пороги одинаковы для всех пар и таймфреймов.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, window=DRIFT_WINDOW, capacity=16):
+        self.window = window
+        self._used = 0
+        self._free = []
+        self._lock = threading.Lock()
+        self._alloc(capacity)
+
+    @classmethod
+    def shared(cls):
+        """Общий движок процесса (все ErrorController)."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _alloc(self, capacity):
+        old = getattr(self, "buf", None)
+        n = 0 if old is None else len(old)
+        grow = lambda arr, fill=0.0: np.concatenate([arr, np.full((capacity - n,) + arr.shape[1:], fill, dtype=arr.dtype)])
+        if old is None:
+            self.buf = np.zeros((capacity, self.window))
+            self.pos = np.zeros(capacity, dtype=np.int64)
+            self.count = np.zeros(capacity, dtype=np.int64)
+            self.sum = np.zeros(capacity)
+            self.sumsq = np.zeros(capacity)
+            self.cusum = np.zeros(capacity)
+            self.ph_m = np.zeros(capacity)
+            self.ph_min = np.zeros(capacity)
+        else:
+            self.buf = grow(self.buf)
+            self.pos, self.count = grow(self.pos), grow(self.count)
+            self.sum, self.sumsq = grow(self.sum), grow(self.sumsq)
+            self.cusum, self.ph_m, self.ph_min = grow(self.cusum), grow(self.ph_m), grow(self.ph_min)
+
+    def register(self):
+        """Слот для нового контроллера: у каждого экземпляра свой, начинается с чистого окна."""
+        with self._lock:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = self._used
+                self._used += 1
+                if slot >= len(self.buf):
+                    self._alloc(len(self.buf) * 2)
+        self.clear(slot)
+        return slot
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def update(self, slots, values):
+        """
+        Один бар для набора агентов. slots, values — массивы одинаковой длины.
+        -> dict: mean, std (окно до значения), count, cusum, ph, alarm (bool).
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        x = np.asarray(values, dtype=np.float64)
+        with self._lock:
+            cnt = self.count[slots]
+            has = cnt > 0
+            n = np.maximum(cnt, 1)
+            mean = np.where(has, self.sum[slots] / n, x)
+            var = np.maximum(self.sumsq[slots] / n - mean ** 2, 0.0)
+            std = np.sqrt(np.where(has, var, 0.0))
+            scale = np.maximum(np.maximum(std, np.abs(mean) * DRIFT_MIN_REL_STD), 1e-12)
+            z = np.where(has, (x - mean) / scale, 0.0)
+
+            # CUSUM (рост среднего) и Page-Hinkley
+            cusum = np.maximum(0.0, self.cusum[slots] + z - DRIFT_CUSUM_K)
+            ph_m = self.ph_m[slots] + z - DRIFT_PH_DELTA
+            ph_min = np.minimum(self.ph_min[slots], ph_m)
+            ph = ph_m - ph_min
+            self.cusum[slots], self.ph_m[slots], self.ph_min[slots] = cusum, ph_m, ph_min
+
+            # Кольцо: вытесняемое значение уходит из сумм
+            pos = self.pos[slots]
+            full = cnt >= self.window
+            out = np.where(full, self.buf[slots, pos], 0.0)
+            self.buf[slots, pos] = x
+            self.sum[slots] += x - out
+            self.sumsq[slots] += x * x - out * out
+            self.count[slots] = np.minimum(cnt + 1, self.window)
+            self.pos[slots] = (pos + 1) % self.window
+
+            # На обороте кольца — точный пересчет сумм (накопленная ошибка округления)
+            wrapped = slots[self.pos[slots] == 0]
+            if len(wrapped):
+                self.sum[wrapped] = self.buf[wrapped].sum(axis=1)
+                self.sumsq[wrapped] = (self.buf[wrapped] ** 2).sum(axis=1)
+
+        alarm = (cusum > DRIFT_CUSUM_H) | (ph > DRIFT_PH_LAMBDA)
+        return {"mean": mean, "std": std, "count": cnt, "cusum": cusum, "ph": ph, "alarm": alarm}
+
+    def reset_detectors(self, slots):
+        """После переобучения/адаптации: детекторы с нуля, окно ошибок сохраняется."""
+        slots = np.atleast_1d(np.asarray(slots, dtype=np.int64))
+        with self._lock:
+            self.cusum[slots] = 0.0
+            self.ph_m[slots] = 0.0
+            self.ph_min[slots] = 0.0
+
+    def clear(self, slot):
+        with self._lock:
+            self.buf[slot] = 0.0
+            self.pos[slot] = self.count[slot] = 0
+            self.sum[slot] = self.sumsq[slot] = 0.0
+            self.cusum[slot] = self.ph_m[slot] = self.ph_min[slot] = 0.0
+
+    def mean(self, slot):
+        n = self.count[slot]
+        return float(self.sum[slot] / n) if n else 0.0
+
+    def history(self, slot):
+        """Окно ошибок агента в хронологическом порядке (для HMI)."""
+        with self._lock:
+            n, pos = int(self.count[slot]), int(self.pos[slot])
+            if n < self.window:
+                return self.buf[slot, :n].tolist()
+            return np.roll(self.buf[slot], -pos).tolist()
@@ -0,0 +1,308 @@
+# FILE: system_base/job_scheduler.py
+# LOCATION: PROJ_AI_FOREX_2026/system_base/
+# DESCRIPTION: Задания обучения агентов (EDUCATION / TEST / FIT) как конечные автоматы.
+# main loop выполняет по одному этапу за итерацию в пределах CPU-бюджетов: общего и на агента.
+
+import time
+import threading
+from collections import OrderedDict, deque
+from config import (JOB_MAX_EDUCATIONS, JOB_MAX_FITS, JOB_MAX_CPU_SEC, JOB_BUDGET_WINDOW_SEC,
+                    JOB_GLOBAL_CPU_PER_WINDOW_SEC, JOB_AGENT_CPU_PER_WINDOW_SEC,
+                    HOT_SWAP_ENABLED, HOT_SWAP_MAX_PARALLEL, HOT_SWAP_MSE_TOLERANCE)
+from ai_brain.hot_swap import ShadowTrainer
+from data_sys.databasemanager import DatabaseManager
+from system_base.logger import get_logger
+
+log = get_logger("JobScheduler", db_type='system')
+
+# Состояния задания
+EDUCATION = "EDUCATION"
+SHADOW = "SHADOW"       # Теневая модель учится в фоне, живая продолжает работу
+TEST = "TEST"
+FIT = "FIT"
+DONE = "DONE"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+class TrainingJob:
+    """
+    Сценарий АВТОМАТИКА для одного Orchestrator. Каждый step() — ровно один этап:
+    EDUCATION -> TEST -> (FIT -> TEST) x JOB_MAX_FITS -> EDUCATION ... не более JOB_MAX_EDUCATIONS.
+    full_cycle=False — только переобучение, далее агент ждет ручного TEST.
+    Если у агента уже есть рабочая модель (HOT_SWAP_ENABLED), EDUCATION идет на теневой копии
+    в фоне (SHADOW): теневая и живая модели тестируются на одной отложенной выборке, и теневая
+    ставится горячей заменой, только если ее MSE не хуже (HOT_SWAP_MSE_TOLERANCE).
+    Выборку каждой попытки EDUCATION готовит JobScheduler (SharedTrainingSet, пакетом на все
+    задания очереди); задание освобождает ее по завершении попытки, при отмене и в конце.
+    """
+
+    def __init__(self, orch, is_sim_mode=False, full_cycle=True, on_done=None):
+        self.orch = orch
+        self.agent_id = orch.symbol_tf
+        self.is_sim_mode = is_sim_mode
+        self.full_cycle = full_cycle
+        self.on_done = on_done
+
+        self.state = EDUCATION
+        self.educations = 0
+        self.fits = 0
+        self.last_mse = None
+        self.cpu_sec = 0.0
+        self.background_cpu = 0.0  # CPU фонового обучения, еще не учтенный планировщиком
+        self.trainer = None
+        self.dataset = None        # SharedTrainingSet текущей попытки EDUCATION (None — последовательный препроцессинг)
+        self.dataset_ready = False # Препроцессинг попытки выполнен (даже если выборки не получилось)
+        self.reason = ""
+        self.submitted_at = time.time()
+
+    @property
+    def finished(self):
+        return self.state in FINAL_STATES
+
+    @property
+    def succeeded(self):
+        return self.state == DONE
+
+    @property
+    def needs_dataset(self):
+        return self.state == EDUCATION and not self.dataset_ready and self.educations < JOB_MAX_EDUCATIONS
+
+    def release_dataset(self):
+        if self.dataset is not None:
+            self.dataset.release()
+        self.dataset, self.dataset_ready = None, False
+
+    def finish(self, state, reason=""):
+        self.state = state
+        self.reason = reason
+        self.release_dataset()
+
+    def step(self):
+        if self.state == EDUCATION:
+            if self.educations >= JOB_MAX_EDUCATIONS:
+                log.critical(f"[{self.agent_id}] СТОП: Рынок непредсказуем. Модель не проходит тесты.")
+                self.finish(FAILED, "Лимит циклов EDUCATION")
+                return
+            hot_swap = HOT_SWAP_ENABLED and self.orch.brain.scaler is not None
+            if hot_swap and ShadowTrainer.running_count() >= HOT_SWAP_MAX_PARALLEL:
+                return # Ждем свободного слота фонового обучения
+            self.educations += 1
+            self.fits = 0
+            log.info(f"[{self.agent_id}] EDUCATION (Попытка {self.educations}/{JOB_MAX_EDUCATIONS})...")
+            if hot_swap:
+                self.trainer = self.orch.start_shadow_training(self.is_sim_mode, dataset=self.dataset)
+                self.state = SHADOW
+                return
+            done = self.orch.run_education_step(self.is_sim_mode, dataset=self.dataset)
+            self.release_dataset()
+            if not done:
+                return # Повтор EDUCATION на следующем шаге
+            if self.full_cycle:
+                self.state = TEST
+            else:
+                self.orch.needs_testing = True
+                self.finish(DONE)
+
+        elif self.state == SHADOW:
+            if not self.trainer.done:
+                return
+            result, self.background_cpu = self.trainer.result, self.background_cpu + self.trainer.cpu_sec
+            self.trainer = None
+            self.release_dataset()
+            if result is None:
+                return self._retry_education("Сбой фонового обучения")
+            if not result["valid"] and not self.is_sim_mode:
+                return self._retry_education("Теневая модель не прошла ModelTester, живая модель сохранена")
+            live_mse = self.orch.live_test_mse(result)
+            if live_mse is not None:
+                log.info(f"[{self.agent_id}] Тест на одной выборке: теневая MSE {result['mse']:.8f}, живая {live_mse:.8f}")
+                if result["mse"] > live_mse * (1 + HOT_SWAP_MSE_TOLERANCE) and not self.is_sim_mode:
+                    return self._retry_education("Теневая модель хуже живой, живая модель сохранена")
+            self.orch.install_shadow(result)
+            if self.full_cycle:
+                self.state = TEST
+            else:
+                self.finish(DONE)
+
+        elif self.state == TEST:
+            verdict, self.last_mse = self.orch.evaluate_test(self.is_sim_mode)
+            if verdict == "PASS":
+                self.finish(DONE)
+            elif verdict == "FIT" and self.fits < JOB_MAX_FITS:
+                self.state = FIT
+            else:
+                if verdict == "FIT":
+                    log.error(f"[{self.agent_id}] Адаптации исчерпаны. Перезапуск EDUCATION.")
+                self.state = EDUCATION
+
+        elif self.state == FIT:
+            self.fits += 1
+            log.info(f"[{self.agent_id}] FIT: Попытка адаптации {self.fits}/{JOB_MAX_FITS} (MSE: {self.last_mse:.6f})")
+            self.orch.run_fit_step(self.is_sim_mode)
+            self.state = TEST
+
+    def _retry_education(self, reason):
+        log.warning(f"[{self.agent_id}] {reason}.")
+        self.state = EDUCATION
+
+    def take_background_cpu(self):
+        cpu, self.background_cpu = self.background_cpu, 0.0
+        return cpu
+
+    def get_progress(self):
+        """Срез для bot_states.json."""
+        return {
+            "state": self.state,
+            "educations": self.educations,
+            "fits": self.fits,
+            "cpu_sec": round(self.cpu_sec, 1),
+            "cpu_budget_sec": JOB_MAX_CPU_SEC,
+            "reason": self.reason,
+        }
+
+class JobScheduler:
+    """
+    Синглтон процесса: JobScheduler.instance(). Одно активное задание на агента,
+    обход заданий по кругу. CPU (time.process_time) учитывается в скользящем окне
+    JOB_BUDGET_WINDOW_SEC: при исчерпании общего бюджета этапы откладываются, агент,
+    исчерпавший свою долю, пропускается — остальные агенты продолжают обучаться.
+    Бюджет проверяется перед этапом: один этап может его превысить.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, global_budget=JOB_GLOBAL_CPU_PER_WINDOW_SEC, agent_budget=JOB_AGENT_CPU_PER_WINDOW_SEC,
+                 window=JOB_BUDGET_WINDOW_SEC):
+        self.global_budget = global_budget
+        self.agent_budget = agent_budget
+        self.window = window
+        self.db = DatabaseManager()
+        self._jobs = OrderedDict() # { agent_id: TrainingJob } — порядок обхода
+        self._finished = {}        # { agent_id: TrainingJob } — последнее завершенное (для HMI)
+        self._spent = deque()      # (время, agent_id, cpu_sec)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    # --- ОЧЕРЕДЬ ---
+    def submit(self, job):
+        """Постановка задания. Если у агента уже есть активное — возвращается оно."""
+        with self._lock:
+            current = self._jobs.get(job.agent_id)
+            if current is not None:
+                log.info(f"[{job.agent_id}] Задание уже в очереди ({current.state}), повтор не ставится.")
+                return current
+            self._jobs[job.agent_id] = job
+            log.info(f"[{job.agent_id}] Задание обучения поставлено в очередь (в очереди: {len(self._jobs)}).")
+            return job
+
+    def cancel(self, agent_id):
+        with self._lock:
+            job = self._jobs.pop(agent_id, None)
+        if job is None:
+            return False
+        job.finish(CANCELLED, "Отменено")
+        if job.trainer is not None:
+            job.trainer.cancel() # Обучение останавливается, теневая модель не ставится
+            job.trainer = None
+        self._complete(job)
+        return True
+
+    def is_busy(self, agent_id):
+        return agent_id in self._jobs
+
+    # --- ВЫПОЛНЕНИЕ ---
+    def _prepare_datasets(self, is_sim_mode):
+        """
+        Выборки для всех заданий очереди, ожидающих EDUCATION (один режим SIM/REAL):
+        один пакетный препроцессинг MPIRE вместо последовательного чтения в каждом задании.
+        """
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.needs_dataset and j.is_sim_mode == is_sim_mode]
+        window_sizes = {j.agent_id: j.orch.brain.settings.get('window_size', 60) for j in jobs}
+        limit = 2000 if is_sim_mode else 100000 # Идентично лимитам Education
+        datasets = self.db.load_training_data_parallel(list(window_sizes), window_sizes=window_sizes, limit=limit)
+        for job in jobs:
+            job.dataset, job.dataset_ready = datasets.pop(job.agent_id, None), True
+        # Задание снято с очереди во время препроцессинга
+        for dataset in datasets.values():
+            dataset.release()
+
+    def _spent_in_window(self, now):
+        while self._spent and now - self._spent[0][0] > self.window:
+            self._spent.popleft()
+        total, per_agent = 0.0, {}
+        for _, agent_id, cpu in self._spent:
+            total += cpu
+            per_agent[agent_id] = per_agent.get(agent_id, 0.0) + cpu
+        return total, per_agent
+
+    def _next_job(self, now):
+        total, per_agent = self._spent_in_window(now)
+        if total >= self.global_budget:
+            return None
+        for job in self._jobs.values():
+            if per_agent.get(job.agent_id, 0.0) < self.agent_budget:
+                return job
+        return None
+
+    def run_pending(self, max_steps=1, now=None):
+        """Выполнить до max_steps этапов (вызывается из main loop). Возвращает число этапов."""
+        steps = 0
+        for _ in range(max_steps):
+            with self._lock:
+                job = self._next_job(now or time.time())
+            if job is None:
+                break
+
+            cpu0 = time.process_time()
+            try:
+                if job.cpu_sec >= JOB_MAX_CPU_SEC:
+                    log.error(f"[{job.agent_id}] Задание остановлено: исчерпан CPU-бюджет ({job.cpu_sec:.0f} с).")
+                    job.finish(FAILED, "CPU-бюджет исчерпан")
+                else:
+                    if job.needs_dataset:
+                        self._prepare_datasets(job.is_sim_mode)
+                    job.step()
+            except Exception as e:
+                log.error(f"[{job.agent_id}] Ошибка этапа {job.state}: {e}")
+                job.finish(FAILED, str(e))
+            spent = time.process_time() - cpu0 + job.take_background_cpu()
+            job.cpu_sec += spent
+            steps += 1
+
+            with self._lock:
+                self._spent.append((time.time(), job.agent_id, spent))
+                if job.finished:
+                    self._jobs.pop(job.agent_id, None)
+                else:
+                    self._jobs.move_to_end(job.agent_id) # Круговой обход: следующий агент
+            if job.finished:
+                self._complete(job)
+        return steps
+
+    def _complete(self, job):
+        self._finished[job.agent_id] = job
+        log.info(f"[{job.agent_id}] Задание завершено: {job.state} (CPU {job.cpu_sec:.1f} с) {job.reason}")
+        if job.on_done is not None:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                log.error(f"[{job.agent_id}] Ошибка обработчика завершения задания: {e}")
+
+    # --- СОСТОЯНИЕ ---
+    def get_progress(self, agent_id):
+        job = self._jobs.get(agent_id) or self._finished.get(agent_id)
+        return job.get_progress() if job is not None else None
+
+    def get_stats(self):
+        with self._lock:
+            total, _ = self._spent_in_window(time.time())
+            return {"queued": len(self._jobs), "cpu_window_sec": round(total, 1),
+                    "cpu_budget_sec": self.global_budget}
@@ -3,7 +3,7 @@ import sys
 import sqlite3
 import os
 # Используем пути из конфига
-from config import DB_PATH, LOG_FILE, LOG_FORMAT, SYSTEM_DB_PATH
+from config import DB_PATH, LOG_FILE, LOG_FORMAT, SYSTEM_DB_PATH, LOG_RETENTION_DAYS, LOG_RETENTION_CHECK_EVERY
 
 class SQLiteHandler(logging.Handler):
     """
@@ -14,6 +14,8 @@ class SQLiteHandler(logging.Handler):
         super().__init__()
         self.db_path = db_path
         self.table_name = table_name
+        self.fts_enabled = False
+        self._inserts = 0
         self._prepare_db()
 
     def _prepare_db(self):
@@ -33,12 +35,49 @@ class SQLiteHandler(logging.Handler):
                 )
             """)
             cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_symbol ON {self.table_name}(symbol)")
+            # Индексы под keyset-пагинацию SOE (timestamp, rowid) и фильтры уровня/модуля
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_ts ON {self.table_name}(timestamp)")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_level_ts ON {self.table_name}(level, timestamp)")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_name_ts ON {self.table_name}(name, timestamp)")
+            self._apply_retention(conn)
             conn.commit()
+            self.fts_enabled = self._prepare_fts(conn)
             conn.close()
         except Exception as e:
             # В случае сбоя инициализации БД, печатаем в консоль
             print(f"Ошибка инициализации БД логов ({self.db_path}): {e}")
 
+    def _prepare_fts(self, conn):
+        """
+        Теневая FTS5-таблица {table}_fts (external content) для поиска по message.
+        Синхронизируется триггерами; при первом создании индексирует уже накопленный журнал.
+        Если SQLite собран без FTS5 — SOE остается на LIKE.
+        """
+        fts = f"{self.table_name}_fts"
+        try:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)).fetchone()
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(message, content='{self.table_name}', content_rowid='rowid')")
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {self.table_name} BEGIN
+                                INSERT INTO {fts}(rowid, message) VALUES (new.rowid, new.message);
+                            END""")
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {self.table_name} BEGIN
+                                INSERT INTO {fts}({fts}, rowid, message) VALUES ('delete', old.rowid, old.message);
+                            END""")
+            if not exists:
+                conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            conn.commit()
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 недоступен для {self.table_name}, поиск SOE через LIKE: {e}")
+            return False
+
+    def _apply_retention(self, conn):
+        """Удаление событий старше LOG_RETENTION_DAYS (FTS чистится триггером)."""
+        conn.execute(
+            f"DELETE FROM {self.table_name} WHERE timestamp < datetime('now', 'localtime', ?)",
+            (f"-{LOG_RETENTION_DAYS} days",)
+        )
+
     def emit(self, record):
         # Не блокируем основной поток трейдинга при записи лога
         try:
@@ -52,6 +91,9 @@ class SQLiteHandler(logging.Handler):
                 f"INSERT INTO {self.table_name} (name, level, symbol, message) VALUES (?, ?, ?, ?)", 
                 (record.name, record.levelname, symbol, record.getMessage())
             )
+            self._inserts += 1
+            if self._inserts % LOG_RETENTION_CHECK_EVERY == 0:
+                self._apply_retention(conn)
             conn.commit()
             conn.close()
         except Exception:
@@ -1,13 +1,21 @@
 # sys/shutdown_manager.py
 import signal
+import sys
+import time
 import MetaTrader5 as mt5
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from system_base.logger import get_logger
-from config import APP_CONFIG_PATH
+from system_base.broker_gateway import BrokerGateway, PRIORITY_CLOSE
+from config import (APP_CONFIG_PATH, MAGIC_NUMBER, FLATTEN_WORKERS, FLATTEN_DEADLINE_SEC,
+                    FLATTEN_MAX_RETRIES, FLATTEN_RETRY_DELAY_SEC, FLATTEN_DEVIATION_PTS)
 
 log = get_logger("Shutdown")
 
+# Коды, при которых закрытие повторяется со свежей котировкой
+RETRY_RETCODES = {mt5.TRADE_RETCODE_REQUOTE, mt5.TRADE_RETCODE_PRICE_CHANGED, mt5.TRADE_RETCODE_PRICE_OFF}
+
 class ShutdownManager:
     def __init__(self):
         # В 2026 году решение о закрытии сделок зависит от настройки HMI
@@ -35,41 +43,86 @@ class ShutdownManager:
 
         log.warning("ПОЛУЧЕН СИГНАЛ ЗАВЕРШЕНИЯ. Начинаю принудительное закрытие всех позиций...")
 
-        # Используем логику PositionManager для закрытия по Symbol_TF
-        # Нам нужно получить доступ к методу close_all_for_symbol в PositionManager
-        # Так как PositionManager уже инстанцирован в main.py, мы можем вызвать его методы
-        # (В данном коде просто имитируем вызов)
-        
-        symbols_to_close = set()
-        for bot in active_bots:
-            symbols_to_close.add(bot.symbol)
-
-        for symbol in symbols_to_close:
-            self._close_all_for_symbol(symbol)
-            
-        log.info("Все активные позиции закрыты. Система готова к выключению.")
-
-    def _close_all_for_symbol(self, symbol):
+        symbols_to_close = {bot.symbol for bot in active_bots}
+        report = self.flatten(symbols_to_close)
+
+        if report['remaining']:
+            log.critical(f"НЕ ЗАКРЫТЫ позиции {report['remaining']} — требуется ручное вмешательство!")
+        else:
+            log.info("Все активные позиции закрыты. Система готова к выключению.")
+
+    def flatten(self, symbols=None, deadline_sec=FLATTEN_DEADLINE_SEC, workers=FLATTEN_WORKERS):
         """
-        Дублирование логики закрытия из PositionManager для автономности ShutdownManager
+        Экстренное закрытие позиций бота (MAGIC_NUMBER), при необходимости только по symbols.
+        Приказы на закрытие отправляются параллельно пулом воркеров (в очереди BrokerGateway —
+        с приоритетом CLOSE), у каждого свежая котировка и повторы на реквотах до общего дедлайна.
+        Итог проверяется финальным positions_get().
         """
-        positions = mt5.positions_get(symbol=symbol)
+        t0 = time.monotonic()
+        deadline = t0 + deadline_sec
+        broker = BrokerGateway.instance()
+
+        positions = [p for p in broker.positions_get() or []
+                     if p.magic == MAGIC_NUMBER and (symbols is None or p.symbol in symbols)]
+        tickets = {p.ticket for p in positions}
+
         if positions:
-            for pos in positions:
-                # Отправка запроса на закрытие
-                request = {
-                    "action": mt5.TRADE_ACTION_DEAL,
-                    "position": pos.ticket,
-                    "symbol": pos.symbol,
-                    "volume": pos.volume,
-                    "type": mt5.ORDER_TYPE_SELL if pos.type == mt5.POSITION_TYPE_BUY else mt5.ORDER_TYPE_BUY,
-                    "price": mt5.symbol_info_tick(pos.symbol).bid if pos.type == mt5.POSITION_TYPE_BUY else mt5.symbol_info_tick(pos.symbol).ask,
-                    "magic": pos.magic,
-                    "comment": "SHUTDOWN CLOSE",
-                    "type_filling": mt5.ORDER_FILLING_IOC,
-                }
-                mt5.order_send(request)
-                log.info(f"Закрыта позиция #{pos.ticket} по {symbol}")
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Flatten")
+            futures = [pool.submit(self._close_position, broker, pos, deadline) for pos in positions]
+            wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        # Проверка: что осталось открытым на самом деле
+        remaining = sorted(p.ticket for p in broker.positions_get() or [] if p.ticket in tickets)
+        report = {
+            "positions": len(tickets),
+            "closed": len(tickets) - len(remaining),
+            "remaining": remaining,
+            "time_to_flat_sec": round(time.monotonic() - t0, 3),
+        }
+        log.warning(f"FLATTEN: закрыто {report['closed']}/{report['positions']} за {report['time_to_flat_sec']} с")
+        return report
+
+    def _close_position(self, broker, pos, deadline):
+        """Закрытие одной позиции: свежий тик на каждую попытку, повтор на реквотах до дедлайна."""
+        for attempt in range(1, FLATTEN_MAX_RETRIES + 1):
+            if time.monotonic() >= deadline:
+                break
+
+            tick = broker.symbol_info_tick(pos.symbol)
+            if tick is None:
+                time.sleep(FLATTEN_RETRY_DELAY_SEC)
+                continue
+
+            is_buy = pos.type == mt5.POSITION_TYPE_BUY
+            request = {
+                "action": mt5.TRADE_ACTION_DEAL,
+                "position": pos.ticket,
+                "symbol": pos.symbol,
+                "volume": pos.volume,
+                "type": mt5.ORDER_TYPE_SELL if is_buy else mt5.ORDER_TYPE_BUY,
+                "price": tick.bid if is_buy else tick.ask,
+                "deviation": FLATTEN_DEVIATION_PTS,
+                "magic": pos.magic,
+                "comment": "SHUTDOWN CLOSE",
+                "type_filling": mt5.ORDER_FILLING_IOC,
+            }
+            result = broker.order_send(request, priority=PRIORITY_CLOSE)
+
+            if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+                log.info(f"Закрыта позиция #{pos.ticket} по {pos.symbol} (попытка {attempt})")
+                return True
+
+            retcode = result.retcode if result is not None else None
+            if result is not None and retcode not in RETRY_RETCODES:
+                log.error(f"Позиция #{pos.ticket}: закрытие отклонено, код {retcode} ({result.comment})")
+                return False
+
+            log.warning(f"Позиция #{pos.ticket}: реквот/нет ответа (код {retcode}), повтор {attempt}/{FLATTEN_MAX_RETRIES}")
+            time.sleep(FLATTEN_RETRY_DELAY_SEC)
+
+        log.error(f"Позиция #{pos.ticket}: не закрыта до дедлайна")
+        return False
 
     def signal_handler(self, sig, frame):
         """Обработчик системных сигналов (Ctrl+C, SIGINT)"""
@@ -4,7 +4,9 @@ import random
 import time
 import pandas as pd
 import os
-from config import DB_PATH, ACTIVE_AGENTS_IDS, TF_SETTINGS
+import threading
+from types import SimpleNamespace
+from config import DB_PATH, ACTIVE_AGENTS_IDS, TF_SETTINGS, MAGIC_NUMBER
 from system_base.logger import get_logger
 
 log = get_logger("Simulation")
@@ -73,6 +75,78 @@ class SimulationManager:
             elif lvl == "WARNING": log.warning(msg, extra={'symbol': aid})
             else: log.error(msg, extra={'symbol': aid})
 
+class FakeBroker:
+    """
+    Эмулятор API MetaTrader5 для BrokerGateway.set_backend(): позиции, котировки,
+    задержка ответа брокера и доля реквотов. Потокобезопасен.
+    """
+
+    def __init__(self, positions, latency=0.02, requote_rate=0.2, seed=0):
+        self.latency = latency
+        self.requote_rate = requote_rate
+        self._positions = {p.ticket: p for p in positions}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"order_send": 0, "requotes": 0}
+
+    @staticmethod
+    def make_positions(n, symbols=("EURUSD", "GBPUSD", "USDJPY"), magic=MAGIC_NUMBER):
+        return [SimpleNamespace(ticket=100000 + i, symbol=symbols[i % len(symbols)], type=i % 2,
+                                volume=0.1, magic=magic, price_open=1.1, sl=0.0, tp=0.0)
+                for i in range(n)]
+
+    def initialize(self, **kwargs):
+        return True
+
+    def shutdown(self):
+        return True
+
+    def symbol_info(self, symbol):
+        return SimpleNamespace(name=symbol, digits=5, point=1e-5)
+
+    def symbol_info_tick(self, symbol):
+        with self._lock:
+            mid = 1.1 + self._rng.uniform(-0.001, 0.001)
+        return SimpleNamespace(bid=mid - 0.00005, ask=mid + 0.00005, time=int(time.time()))
+
+    def positions_get(self, symbol=None):
+        with self._lock:
+            return tuple(p for p in self._positions.values() if symbol is None or p.symbol == symbol)
+
+    def order_send(self, request):
+        time.sleep(self.latency)
+        with self._lock:
+            self.stats["order_send"] += 1
+            if self._rng.random() < self.requote_rate:
+                self.stats["requotes"] += 1
+                return SimpleNamespace(retcode=10004, comment="Requote") # TRADE_RETCODE_REQUOTE
+            self._positions.pop(request.get("position"), None)
+            return SimpleNamespace(retcode=10009, comment="Request executed") # TRADE_RETCODE_DONE
+
+def run_flatten_benchmark(n_positions=50, latency=0.02, requote_rate=0.2, workers=(1, 8)):
+    """
+    Время до полного закрытия n_positions: последовательно (workers=1) против пула.
+    Запросы все равно сериализуются потоком BrokerGateway; выигрыш пула — в конвейере
+    (следующий тик/приказ уже в очереди) и в параллельных паузах между повторами.
+    """
+    from system_base.broker_gateway import BrokerGateway
+    from system_base.shutdown_manager import ShutdownManager
+
+    results = {}
+    for w in workers:
+        broker = FakeBroker(FakeBroker.make_positions(n_positions), latency=latency, requote_rate=requote_rate)
+        gateway = BrokerGateway.set_backend(broker)
+        gateway.start()
+        try:
+            report = ShutdownManager().flatten(workers=w)
+        finally:
+            gateway.stop()
+        results[w] = report
+        log.info(f"FLATTEN BENCH: workers={w} -> {report['time_to_flat_sec']} с, "
+                 f"закрыто {report['closed']}/{n_positions}, реквотов {broker.stats['requotes']}")
+    BrokerGateway.set_backend(None)
+    return results
+
 def run_standalone_test():
     """Запуск симуляции как отдельного скрипта"""
     sim = SimulationManager()
@@ -80,4 +154,8 @@ def run_standalone_test():
     sim.inject_test_logs()
 
 if __name__ == "__main__":
-    run_standalone_test()
+    import sys
+    if "--flatten" in sys.argv:
+        run_flatten_benchmark()
+    else:
+        run_standalone_test()
@@ -0,0 +1,209 @@
+# FILE: system_base/state_bus.py
+# LOCATION: PROJ_AI_FOREX_2026/system_base/
+# DESCRIPTION: Шина состояний ядра для HMI. Фиксированная раскладка в shared memory
+# (multiprocessing.shared_memory) + счетчик последовательности (seqlock).
+
+import os
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from config import STATE_BUS_NAME, STATE_BUS_MAX_AGENTS, STATE_BUS_MSE_DEPTH, STATE_BUS_STALE_SEC
+from system_base.logger import get_logger
+
+log = get_logger("StateBus", db_type='system')
+
+BUS_MAGIC = 0xF0A12026
+BUS_VERSION = 1
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'u4'), ('version', 'u4'),
+    ('seq', 'u8'),              # Нечетный — идет запись, четный — срез согласован
+    ('n_agents', 'u4'), ('pad', 'u4'),
+    ('updated', 'f8'),          # time.time() последней публикации
+    ('equity', 'f8'), ('balance', 'f8'),
+])
+
+AGENT_DTYPE = np.dtype([
+    ('id', 'S32'), ('status', 'S16'), ('mode', 'S16'),
+    ('is_active', 'u1'), ('warnings', 'i4'),
+    ('mse', 'f8'), ('confidence', 'f8'),
+    ('p_close', 'f8'), ('p_high', 'f8'), ('p_low', 'f8'),
+    ('mse_count', 'u4'), ('mse_history', 'f8', (STATE_BUS_MSE_DEPTH,)),
+])
+
+SEGMENT_SIZE = HEADER_DTYPE.itemsize + AGENT_DTYPE.itemsize * STATE_BUS_MAX_AGENTS
+
+def _to_float(value, default=0.0):
+    """'0.000123' / '87.5%' / None -> float."""
+    try:
+        return float(str(value).rstrip('%'))
+    except (TypeError, ValueError):
+        return default
+
+class StateBus:
+    """
+    Ядро (main.py) — единственный писатель: publish() на каждом цикле.
+    HMI — читатели: StateBus.reader().read() без диска и без обращений к брокеру.
+    """
+    _reader = None  # Кэш подключения читателя (Streamlit перезапускает скрипт на каждом событии)
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self._owner = owner
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        self.agents = np.ndarray((STATE_BUS_MAX_AGENTS,), dtype=AGENT_DTYPE,
+                                 buffer=shm.buf, offset=HEADER_DTYPE.itemsize)
+        self._last_seq = 0 # Последний прочитанный seq (читатель): откат — ядро пересоздало шину
+
+    # --- ПИСАТЕЛЬ (ЯДРО) ---
+    @classmethod
+    def create(cls):
+        """Создание сегмента ядром. Сегмент от упавшего ядра переиспользуется."""
+        try:
+            shm = shared_memory.SharedMemory(name=STATE_BUS_NAME, create=True, size=SEGMENT_SIZE)
+        except FileExistsError:
+            shm = shared_memory.SharedMemory(name=STATE_BUS_NAME)
+            if shm.size < SEGMENT_SIZE:
+                shm.close()
+                shm.unlink()
+                shm = shared_memory.SharedMemory(name=STATE_BUS_NAME, create=True, size=SEGMENT_SIZE)
+
+        bus = cls(shm, owner=True)
+        bus.agents[:] = np.zeros((), dtype=AGENT_DTYPE)
+        bus.header['seq'] = 0
+        bus.header['n_agents'] = 0
+        bus.header['version'] = BUS_VERSION
+        bus.header['magic'] = BUS_MAGIC
+        log.info(f"Шина состояний создана: {STATE_BUS_NAME} ({SEGMENT_SIZE} байт)")
+        return bus
+
+    def publish(self, states, equity=0.0, balance=0.0):
+        """
+        states: {symbol_tf: TradingBot.get_state()}.
+        Запись обрамлена инкрементами seq, читатель повторяет чтение при гонке.
+        """
+        rows = list(states.values())[:STATE_BUS_MAX_AGENTS]
+        hdr = self.header
+        hdr['seq'] += 1 # -> нечетный: запись началась
+
+        for i, st in enumerate(rows):
+            rec = self.agents[i]
+            rec['id'] = str(st.get('id', '')).encode()[:32]
+            rec['status'] = str(st.get('status', '')).encode()[:16]
+            rec['mode'] = str(st.get('mode', '')).encode()[:16]
+            rec['is_active'] = 1 if st.get('is_active') else 0
+            rec['warnings'] = int(st.get('warnings', 0) or 0)
+            rec['mse'] = _to_float(st.get('mse'))
+            rec['confidence'] = _to_float(st.get('confidence'))
+
+            pred = st.get('prediction') or (np.nan, np.nan, np.nan)
+            rec['p_close'], rec['p_high'], rec['p_low'] = (_to_float(v, np.nan) for v in pred)
+
+            hist = list(st.get('mse_history') or [])[-STATE_BUS_MSE_DEPTH:]
+            rec['mse_count'] = len(hist)
+            rec['mse_history'][:len(hist)] = hist
+
+        hdr['n_agents'] = len(rows)
+        hdr['equity'] = equity or 0.0
+        hdr['balance'] = balance or 0.0
+        hdr['updated'] = time.time()
+        hdr['seq'] += 1 # -> четный: срез согласован
+
+    def close(self):
+        if self._owner:
+            self.header['magic'] = 0 # Подключенные читатели переоткроют шину (reader)
+        self.header = self.agents = None
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    # --- ЧИТАТЕЛЬ (HMI) ---
+    @classmethod
+    def reader(cls):
+        """
+        Подключение к шине ядра. None, если ядро не запущено (повтор на следующем вызове).
+        Кэшированное подключение переоткрывается, если сегмент больше не шина ядра (magic, откат seq)
+        или публикаций нет дольше STATE_BUS_STALE_SEC: на POSIX перезапущенное ядро создает новый
+        сегмент, а у читателя остается отображение старого.
+        """
+        bus = cls._reader
+        if bus is not None:
+            if bus._attached() and not bus.is_stale():
+                return bus
+            bus.close()
+            cls._reader = None
+        try:
+            shm = shared_memory.SharedMemory(name=STATE_BUS_NAME)
+        except FileNotFoundError:
+            return None
+        if os.name == 'posix':
+            # Сегментом владеет ядро: трекер процесса HMI не должен удалять его при выходе
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        bus = cls(shm, owner=False)
+        if bus.header['magic'] != BUS_MAGIC or bus.header['version'] != BUS_VERSION:
+            bus.close()
+            return None
+        cls._reader = bus
+        return bus
+
+    def _attached(self):
+        hdr = self.header
+        return hdr['magic'] == BUS_MAGIC and hdr['version'] == BUS_VERSION and int(hdr['seq']) >= self._last_seq
+
+    def is_stale(self, max_age=STATE_BUS_STALE_SEC):
+        """Ядро не публиковало дольше max_age секунд (остановлено или зависло)."""
+        return time.time() - float(self.header['updated']) > max_age
+
+    def snapshot(self, retries=100):
+        """Согласованная копия (header, agents) по протоколу seqlock."""
+        for _ in range(retries):
+            seq_before = int(self.header['seq'])
+            if seq_before % 2:
+                time.sleep(0.0001)
+                continue
+            n = int(self.header['n_agents'])
+            header = self.header.copy()
+            agents = self.agents[:n].copy()
+            if int(self.header['seq']) == seq_before:
+                return header, agents
+        return None, None
+
+    def read(self):
+        """
+        Срез в формате bot_states.json (+ prediction, mse_history) и общий блок аккаунта.
+        Возвращает (states, account) или (None, None), если срез получить не удалось
+        или он старше STATE_BUS_STALE_SEC (HMI переходит на bot_states.json).
+        """
+        header, agents = self.snapshot()
+        if header is None:
+            return None, None
+        self._last_seq = int(header['seq'])
+        if time.time() - float(header['updated']) > STATE_BUS_STALE_SEC:
+            return None, None
+
+        states = {}
+        for rec in agents:
+            aid = rec['id'].decode()
+            count = int(rec['mse_count'])
+            states[aid] = {
+                "id": aid,
+                "status": rec['status'].decode(),
+                "mse": f"{rec['mse']:.6f}",
+                "confidence": f"{rec['confidence']}%",
+                "warnings": int(rec['warnings']),
+                "is_active": bool(rec['is_active']),
+                "mode": rec['mode'].decode(),
+                "prediction": [float(rec['p_close']), float(rec['p_high']), float(rec['p_low'])],
+                "mse_history": rec['mse_history'][:count].tolist(),
+            }
+
+        account = {
+            "equity": float(header['equity']),
+            "balance": float(header['balance']),
+            "updated": float(header['updated']),
+            "seq": int(header['seq']),
+        }
+        return states, account
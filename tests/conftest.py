@@ -0,0 +1,11 @@
+# FILE: tests/conftest.py
+# LOCATION: PROJ_AI_FOREX_2026/tests/
+# DESCRIPTION: Пути импорта для pytest: корень проекта (пакеты) и root/ (config), как в root/main.py.
+
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (BASE_DIR, os.path.join(BASE_DIR, "root")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
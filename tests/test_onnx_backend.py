@@ -0,0 +1,44 @@
+# FILE: tests/test_onnx_backend.py
+# LOCATION: PROJ_AI_FOREX_2026/tests/
+# DESCRIPTION: Экспорт Keras -> ONNX и паритет onnxruntime с Keras на малой модели.
+
+import numpy as np
+import pytest
+
+pytest.importorskip("MetaTrader5")  # config
+pytest.importorskip("tensorflow")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tf2onnx")
+
+from config import FEATURES, ONNX_PARITY_TOL
+from ai_brain import onnx_backend
+from ai_brain.modelbuilder import ModelBuilder
+
+WINDOW = 12
+
+@pytest.fixture(params=['lstm2', 'gru', 'tcn'])
+def model(request):
+    settings = {'architecture': request.param, 'lstm_units': 8, 'dropout_rate': 0.2}
+    return ModelBuilder.build_lstm_model(WINDOW, FEATURES, settings, compile_model=False)
+
+def test_export_parity(model, tmp_path):
+    path = str(tmp_path / "model_TEST.onnx")
+    assert onnx_backend.export_onnx(model, WINDOW, FEATURES, path)
+    predictor = onnx_backend.OnnxPredictor(path)
+
+    series = np.random.default_rng(1).random((3 * WINDOW, FEATURES)).astype(np.float32)
+    max_diff, ok = onnx_backend.check_parity(model, predictor, series, WINDOW, ONNX_PARITY_TOL)
+    assert ok, max_diff
+    # Одиночное окно [window, features] — тот же результат, что и батч
+    single = predictor.predict(series[:WINDOW])
+    assert single.shape == (1, 3)
+
+def test_metadata_tracks_weights(model, tmp_path):
+    path = str(tmp_path / "model_TEST.onnx")
+    digest = onnx_backend.weights_digest(model)
+    assert onnx_backend.export_onnx(model, WINDOW, FEATURES, path, {'weights': digest, 'fingerprint': 'abc'})
+    assert onnx_backend.OnnxPredictor(path).metadata == {'weights': digest, 'fingerprint': 'abc'}
+
+    # Адаптация меняет веса -> отпечаток экспорта больше не совпадает
+    model.set_weights([w + 0.01 for w in model.get_weights()])
+    assert onnx_backend.weights_digest(model) != digest
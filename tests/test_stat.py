@@ -0,0 +1,86 @@
+# FILE: tests/test_stat.py
+# LOCATION: PROJ_AI_FOREX_2026/tests/
+# DESCRIPTION: Бегущие агрегаты StatManager (deals_agg / deals_daily) на временной БД без терминала:
+# совпадение с пересчетом по сделкам, отсутствие двойного учета при синхронизации из двух процессов,
+# восстановление агрегатов для кэша, записанного без них.
+
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("MetaTrader5")  # config
+
+from data_sys import stat
+from data_sys.stat import StatManager, DEAL_COLUMNS
+
+MAGIC = 777
+
+def _deals(tickets, agent="EURUSD_H1", profit=None):
+    now = int(time.time()) - 5 * 86400
+    profit = profit if profit is not None else [(-1) ** t * t for t in tickets]
+    return pd.DataFrame({"ticket": tickets, "time": [now + t * 3600 for t in tickets], "agent_id": agent,
+                         "symbol": agent.split("_")[0], "comment": agent, "type": 0, "price": 1.1,
+                         "volume": 0.01, "profit": [float(p) for p in profit]})[DEAL_COLUMNS]
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(stat, "DB_PATH", str(tmp_path / "stat.db"))
+    StatManager._memory.clear()
+    yield
+    StatManager._memory.clear()
+
+def _feed(monkeypatch, deals):
+    """Ответ MT5 для _fetch_new_deals: сделки новее закэшированного тикета."""
+    def fetch(self, cached_df):
+        last = int(cached_df['ticket'].max()) if not cached_df.empty else 0
+        return deals[deals['ticket'] > last].reset_index(drop=True)
+    monkeypatch.setattr(StatManager, "_fetch_new_deals", fetch)
+
+def _expected(deals):
+    cum = deals['profit'].cumsum()
+    peak = np.maximum(cum.cummax(), 0.0)
+    return deals['profit'].sum(), float((cum - peak).min())
+
+def test_running_aggregates_match_recompute(db, monkeypatch):
+    deals = _deals(list(range(1, 13)))
+    _feed(monkeypatch, deals.iloc[:5])
+    StatManager(MAGIC).sync(force=True)
+    _feed(monkeypatch, deals)
+    StatManager(MAGIC).sync(force=True)
+
+    m = StatManager(MAGIC).get_agents_metrics()
+    total, max_dd = _expected(deals)
+    row = m.loc["EURUSD_H1"]
+    assert row["total_trades"] == 12
+    assert row["total_profit_usd"] == pytest.approx(total)
+    assert row["max_drawdown_usd"] == pytest.approx(max_dd)
+    assert row["win_rate_%"] == pytest.approx((deals['profit'] > 0).mean() * 100, abs=0.01)
+
+def test_second_process_does_not_double_count(db, monkeypatch):
+    deals = _deals(list(range(1, 9)))
+    _feed(monkeypatch, deals)
+    StatManager(MAGIC).sync(force=True)
+    # Другой процесс: свой кэш в памяти устарел, MT5 отдает те же сделки
+    StatManager._memory[MAGIC] = {"df": pd.DataFrame(columns=DEAL_COLUMNS), "synced_at": 0.0}
+    StatManager(MAGIC).sync(force=True)
+
+    m = StatManager(MAGIC).get_agents_metrics()
+    total, _ = _expected(deals)
+    assert m.loc["EURUSD_H1", "total_trades"] == 8
+    assert m.loc["EURUSD_H1", "total_profit_usd"] == pytest.approx(total)
+
+def test_aggregates_rebuilt_for_cache_without_them(db, monkeypatch):
+    deals = _deals(list(range(1, 7)), agent="GBPUSD_M15")
+    _feed(monkeypatch, deals)
+    StatManager(MAGIC).sync(force=True)
+    with StatManager(MAGIC)._get_conn() as conn:
+        conn.execute("DELETE FROM deals_agg")
+        conn.execute("DELETE FROM deals_daily")
+    StatManager._memory.clear()
+
+    m = StatManager(MAGIC).get_agents_metrics()
+    total, max_dd = _expected(deals)
+    assert m.loc["GBPUSD_M15", "total_trades"] == 6
+    assert m.loc["GBPUSD_M15", "total_profit_usd"] == pytest.approx(total)
+    assert m.loc["GBPUSD_M15", "max_drawdown_usd"] == pytest.approx(max_dd)
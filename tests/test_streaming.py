@@ -0,0 +1,53 @@
+# FILE: tests/test_streaming.py
+# LOCATION: PROJ_AI_FOREX_2026/tests/
+# DESCRIPTION: Потоковый инференс StreamingLSTM против оконного model.predict на малой модели.
+
+import numpy as np
+import pytest
+
+pytest.importorskip("MetaTrader5")  # config
+pytest.importorskip("tensorflow")
+
+from config import FEATURES
+from ai_brain.modelbuilder import ModelBuilder
+from ai_brain.streaming import StreamingLSTM, check_parity
+
+# Окно по умолчанию model_settings: за 60 шагов вклад бара, выпавшего из окна, в состояние LSTM
+# пренебрежимо мал, поэтому шаг от прошлого состояния совпадает с прогоном окна с нуля.
+# На коротких окнах (~12) это не так: расхождение ~1e-2.
+WINDOW = 60
+
+@pytest.fixture(scope="module")
+def model():
+    return ModelBuilder.build_lstm_model(WINDOW, FEATURES, {'lstm_units': 16, 'dropout_rate': 0.2},
+                                         compile_model=False)
+
+@pytest.fixture(scope="module")
+def series():
+    return np.random.default_rng(0).random((WINDOW + 30, FEATURES)).astype(np.float32)
+
+@pytest.mark.parametrize("resync_every", [5, 60])
+def test_parity_with_window_predict(model, series, resync_every):
+    max_diff, ok = check_parity(model, series, WINDOW, resync_every=resync_every)
+    assert ok, max_diff
+
+def test_steps_between_resyncs(model, series):
+    stream = StreamingLSTM(model, resync_every=5)
+    for end in range(WINDOW, len(series) + 1):
+        stream.predict(series[end - WINDOW:end])
+    bars = len(series) - WINDOW + 1
+    # Первый бар и каждый 6-й — полный прогон окна, остальные — один шаг
+    assert stream.stats["resyncs"] == -(-bars // 6)
+    assert stream.stats["steps"] == bars - stream.stats["resyncs"]
+
+def test_gap_forces_resync(model, series):
+    stream = StreamingLSTM(model)
+    stream.predict(series[:WINDOW])
+    stream.predict(series[2:WINDOW + 2]) # Пропущен бар: окно не сдвинуто на один
+    assert stream.stats == {"steps": 0, "resyncs": 2}
+
+def test_rejects_other_architectures():
+    gru = ModelBuilder.build_lstm_model(WINDOW, FEATURES, {'architecture': 'gru', 'lstm_units': 8},
+                                        compile_model=False)
+    with pytest.raises(ValueError):
+        StreamingLSTM(gru)
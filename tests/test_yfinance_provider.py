@@ -0,0 +1,100 @@
+# FILE: tests/test_yfinance_provider.py
+# LOCATION: PROJ_AI_FOREX_2026/tests/
+# DESCRIPTION: Кэш баров YFinanceProvider с подмененным загрузчиком (без сети):
+# попадание в кэш, догрузка хвоста, работа из кэша при сбое загрузки, ресемплинг H4.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("MetaTrader5")  # config
+pytest.importorskip("yfinance")
+
+from data_sys import yfinance_provider
+from data_sys.yfinance_provider import YFinanceProvider
+
+START = pd.Timestamp("2026-01-05 00:00", tz="UTC")
+
+def _bars(start, n, freq="1h"):
+    """Ответ в формате yf.download: индекс-время (UTC), колонки Open/High/Low/Close/Adj Close/Volume."""
+    idx = pd.date_range(start, periods=n, freq=freq, name="Datetime")
+    close = 1.10 + np.arange(n) * 1e-4
+    return pd.DataFrame({"Open": close, "High": close + 5e-4, "Low": close - 5e-4, "Close": close,
+                         "Adj Close": close, "Volume": np.full(n, 100)}, index=idx)
+
+class StubDownloader:
+    """Загрузчик-заглушка: отдает бары от start (или всю историю), пишет вызовы."""
+
+    def __init__(self, history):
+        self.history = history
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, symbol, interval, period=None, start=None):
+        self.calls.append({"symbol": symbol, "interval": interval, "period": period, "start": start})
+        if self.fail:
+            raise ConnectionError("нет сети")
+        return self.history if start is None else self.history[self.history.index >= start]
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    monkeypatch.setattr(yfinance_provider, "YF_CACHE_DIR", str(tmp_path))
+    downloader = StubDownloader(_bars(START, 48))
+    YFinanceProvider.set_downloader(downloader)
+    yield downloader
+    YFinanceProvider.set_downloader(yfinance_provider._yf_download)
+
+def _expire(symbol="EURUSD=X", interval="1h"):
+    """Окно YF_REFRESH_SEC истекло: следующий тик идет в загрузчик."""
+    YFinanceProvider._frames[(symbol, interval)]["checked_at"] = 0.0
+
+def test_repeated_ticks_served_from_memory(stub):
+    first = YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 10)
+    second = YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 10)
+    assert len(stub.calls) == 1 and stub.calls[0]["period"] is not None
+    assert first == second
+    assert [r["time"] for r in first] == [int(t.timestamp()) for t in stub.history.index[-10:]]
+
+def test_disk_cache_survives_restart(stub):
+    YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 10)
+    YFinanceProvider._frames.clear() # Новый процесс: памяти нет, кэш на диске
+
+    rows = YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 48)
+    assert len(rows) == 48
+    # Повторно запрошен только хвост: с последнего (возможно незакрытого) бара
+    assert stub.calls[-1]["period"] is None
+    assert stub.calls[-1]["start"] == stub.history.index[-2]
+
+def test_incremental_fetch_appends_tail(stub):
+    YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 10)
+    stub.history = _bars(START, 52) # Вышли 4 новых бара
+    _expire()
+
+    rows = YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 100)
+    assert stub.calls[-1]["start"] == stub.history.index[46]
+    times = [r["time"] for r in rows]
+    assert len(times) == 52 and times == sorted(set(times)) # Без дублей на стыке
+
+def test_download_failure_falls_back_to_cache(stub):
+    cached = YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 10)
+    stub.fail = True
+    _expire()
+    assert YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 10) == cached
+
+    stub.history = stub.history.iloc[:0] # Пустой ответ — тоже кэш
+    stub.fail = False
+    _expire()
+    assert YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 10) == cached
+
+def test_no_cache_and_no_network(stub):
+    stub.fail = True
+    assert YFinanceProvider.get_raw_rates("EURUSD=X", "H1", 10) is None
+
+def test_h4_resampled_from_1h(stub):
+    rows = YFinanceProvider.get_raw_rates("EURUSD=X", "H4", 100)
+    assert stub.calls[0]["interval"] == "1h"
+    assert len(rows) == 12
+    first = rows[0]
+    assert first["time"] == int(START.timestamp())
+    assert first["high"] == pytest.approx(stub.history["High"].iloc[:4].max())
+    assert first["tick_volume"] == 400